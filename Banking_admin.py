@@ -0,0 +1,512 @@
+"""Maintenance commands for the banking database.
+
+Usage:
+    python Banking_admin.py [connection options] <command> [command options]
+
+Run with --help for the list of commands.
+"""
+import argparse
+import sys
+
+from Banking_db_layout import LAYOUTS, layout_databases
+from Banking_xml_queries import BankingXMLQueries
+
+
+def _connect(args) -> BankingXMLQueries:
+    return BankingXMLQueries(db_name=args.db, db_host=args.host, db_port=args.port,
+                             db_user=args.user, db_pass=args.password,
+                             databases=layout_databases(args.layout, args.db),
+                             maintain_balances=getattr(args, "maintain_balances", False))
+
+
+# ==============================================
+# Commands
+# ==============================================
+
+def cmd_partition_transactions(args) -> int:
+    """Split transactions.xml into monthly partition documents"""
+    bank = _connect(args)
+    counts = bank.migrate_transactions_to_partitions(dry_run=args.dry_run)
+    if not counts:
+        print("Nothing to migrate: transactions.xml is missing or empty.")
+        return 0
+    for month, count in counts.items():
+        print(f"transactions/{month}.xml: {count} transactions")
+    action = "Would move" if args.dry_run else "Moved"
+    print(f"{action} {sum(counts.values())} transactions into {len(counts)} partitions.")
+    return 0
+
+
+def cmd_split_databases(args) -> int:
+    """Move each entity's documents out of --db into its own database (--layout per-entity)"""
+    if args.layout == 'single':
+        print("Nothing to split with --layout single.")
+        return 0
+    bank = _connect(args)
+    counts = bank.split_databases(dry_run=args.dry_run)
+    action = "would move to" if args.dry_run else "moved to"
+    for entity, count in counts.items():
+        print(f"{entity}: {count} documents {action} {bank.databases[entity]}")
+    return 0
+
+
+def cmd_backup(args) -> int:
+    """Back up the documents changed since the last backup (all of them with --full)"""
+    from Banking_backup import BackupManager
+    stats = BackupManager(_connect(args), args.dir, workers=args.workers).backup(full=args.full)
+    base = f"on top of {stats['base']}" if stats['base'] else "full"
+    print(f"Backup {stats['id']} ({base}): {stats['exported']} of {stats['documents']} documents exported, "
+          f"{stats['bytes']} -> {stats['compressed_bytes']} bytes in {stats['seconds']}s "
+          f"(hashing {stats['hash_seconds']}s)")
+    return 0
+
+
+def cmd_restore(args) -> int:
+    """Recreate the databases from a backup (default: the latest)"""
+    from Banking_backup import BackupManager
+    manager = BackupManager(_connect(args), args.dir, workers=args.workers)
+    if args.list:
+        for backup_id in manager.list_backups():
+            manifest = manager.load_manifest(backup_id)
+            print(f"{backup_id} (base {manifest['base'] or '-'}, {manifest['created_at']})")
+        return 0
+    stats = manager.restore(args.backup, suffix=args.suffix)
+    print(f"Restored {stats['id']}: {stats['documents']} documents in {stats['databases']} databases, "
+          f"{stats['bytes']} bytes in {stats['seconds']}s ({stats['mb_per_second']} MB/s)")
+    return 0
+
+
+def cmd_archive_transactions(args) -> int:
+    """Move transactions older than a cutoff into the compressed archive"""
+    bank = _connect(args)
+    counts = bank.archive_transactions(args.before, dry_run=args.dry_run)
+    if not counts:
+        print(f"No transactions dated before {args.before}.")
+        return 0
+    for month, count in counts.items():
+        print(f"{month}: {count} transactions")
+    action = "Would archive" if args.dry_run else "Archived"
+    print(f"{action} {sum(counts.values())} transactions to {bank.transaction_archive.archive_dir}.")
+    return 0
+
+
+def cmd_export_columnar(args) -> int:
+    """Write a typed columnar (.npy) snapshot, incrementally unless --full"""
+    from Banking_export import ColumnarExporter
+    exporter = ColumnarExporter(_connect(args), args.out, chunk_size=args.chunk_size)
+    exported = exporter.export(args.entities or None, full=args.full)
+    manifest = exporter.load_manifest()["entities"]
+    for entity, new_rows in exported.items():
+        state = manifest[entity]
+        print(f"{entity}: +{new_rows} rows ({state['rows']} total) in {state['last_run_seconds']}s")
+    return 0
+
+
+def cmd_bench_group_commit(args) -> int:
+    """Submit synthetic transfers through a GroupCommitWriter and report latency/throughput"""
+    from Banking_write_queue import GroupCommitWriter
+    bank = _connect(args)
+    accounts = [a['AccountID'] for a in bank.get_accounts_sorted_by_balance()[:2]]
+    if len(accounts) < 2:
+        print("Need at least two accounts to benchmark transfers.")
+        return 1
+    writer = GroupCommitWriter(bank, max_batch_size=args.batch_size, max_delay=args.max_delay_ms / 1000)
+    try:
+        futures = [writer.submit({'FromAccountID': accounts[0], 'ToAccountID': accounts[1],
+                                  'Amount': '0.01', 'Type': 'transfer'}) for _ in range(args.count)]
+        results = [f.result() for f in futures]
+    finally:
+        writer.close()
+    failed = [r for r in results if not r.endswith("created successfully.")]
+    for name, value in writer.stats().items():
+        print(f"{name}: {value}")
+    if failed:
+        print(f"{len(failed)} requests failed, first: {failed[0]}")
+    return 1 if failed else 0
+
+
+def cmd_sync_replica(args) -> int:
+    """Copy the database from the primary to one or more read replicas"""
+    from Banking_replicas import parse_endpoints, sync_replica
+    bank = _connect(args)
+    for host, port in parse_endpoints(args.to):
+        copied = sync_replica(bank, host, port)
+        print(f"{host}:{port}: copied {copied} documents")
+    return 0
+
+
+def cmd_replica_status(args) -> int:
+    """Write a heartbeat on the primary and report how far each replica lags behind"""
+    from Banking_replicas import ReplicaRouter, parse_endpoints
+    bank = _connect(args)
+    router = ReplicaRouter((args.host, args.port), parse_endpoints(args.replicas))
+    router.write_heartbeat(bank)
+    router.measure_lag(bank)
+    for endpoint in router.status():
+        lag = "unknown" if endpoint['lag_seconds'] is None else f"{endpoint['lag_seconds']}s"
+        state = "" if endpoint['available'] else " (unreachable)"
+        print(f"{endpoint['endpoint']} {endpoint['role']}: lag {lag}{state}")
+    return 0
+
+
+def cmd_shard_status(args) -> int:
+    """Accounts per shard, misplaced accounts and pending cross-shard credits"""
+    from Banking_sharding import ShardedBankingXMLQueries, parse_shards
+    bank = ShardedBankingXMLQueries([BankingXMLQueries(db_name=db, db_host=host, db_port=port, db_user=args.user,
+                                                       db_pass=args.password) for host, port, db in parse_shards(args.shards)])
+    if args.settle:
+        applied, pending = bank.settle_pending_credits()
+        print(f"Cross-shard credits: {applied} applied, {pending} still pending")
+    misplaced = 0
+    for name, counts in bank.placement().items():
+        print(f"{name}: {counts['accounts']} accounts, {counts['misplaced']} placed on another shard by the ring")
+        misplaced += counts['misplaced']
+    return 1 if misplaced else 0
+
+
+def cmd_backfill_alerts(args) -> int:
+    """Raise alerts for transactions already in the database"""
+    from decimal import Decimal
+    from Banking_alerts import AlertEngine, AlertStore
+    from Banking_changelog import ChangeLog
+    engine = AlertEngine(ChangeLog(), AlertStore(), high_value=Decimal(args.high_value))
+    stored = engine.backfill(_connect(args), args.since)
+    print(f"Stored {stored} new alerts for transactions since {args.since}.")
+    return 0
+
+
+def cmd_score_anomalies(args) -> int:
+    """Score a period's transactions against their accounts' history and store the outliers"""
+    import time
+    from Banking_anomaly import load_transactions, score_transactions, write_scores
+    bank = _connect(args)
+    started = time.perf_counter()
+    columns = load_transactions(bank, args.start, args.end)
+    loaded = time.perf_counter()
+    scores = score_transactions(columns, window=args.window, min_history=args.min_history)
+    scored = time.perf_counter()
+    stored = write_scores(bank, scores, args.start, args.end, min_score=args.min_score)
+    print(f"Loaded {len(columns['TransactionID'])} transactions in {loaded - started:.1f}s, "
+          f"scored in {scored - loaded:.1f}s, stored {stored} with score >= {args.min_score} "
+          f"in {time.perf_counter() - scored:.1f}s.")
+    return 0
+
+
+def cmd_reconcile(args) -> int:
+    """Compare account balances with the transaction ledger and write a discrepancy report"""
+    from Banking_reconcile import reconcile, write_report
+    report = reconcile(_connect(args), workers=args.workers, include_archived=not args.skip_archive)
+    path = write_report(report, args.out)
+    print(f"Checked {report['accounts']} accounts against {report['transactions_scanned']} transactions "
+          f"with {report['workers']} workers in {report['seconds']}s.")
+    print(f"{len(report['discrepancies'])} discrepancies written to {path}")
+    return 1 if report['discrepancies'] else 0
+
+
+def cmd_check_integrity(args) -> int:
+    """Check foreign keys, duplicate IDs and XSD validity of every document and write a report"""
+    from Banking_integrity import check_integrity, write_report
+    bank = _connect(args) if args.source == 'db' else None
+    report = check_integrity(args.source, bank, data_dir=args.data_dir, workers=args.workers,
+                             chunk_size=args.chunk_size, max_issues=args.max_issues)
+    path = write_report(report, args.out)
+    for entity, counts in report['documents'].items():
+        details = ", ".join(f"{n} {check}" for check, n in counts.items() if check != 'rows') or "ok"
+        print(f"{entity}: {counts['rows']} rows, {details}")
+    print(f"{report['issue_count']} issues in {report['seconds']}s "
+          f"(key sets {report['key_set_bytes'] / 1e6:.1f} MB), written to {path}")
+    return 1 if report['issue_count'] else 0
+
+
+def cmd_snapshot_balances(args) -> int:
+    """Store every account's balance as of now (or --at) for point-in-time queries"""
+    at = _connect(args).create_balance_snapshot(args.at)
+    print(f"Stored balance snapshot as of {at}.")
+    return 0
+
+
+def cmd_balance_at(args) -> int:
+    """Print an account's balance at a point in time"""
+    balance = _connect(args).get_balance_at(args.account, args.at)
+    if balance is None:
+        print(f"Account {args.account} not found.")
+        return 1
+    print(f"{args.account} balance at {args.at}: {balance}")
+    return 0
+
+
+def cmd_bench_money(args) -> int:
+    """Compare the Decimal and the int minor-unit money paths (no database needed)"""
+    from Banking_money import benchmark
+    results = benchmark(args.count)
+    steps = [k for k in results['decimal'] if k != 'segments']
+    print(f"{'':<12}{'decimal':>10}{'minor':>10}")
+    for step in steps:
+        print(f"{step:<12}{results['decimal'][step]:>10}{results['minor'][step]:>10}")
+    return 0 if results['decimal']['segments'] == results['minor']['segments'] else 1
+
+
+def _iter_records(path: str, item_tag: str):
+    """Serialized item elements of an XML file, streamed"""
+    from lxml import etree
+    from Banking_integrity import iter_file_items
+    for element in iter_file_items(path, item_tag):
+        yield etree.tostring(element, encoding="unicode")
+
+
+def cmd_validate_xml(args) -> int:
+    """Validate every record of an XML file against the entity's XSD in worker processes"""
+    from Banking_xml_queries import ENTITY_DOCUMENTS
+    bank = _connect(args)
+    item_tag = ENTITY_DOCUMENTS[args.entity][2]
+    errors = bank.validate_records(args.entity, _iter_records(args.file, item_tag),
+                                   workers=args.workers, chunk_size=args.chunk_size)
+    for index, message in errors[:args.show]:
+        print(f"{item_tag} #{index}: {message}")
+    if len(errors) > args.show:
+        print(f"... and {len(errors) - args.show} more")
+    for name, value in bank.last_validation_stats.items():
+        print(f"{name}: {value}")
+    return 1 if errors else 0
+
+
+def cmd_bench_validate(args) -> int:
+    """Per-record vs. batched XSD validation of synthetic transactions, per worker count"""
+    import time
+    bank = _connect(args)
+    records = [f"<Transaction><TransactionID>TX{i}</TransactionID><FromAccountID>ACC1001</FromAccountID>"
+               f"<ToAccountID>ACC1002</ToAccountID><Amount>{(i % 99999 + 1) / 100:.2f}</Amount>"
+               f"<Date>2024-01-01T10:00:00</Date><Type>transfer</Type><Status>completed</Status></Transaction>"
+               for i in range(args.rows)]
+    sample = records[:min(len(records), 2000)]
+    started = time.perf_counter()
+    for record in sample:
+        bank._validate_xml_against_xsd(f"<Transactions>{record}</Transactions>", bank.transactions_xsd_path)
+    per_record = len(sample) / (time.perf_counter() - started)
+    print(f"per-record: {per_record:,.0f} rows/s (one document per record, {len(sample)} rows)")
+    for workers in args.workers:
+        errors = bank.validate_records('transactions', records, workers=workers, chunk_size=args.chunk_size)
+        stats = bank.last_validation_stats
+        print(f"batched, {workers} worker(s): {stats['rows_per_second']:,} rows/s, "
+              f"{stats['rows_per_cpu_second']:,} rows per CPU second, {len(errors)} invalid")
+    return 0
+
+
+def cmd_bench_range_index(args) -> int:
+    """Range-index lookups vs. full scans at growing sizes (synthetic transactions, no database needed)"""
+    from Banking_range_index import benchmark
+    print(f"{'rows':>10} {'build s':>8} {'high-value index/scan us':>26} {'account index/scan us':>23}")
+    for r in benchmark(args.sizes, args.lookups):
+        print(f"{r['rows']:>10,} {r['build_seconds']:>8} "
+              f"{r['high_value_index_us']:>12} / {r['high_value_scan_us']:<11} "
+              f"{r['account_index_us']:>10} / {r['account_scan_us']}")
+    return 0
+
+
+def _import_times(module: str):
+    """(self_us, cumulative_us, name) per module imported by a fresh interpreter importing module"""
+    import subprocess
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    entries = []
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "cumulative" not in line:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            entries.append((int(self_us), int(cumulative_us), name.strip()))
+    return entries
+
+
+def cmd_bench_db_layout(args) -> int:
+    """Concurrent write throughput with one database and with one database per entity"""
+    from Banking_db_layout import benchmark
+    connection = {'db_host': args.host, 'db_port': args.port, 'db_user': args.user, 'db_pass': args.password}
+    results = benchmark(connection, args.layouts, writers=args.writers, seconds=args.seconds,
+                        report=not args.no_report, data_dir=args.data_dir)
+    for r in results:
+        print(f"{r['layout']:>10} ({r['databases']} databases, {r['writers']} writers): "
+              f"{r['writes_per_second']} writes/s (transactions {r['transactions_per_second']}, "
+              f"cards {r['cards_per_second']}, accounts {r['accounts_per_second']}), {r['reports']} reports")
+    return 0
+
+
+def cmd_bench_idempotency(args) -> int:
+    """Replay lookup time of idempotency keys as the store grows"""
+    from Banking_idempotency import benchmark
+    for r in benchmark(args.sizes, args.lookups):
+        print(f"{r['keys']:>9} keys: {r['replay_us']} us per replayed request")
+    return 0
+
+
+def cmd_bench_import(args) -> int:
+    """Cold import time of the query layer, measured with python -X importtime"""
+    import statistics
+    failed = False
+    for module in args.modules:
+        runs = [_import_times(module) for _ in range(args.runs)]
+        totals = [next(c for _, c, name in reversed(run) if name == module) / 1000 for run in runs]
+        median = statistics.median(totals)
+        status = "ok" if median <= args.target_ms else "OVER TARGET"
+        print(f"{module}: median {median:.1f} ms, min {min(totals):.1f} ms "
+              f"over {args.runs} runs (target {args.target_ms:g} ms) {status}")
+        for self_us, _, name in sorted(runs[-1], reverse=True)[:args.top]:
+            print(f"    {self_us / 1000:7.1f} ms  {name}")
+        failed |= median > args.target_ms
+    return 1 if failed else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Banking database maintenance commands")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=1984)
+    parser.add_argument("--user", default="Bank_Admin")
+    parser.add_argument("--password", default="bankadmin")
+    parser.add_argument("--db", default="banking", help="database name")
+    parser.add_argument("--layout", choices=LAYOUTS, default="single",
+                        help="single: every document in --db; per-entity: <db>_<entity> databases")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("partition-transactions", help="split transactions.xml into monthly partitions")
+    p.add_argument("--dry-run", action="store_true", help="only report the partitions that would be created")
+    p.set_defaults(func=cmd_partition_transactions)
+
+    p = commands.add_parser("split-databases", help="move each entity into its own database (--layout per-entity)")
+    p.add_argument("--dry-run", action="store_true", help="only report the documents that would move")
+    p.set_defaults(func=cmd_split_databases)
+
+    p = commands.add_parser("backup", help="incremental compressed backup of every database")
+    p.add_argument("--dir", default="Banking_System/backups", help="backup directory")
+    p.add_argument("--full", action="store_true", help="export every document, not only changed ones")
+    p.add_argument("--workers", type=int, default=None, help="fetch/compress threads (default: CPU count)")
+    p.set_defaults(func=cmd_backup)
+
+    p = commands.add_parser("restore", help="recreate the databases from a backup (replaces them)")
+    p.add_argument("--dir", default="Banking_System/backups", help="backup directory")
+    p.add_argument("--backup", help="backup id (default: the latest)")
+    p.add_argument("--suffix", default="", help="restore database X as X<suffix> instead")
+    p.add_argument("--workers", type=int, default=None, help="decompression threads (default: CPU count)")
+    p.add_argument("--list", action="store_true", help="only list the backups")
+    p.set_defaults(func=cmd_restore)
+
+    p = commands.add_parser("archive-transactions", help="move aged transactions to compressed archive files")
+    p.add_argument("--before", required=True, help="cutoff date (ISO 8601); older transactions are archived")
+    p.add_argument("--dry-run", action="store_true", help="only report how many transactions would move")
+    p.set_defaults(func=cmd_archive_transactions)
+
+    p = commands.add_parser("export-columnar", help="export typed .npy columns for analysis")
+    p.add_argument("--out", required=True, help="snapshot directory")
+    p.add_argument("--entities", nargs="*", help="entities to export (default: all)")
+    p.add_argument("--full", action="store_true", help="re-export everything instead of only new rows")
+    p.add_argument("--chunk-size", type=int, default=50000, help="rows fetched and written per part")
+    p.set_defaults(func=cmd_export_columnar)
+
+    p = commands.add_parser("bench-group-commit", help="measure batched transaction inserts (writes test transfers)")
+    p.add_argument("--count", type=int, default=1000, help="number of transactions to submit")
+    p.add_argument("--batch-size", type=int, default=200, help="maximum transactions per batch")
+    p.add_argument("--max-delay-ms", type=float, default=5.0, help="how long a batch waits for more requests")
+    p.set_defaults(func=cmd_bench_group_commit)
+
+    p = commands.add_parser("bench-money", help="compare Decimal and int minor-unit money handling")
+    p.add_argument("--count", type=int, default=500000, help="number of synthetic balances")
+    p.set_defaults(func=cmd_bench_money)
+
+    p = commands.add_parser("bench-range-index", help="measure Date/Amount range-index lookups against full scans")
+    p.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000], help="indexed transactions")
+    p.add_argument("--lookups", type=int, default=200, help="lookups timed per size")
+    p.set_defaults(func=cmd_bench_range_index)
+
+    p = commands.add_parser("bench-db-layout", help="measure concurrent writes per database layout (scratch databases)")
+    p.add_argument("--layouts", nargs="+", choices=LAYOUTS, default=list(LAYOUTS), help="layouts to compare")
+    p.add_argument("--writers", type=int, default=6, help="writer threads (transfers, card blocks, balance updates)")
+    p.add_argument("--seconds", type=float, default=10.0, help="how long each layout is measured")
+    p.add_argument("--no-report", action="store_true", help="no concurrent report thread")
+    p.add_argument("--data-dir", default="Banking_System", help="sample documents loaded into the scratch databases")
+    p.set_defaults(func=cmd_bench_db_layout)
+
+    p = commands.add_parser("bench-idempotency", help="measure idempotency-key replays at growing store sizes")
+    p.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000], help="stored keys")
+    p.add_argument("--lookups", type=int, default=100000, help="replays timed per size")
+    p.set_defaults(func=cmd_bench_idempotency)
+
+    p = commands.add_parser("bench-import", help="measure cold import time against a target")
+    p.add_argument("modules", nargs="*", default=["Banking_xml_queries"], help="modules to import")
+    p.add_argument("--runs", type=int, default=5, help="fresh interpreters per module")
+    p.add_argument("--target-ms", type=float, default=100.0, help="median import time to stay under")
+    p.add_argument("--top", type=int, default=8, help="slowest modules to list (self time)")
+    p.set_defaults(func=cmd_bench_import)
+
+    p = commands.add_parser("validate-xml", help="validate an XML file's records against the entity XSD")
+    p.add_argument("--entity", required=True, choices=["users", "accounts", "transactions", "loans", "cards", "employees"])
+    p.add_argument("--file", required=True, help="document with the entity's root and item elements")
+    p.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    p.add_argument("--chunk-size", type=int, default=2000, help="records per validated document")
+    p.add_argument("--show", type=int, default=20, help="errors to print")
+    p.set_defaults(func=cmd_validate_xml)
+
+    p = commands.add_parser("bench-validate", help="measure batched XSD validation throughput")
+    p.add_argument("--rows", type=int, default=200000, help="synthetic transactions to validate")
+    p.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="worker counts to try")
+    p.add_argument("--chunk-size", type=int, default=2000, help="records per validated document")
+    p.set_defaults(func=cmd_bench_validate)
+
+    p = commands.add_parser("sync-replica", help="copy the database from the primary to read replicas")
+    p.add_argument("--to", required=True, help="replicas as host:port[,host:port...]")
+    p.set_defaults(func=cmd_sync_replica)
+
+    p = commands.add_parser("replica-status", help="measure replication lag of read replicas")
+    p.add_argument("--replicas", required=True, help="replicas as host:port[,host:port...]")
+    p.set_defaults(func=cmd_replica_status)
+
+    p = commands.add_parser("shard-status", help="account placement across shards")
+    p.add_argument("--shards", required=True, help="shards as host:port/db[,host:port/db...]; the first is the catalog")
+    p.add_argument("--settle", action="store_true", help="first retry cross-shard credits that failed")
+    p.set_defaults(func=cmd_shard_status)
+
+    p = commands.add_parser("backfill-alerts", help="raise alerts for existing transactions")
+    p.add_argument("--since", required=True, help="first transaction date to evaluate (ISO 8601)")
+    p.add_argument("--high-value", default="1000", help="high_value alert threshold")
+    p.set_defaults(func=cmd_backfill_alerts)
+
+    p = commands.add_parser("score-anomalies", help="flag transactions unusual for their account")
+    p.add_argument("--start", required=True, help="first transaction date (ISO 8601)")
+    p.add_argument("--end", required=True, help="last transaction date (ISO 8601)")
+    p.add_argument("--window", type=int, default=30, help="previous transactions per account for mean/std")
+    p.add_argument("--min-history", type=int, default=5, help="earlier transactions needed before scoring")
+    p.add_argument("--min-score", type=float, default=0.5, help="lowest score written back")
+    p.set_defaults(func=cmd_score_anomalies)
+
+    p = commands.add_parser("reconcile", help="check account balances against the transaction ledger")
+    p.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    p.add_argument("--out", default="Banking_System/reports", help="report directory")
+    p.add_argument("--skip-archive", action="store_true", help="ignore archived transactions")
+    p.set_defaults(func=cmd_reconcile)
+
+    p = commands.add_parser("check-integrity", help="check references between documents and validate them against their XSDs")
+    p.add_argument("--source", choices=["files", "db"], default="files", help="read the XML files or the database")
+    p.add_argument("--data-dir", default="Banking_System", help="directory of the XML files (--source files)")
+    p.add_argument("--workers", type=int, default=None, help="validation worker processes (default: CPU count)")
+    p.add_argument("--chunk-size", type=int, default=5000, help="records checked and validated at a time")
+    p.add_argument("--max-issues", type=int, default=1000, help="issues listed in the report (all are counted)")
+    p.add_argument("--out", default="Banking_System/reports", help="report directory")
+    p.set_defaults(func=cmd_check_integrity)
+
+    p = commands.add_parser("snapshot-balances", help="store all account balances as of now (or --at)")
+    p.add_argument("--at", help="past date/time to snapshot (ISO 8601; a date means end of day)")
+    p.add_argument("--maintain-balances", action="store_true", required=True,
+                   help="confirm every writer runs with maintain_balances=True (required)")
+    p.set_defaults(func=cmd_snapshot_balances)
+
+    p = commands.add_parser("balance-at", help="an account's balance at a point in time")
+    p.add_argument("--account", required=True)
+    p.add_argument("--at", required=True, help="date/time (ISO 8601; a date means end of day)")
+    p.add_argument("--maintain-balances", action="store_true", required=True,
+                   help="confirm every writer runs with maintain_balances=True (required)")
+    p.set_defaults(func=cmd_balance_at)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,261 @@
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Iterable, List, Optional
+
+from Banking_changelog import ChangeLog, ChangeLogConsumer
+
+ALERT_RULES = ('high_value', 'velocity', 'window_amount')
+
+
+def _cents(amount) -> int:
+    return int((Decimal(str(amount)) * 100).to_integral_value())
+
+
+class AlertStore:
+    """SQLite table of alerts, one row per (rule, transaction).
+
+    Inserting the same alert twice is a no-op, so replaying change records is safe. The
+    store also keeps the date from which it holds every alert (see covered_since): the
+    engine only sees transactions written after it started, unless they were backfilled.
+    """
+
+    def __init__(self, path: str = os.path.join("Banking_System", "alerts", "alerts.db")):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS alerts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    rule TEXT NOT NULL,
+                    transaction_id TEXT NOT NULL,
+                    account_id TEXT NOT NULL,
+                    amount TEXT NOT NULL,
+                    amount_cents INTEGER NOT NULL,
+                    tx_date TEXT NOT NULL,
+                    detail TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    UNIQUE (rule, transaction_id)
+                )''')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS alerts_by_date ON alerts (rule, tx_date)')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+
+    def covered_since(self) -> Optional[str]:
+        """Earliest transaction date from which every alert is in the store, None before any backfill"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'covered_since'").fetchone()
+        return row[0] if row else None
+
+    def mark_covered(self, since: str) -> None:
+        """Record that transactions dated on or after since were all evaluated (keeps the earliest)"""
+        with self._lock, self._conn:
+            self._conn.execute('''
+                INSERT INTO meta (key, value) VALUES ('covered_since', ?)
+                ON CONFLICT (key) DO UPDATE SET value = min(value, excluded.value)''', (since,))
+
+    def add(self, alerts: Iterable[Dict]) -> int:
+        """Store alerts, returning how many were new"""
+        rows = [(a['rule'], a['TransactionID'], a['AccountID'], str(a['Amount']), _cents(a['Amount']),
+                 a['Date'], json.dumps(a.get('detail', {}), default=str), datetime.now().isoformat(timespec='seconds'))
+                for a in alerts]
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany('''
+                INSERT OR IGNORE INTO alerts
+                (rule, transaction_id, account_id, amount, amount_cents, tx_date, detail, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', rows)
+            return self._conn.total_changes - before
+
+    def query(self, rule: Optional[str] = None, since: Optional[str] = None, min_amount: Optional[Decimal] = None,
+              account_id: Optional[str] = None, limit: int = 1000) -> List[Dict]:
+        """Alerts matching the filters, largest amount first then newest"""
+        conditions, params = [], []
+        if rule:
+            conditions.append('rule = ?')
+            params.append(rule)
+        if since:
+            conditions.append('tx_date >= ?')
+            params.append(since)
+        if min_amount is not None:
+            conditions.append('amount_cents >= ?')
+            params.append(_cents(min_amount))
+        if account_id:
+            conditions.append('account_id = ?')
+            params.append(account_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        with self._lock:
+            cursor = self._conn.execute(f'''
+                SELECT rule, transaction_id, account_id, amount, tx_date, detail, created_at FROM alerts
+                {where} ORDER BY amount_cents DESC, tx_date DESC LIMIT ?''', params + [limit])
+            rows = cursor.fetchall()
+        return [{'Rule': rule, 'TransactionID': tx, 'AccountID': acc, 'Amount': Decimal(amount),
+                 'Date': date, 'Detail': json.loads(detail), 'DetectedAt': created}
+                for rule, tx, acc, amount, date, detail, created in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class _AccountWindow:
+    """Outgoing transactions of one account inside the sliding window"""
+    __slots__ = ('events', 'total_cents')
+
+    def __init__(self):
+        self.events = deque()  # (datetime, cents)
+        self.total_cents = 0
+
+
+class AlertEngine:
+    """Incremental alerting over newly inserted transactions.
+
+    Consumes 'create' records for transactions from the ChangeLog (as consumer
+    consumer_name, so restarts resume where they stopped) and evaluates, per sending account:
+        high_value     Amount >= high_value
+        velocity       at least max_count outgoing transactions within window
+        window_amount  outgoing total within window >= max_window_amount
+    Windows use the transaction Date (event time). Memory is bounded: each account keeps only
+    the events inside its window, capped at max_events_per_account (beyond that the window
+    total undercounts), and at most max_accounts windows are kept, least recently active
+    dropped first.
+    """
+
+    def __init__(self, change_log: ChangeLog, store: AlertStore, consumer_name: str = "alerts",
+                 high_value: Decimal = Decimal(5000), window: timedelta = timedelta(hours=1),
+                 max_count: int = 10, max_window_amount: Decimal = Decimal(20000),
+                 max_accounts: int = 100000, max_events_per_account: int = 1000):
+        self.consumer = ChangeLogConsumer(change_log, consumer_name)
+        self.store = store
+        self.high_value_cents = _cents(high_value)
+        self.window = window
+        self.max_count = max_count
+        self.max_window_cents = _cents(max_window_amount)
+        self.max_accounts = max_accounts
+        self.max_events_per_account = max(max_events_per_account, max_count)
+        self._windows: "OrderedDict[str, _AccountWindow]" = OrderedDict()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def evaluate(self, transaction: Dict) -> List[Dict]:
+        """Update the sliding-window state with one transaction and return the alerts it raises"""
+        try:
+            cents = _cents(transaction['Amount'])
+            when = datetime.fromisoformat(str(transaction['Date'])[:19])
+        except (KeyError, ValueError, InvalidOperation):
+            return []
+        account = transaction.get('FromAccountID', '')
+
+        state = self._windows.pop(account, None) or _AccountWindow()
+        self._windows[account] = state  # most recently active last
+        if len(self._windows) > self.max_accounts:
+            self._windows.popitem(last=False)
+
+        state.events.append((when, cents))
+        state.total_cents += cents
+        while state.events and (state.events[0][0] <= when - self.window
+                                or len(state.events) > self.max_events_per_account):
+            state.total_cents -= state.events.popleft()[1]
+
+        alert = {'TransactionID': transaction.get('TransactionID', ''), 'AccountID': account,
+                 'Amount': transaction['Amount'], 'Date': when.isoformat()}
+        alerts = []
+        if cents >= self.high_value_cents:
+            alerts.append({**alert, 'rule': 'high_value', 'detail': {'threshold': str(Decimal(self.high_value_cents) / 100)}})
+        if len(state.events) >= self.max_count:
+            alerts.append({**alert, 'rule': 'velocity',
+                           'detail': {'count': len(state.events), 'window_seconds': self.window.total_seconds()}})
+        if state.total_cents >= self.max_window_cents:
+            alerts.append({**alert, 'rule': 'window_amount',
+                           'detail': {'total': str(Decimal(state.total_cents) / 100), 'window_seconds': self.window.total_seconds()}})
+        return alerts
+
+    def run_once(self, max_records: int = 1000) -> int:
+        """Process the next batch of change records; returns how many new alerts were stored"""
+        records = self.consumer.poll(max_records)
+        if not records:
+            return 0
+        alerts = []
+        for record in records:
+            if record['op'] == 'create' and record['entity'] == 'transactions':
+                alerts.extend(self.evaluate(record['data']))
+        stored = self.store.add(alerts) if alerts else 0
+        self.consumer.commit(records[-1]['seq'])
+        return stored
+
+    def backfill(self, bank, start_date: str, chunk_size: int = 50000) -> int:
+        """Evaluate transactions already in the database dated on or after start_date.
+
+        Transactions are read one calendar month at a time (one partition with partitioned
+        storage) and sorted within the month, so windows see them in event-time order while
+        memory stays bounded by a month. The consumer is then moved past the change records
+        that were already in the log, since those transactions were just evaluated, and the
+        store is marked as covered from start_date.
+        """
+        fields = ['TransactionID', 'FromAccountID', 'ToAccountID', 'Amount', 'Date']
+        seq = self.consumer.log.last_sequence()
+        stored = 0
+        month = datetime.fromisoformat(start_date[:19]).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        lower = start_date
+        while True:
+            upper = (month + timedelta(days=32)).replace(day=1)
+            last = upper > datetime.now()
+            if last:  # the current month also takes anything dated later
+                nodes = f"{bank._transaction_nodes(lower)}[Date >= '{lower}']"
+            else:
+                upper_date = upper.isoformat(timespec='seconds')
+                nodes = f"{bank._transaction_nodes(lower, lower)}[Date >= '{lower}' and Date < '{upper_date}']"
+            rows = [row for chunk in bank.iter_rows(nodes, fields, chunk_size=chunk_size) for row in chunk]
+            rows.sort(key=lambda row: row[4])  # windows need event-time order
+            alerts = []
+            for row in rows:
+                alerts.extend(self.evaluate(dict(zip(fields, row))))
+            stored += self.store.add(alerts)
+            if last:
+                break
+            month, lower = upper, upper.isoformat(timespec='seconds')
+        if self.consumer.position < seq:
+            self.consumer.commit(seq)
+        self.store.mark_covered(start_date)
+        return stored
+
+    def start(self, poll_interval: float = 1.0, bank=None, backfill_days: Optional[float] = None) -> None:
+        """Keep consuming new change records on a daemon thread.
+
+        With bank and backfill_days, a store that was never backfilled (first start) is
+        first backfilled with the transactions of the last backfill_days days.
+        """
+        if self._thread is not None:
+            return
+
+        def loop():
+            if bank is not None and backfill_days is not None and self.store.covered_since() is None:
+                since = (datetime.now() - timedelta(days=backfill_days)).isoformat(timespec='seconds')
+                try:
+                    self.backfill(bank, since)
+                except Exception as e:
+                    print(f"Warning: alert backfill failed: {e}")
+            while not self._stop.is_set():
+                try:
+                    if self.consumer.poll(1):
+                        self.run_once()
+                    else:
+                        self._stop.wait(poll_interval)
+                except Exception as e:
+                    print(f"Warning: alert engine failed to process change records: {e}")
+                    self._stop.wait(poll_interval)
+
+        self._thread = threading.Thread(target=loop, name="alert-engine", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._stop.clear()
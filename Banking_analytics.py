@@ -0,0 +1,167 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from Banking_export import EXPORT_SCHEMA, MISSING_INT, MONEY_SCALE, columns_from_rows
+
+_CENT = Decimal(1).scaleb(-MONEY_SCALE)
+
+
+def _to_decimal(minor_units) -> Decimal:
+    return Decimal(int(minor_units)) * _CENT
+
+
+def _normalized(value: Decimal) -> Decimal:
+    """Drop trailing zeros like XQuery's xs:decimal serialization does (1500.50 -> 1500.5)"""
+    value = value.normalize()
+    return value.quantize(Decimal(1)) if value == value.to_integral() else value
+
+
+class AnalyticsSnapshot:
+    """Users, accounts and transactions held as numpy column arrays.
+
+    Accounts carry the integer code of their owner (index into user_ids), transactions are
+    kept sorted by Date so time-window filters are a binary search, and all money is int64
+    cents. Report methods return the same shapes as the BankingXMLQueries methods they replace.
+    """
+
+    def __init__(self, users: Dict[str, np.ndarray], accounts: Dict[str, np.ndarray],
+                 transactions: Dict[str, np.ndarray], categories: Dict[str, Dict[str, List[str]]]):
+        self.loaded_at = time.time()
+        self.categories = categories
+
+        self.user_ids = users['UserID']
+        self.user_names = users['FullName']
+        roles = categories['users'].get('Role', [])
+        customer_code = roles.index('customer') if 'customer' in roles else -2
+        self.user_is_customer = users['Role'] == customer_code
+
+        # Owner of every account as an index into user_ids (-1 = unknown user)
+        self.account_owner = np.full(len(accounts['UserID']), -1, dtype=np.int64)
+        if len(self.user_ids):
+            order = np.argsort(self.user_ids, kind='stable')
+            sorted_ids = self.user_ids[order]
+            pos = np.minimum(np.searchsorted(sorted_ids, accounts['UserID']), len(sorted_ids) - 1)
+            found = sorted_ids[pos] == accounts['UserID']
+            self.account_owner[found] = order[pos[found]]
+        self.account_balance = accounts['Balance']
+
+        # Transactions sorted by date (NaT sorts last and is excluded from time windows)
+        by_date = np.argsort(transactions['Date'], kind='stable')
+        self.tx = {name: column[by_date] for name, column in transactions.items()}
+
+    @classmethod
+    def load(cls, bank, chunk_size: int = 50000) -> "AnalyticsSnapshot":
+        columns, categories = {}, {}
+        for entity in ('users', 'accounts', 'transactions'):
+            fields = [field for field, _ in EXPORT_SCHEMA[entity]]
+            categories[entity] = {}
+            parts = []
+            for _, nodes in bank._entity_sources(entity):
+                for rows in bank.iter_rows(nodes, fields, chunk_size=chunk_size):
+                    parts.append(columns_from_rows(entity, rows, categories[entity]))
+            if not parts:
+                parts = [columns_from_rows(entity, [], categories[entity])]
+            columns[entity] = {name: np.concatenate([p[name] for p in parts]) for name in parts[0]}
+        return cls(columns['users'], columns['accounts'], columns['transactions'], categories)
+
+    def _decode(self, entity: str, column: str, codes: np.ndarray) -> List[Optional[str]]:
+        dictionary = self.categories[entity].get(column, [])
+        return [dictionary[c] if c >= 0 else None for c in codes]
+
+    # ==============================================
+    # Reports
+    # ==============================================
+
+    def _customer_totals(self) -> np.ndarray:
+        """Total balance (cents) per user, summed over all their accounts (missing balances count as 0)"""
+        totals = np.zeros(len(self.user_ids), dtype=np.int64)
+        known = (self.account_owner >= 0) & (self.account_balance != MISSING_INT)
+        np.add.at(totals, self.account_owner[known], self.account_balance[known])
+        return totals
+
+    def customer_segments(self, balance_thresholds: Optional[List[Decimal]] = None) -> Dict:
+        if balance_thresholds is None:
+            balance_thresholds = [Decimal(1000), Decimal(5000), Decimal(10000)]
+        thresholds = sorted(balance_thresholds)
+        cents = np.array([int(Decimal(t).scaleb(MONEY_SCALE)) for t in thresholds], dtype=np.int64)
+        totals = self._customer_totals()[self.user_is_customer]
+        # bucket i means thresholds[i-1] <= total < thresholds[i]
+        counts = np.bincount(np.searchsorted(cents, totals, side='right'), minlength=len(thresholds) + 1)
+        segments = {f"< {t}": int(c) for t, c in zip(thresholds, counts)}
+        segments[f">= {thresholds[-1]}"] = int(counts[-1])
+        return segments
+
+    def top_customers(self, top_n: int = 10) -> List[Dict]:
+        totals = self._customer_totals()
+        customers = np.flatnonzero(self.user_is_customer)
+        ranked = customers[np.argsort(-totals[customers], kind='stable')][:top_n]
+        return [{'UserID': str(self.user_ids[i]), 'FullName': str(self.user_names[i]),
+                 'TotalBalance': _normalized(_to_decimal(totals[i]))} for i in ranked]
+
+    def transaction_volume_report(self, period: str = 'month') -> List[Dict]:
+        unit = {'day': 'D', 'month': 'M', 'year': 'Y'}.get(period)
+        if not unit:
+            raise ValueError("Unsupported period. Choose 'day', 'month', or 'year'.")
+        dates = self.tx['Date']
+        valid = ~np.isnat(dates)
+        keys, inverse = np.unique(dates[valid].astype(f'datetime64[{unit}]'), return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(keys))
+        amounts = np.zeros(len(keys), dtype=np.int64)
+        valid_amounts = self.tx['Amount'][valid]
+        has_amount = valid_amounts != MISSING_INT  # counted, but not summed
+        np.add.at(amounts, inverse[has_amount], valid_amounts[has_amount])
+        return [{'period': str(k), 'count': int(c), 'amount': _normalized(_to_decimal(a))}
+                for k, c, a in zip(keys, counts, amounts)]
+
+    def high_value_transactions(self, threshold: Decimal, days: int = 7) -> List[Dict]:
+        start = np.datetime64((datetime.now() - timedelta(days=float(days))).replace(microsecond=0), 's')
+        first = np.searchsorted(self.tx['Date'], start, side='left')
+        window = slice(first, len(self.tx['Date']))
+        amounts = self.tx['Amount'][window]
+        hits = np.flatnonzero((amounts >= int(Decimal(threshold).scaleb(MONEY_SCALE)))
+                              & ~np.isnat(self.tx['Date'][window]))
+        if not len(hits):
+            return []
+        dates = self.tx['Date'][window][hits].astype(np.int64)
+        hits = hits[np.lexsort((-dates, -amounts[hits]))]  # amount desc, then date desc
+        rows = first + hits
+        types = self._decode('transactions', 'Type', self.tx['Type'][rows])
+        statuses = self._decode('transactions', 'Status', self.tx['Status'][rows])
+        date_strings = np.datetime_as_string(self.tx['Date'][rows], unit='s')
+        return [{
+            'TransactionID': str(self.tx['TransactionID'][r]),
+            'FromAccountID': str(self.tx['FromAccountID'][r]),
+            'ToAccountID': str(self.tx['ToAccountID'][r]),
+            'Amount': _to_decimal(self.tx['Amount'][r]),
+            'Date': str(d),
+            'Type': t,
+            'Status': st,
+        } for r, d, t, st in zip(rows, date_strings, types, statuses)]
+
+
+class AnalyticsEngine:
+    """Keeps an AnalyticsSnapshot loaded and reloads it once it is older than refresh_interval seconds"""
+
+    def __init__(self, bank, refresh_interval: float = 300, chunk_size: int = 50000):
+        self.bank = bank
+        self.refresh_interval = refresh_interval
+        self.chunk_size = chunk_size
+        self._snapshot: Optional[AnalyticsSnapshot] = None
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> AnalyticsSnapshot:
+        with self._lock:
+            stale = self._snapshot is None or time.time() - self._snapshot.loaded_at > self.refresh_interval
+            if stale:
+                self._snapshot = AnalyticsSnapshot.load(self.bank, self.chunk_size)
+            return self._snapshot
+
+    def refresh(self) -> AnalyticsSnapshot:
+        with self._lock:
+            self._snapshot = AnalyticsSnapshot.load(self.bank, self.chunk_size)
+            return self._snapshot
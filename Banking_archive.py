@@ -0,0 +1,155 @@
+import gzip
+import json
+import os
+import threading
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional
+
+
+class TransactionArchive:
+    """Append-only cold storage for aged transactions.
+
+    Each month is one gzip file (transactions-YYYY-MM.xml.gz) holding a flat list of
+    <Transaction> elements. Every archive run appends a new gzip member, so existing
+    data is never rewritten. index.json maps AccountID -> months it appears in, so a
+    lookup for one account only decompresses the months that contain it.
+    """
+
+    INDEX_FILE = "index.json"
+
+    def __init__(self, archive_dir: str = os.path.join("Banking_System", "archive")):
+        self.archive_dir = archive_dir
+        self._lock = threading.Lock()
+        self._index: Optional[Dict] = None
+        self._index_mtime: Optional[float] = None
+
+    def _month_path(self, month: str) -> str:
+        return os.path.join(self.archive_dir, f"transactions-{month}.xml.gz")
+
+    def _index_path(self) -> str:
+        return os.path.join(self.archive_dir, self.INDEX_FILE)
+
+    def _load_index(self) -> Dict:
+        """Index contents, re-read only when the file changed on disk"""
+        path = self._index_path()
+        try:
+            mtime = os.path.getmtime(path)
+        except FileNotFoundError:
+            return {"accounts": {}, "months": {}}
+        if self._index is None or mtime != self._index_mtime:
+            with open(path, "r", encoding="utf-8") as f:
+                self._index = json.load(f)
+            self._index_mtime = mtime
+        return self._index
+
+    def _save_index(self, index: Dict) -> None:
+        tmp_path = self._index_path() + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, separators=(",", ":"), sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._index_path())  # atomic, readers never see a half-written index
+
+    # ==============================================
+    # Writing
+    # ==============================================
+
+    def append(self, month: str, transactions: List[ET.Element]) -> int:
+        """Append transactions of one month to its archive file and update the index.
+
+        The data file is synced before the index is replaced, so a crash can at worst leave
+        rows that are archived but not yet deleted from the live database; readers drop
+        such duplicates by TransactionID.
+        """
+        if not transactions:
+            return 0
+        os.makedirs(self.archive_dir, exist_ok=True)
+        payload = "\n".join(ET.tostring(t, encoding="unicode").strip() for t in transactions) + "\n"
+        with self._lock:
+            with open(self._month_path(month), "ab") as raw:
+                with gzip.GzipFile(fileobj=raw, mode="ab") as gz:  # one new gzip member per run
+                    gz.write(payload.encode("utf-8"))
+                raw.flush()
+                os.fsync(raw.fileno())
+
+            index = self._load_index()
+            index = {"accounts": dict(index["accounts"]), "months": dict(index["months"])}
+            for t in transactions:
+                for tag in ("FromAccountID", "ToAccountID"):
+                    account_id = t.findtext(tag)
+                    if not account_id:
+                        continue
+                    months = index["accounts"].setdefault(account_id, [])
+                    if month not in months:
+                        months.append(month)
+                        months.sort()
+            index["months"][month] = index["months"].get(month, 0) + len(transactions)
+            self._save_index(index)
+            self._index, self._index_mtime = index, os.path.getmtime(self._index_path())
+        return len(transactions)
+
+    # ==============================================
+    # Reading
+    # ==============================================
+
+    def months(self) -> Dict[str, int]:
+        """Archived months and the number of transactions appended to each"""
+        return dict(self._load_index()["months"])
+
+    def months_for_account(self, account_id: str, start_date: Optional[str] = None,
+                           end_date: Optional[str] = None) -> List[str]:
+        months = self._load_index()["accounts"].get(account_id, [])
+        return [m for m in months
+                if (not start_date or m >= start_date[:7]) and (not end_date or m <= end_date[:7])]
+
+    def iter_month(self, month: str):
+        """Yield the archived Transaction elements of one month"""
+        path = self._month_path(month)
+        if not os.path.exists(path):
+            return
+        with gzip.open(path, "rb") as f:  # reads all appended members in sequence
+            for _, elem in ET.iterparse(_wrapped(f, b"<Transactions>", b"</Transactions>")):
+                if elem.tag == "Transaction":
+                    yield elem
+
+    def get_transactions_by_account(self, account_id: str, start_date: Optional[str] = None,
+                                    end_date: Optional[str] = None) -> List[ET.Element]:
+        """Archived transactions of an account, optionally restricted to [start_date, end_date]"""
+        seen = set()
+        result = []
+        for month in self.months_for_account(account_id, start_date, end_date):
+            for t in self.iter_month(month):
+                if account_id not in (t.findtext("FromAccountID"), t.findtext("ToAccountID")):
+                    continue
+                date = t.findtext("Date") or ""
+                if start_date and date < start_date:
+                    continue
+                # A plain end date includes the whole day
+                if end_date and date[:len(end_date)] > end_date:
+                    continue
+                tx_id = t.findtext("TransactionID")
+                if tx_id in seen:
+                    continue
+                seen.add(tx_id)
+                result.append(t)
+        return result
+
+
+class _wrapped:
+    """File-like object surrounding a byte stream with a root start and end tag"""
+
+    def __init__(self, f, head: bytes, tail: bytes):
+        self._parts = [head]
+        self._f = f
+        self._tail = tail
+
+    def read(self, size: int = -1) -> bytes:
+        if self._parts:
+            return self._parts.pop()
+        if self._f is not None:
+            data = self._f.read(size if size and size > 0 else 1 << 16)
+            if data:
+                return data
+            self._f = None
+            return self._tail
+        return b""
@@ -0,0 +1,189 @@
+import gzip
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from BaseXClient import Session
+
+MANIFEST_FILE = "manifest.json"
+COMPRESS_LEVEL = 6
+
+
+def _document_file(backup_dir: str, backup_id: str, database: str, path: str) -> str:
+    return os.path.join(backup_dir, backup_id, database, *path.split("/")) + ".gz"
+
+
+class BackupManager:
+    """Incremental, compressed backups of every database of a BankingXMLQueries layout.
+
+    Each backup is a directory backups/<id>/ holding the changed documents as
+    <database>/<path>.gz and a manifest.json describing the complete state: for every
+    document its sha256 and the backup whose directory holds its content. The sha256 is
+    taken of the serialized document on the server, so unchanged documents (e.g. past
+    transaction partitions) are never transferred. Documents are fetched and compressed
+    on worker threads; zlib releases the GIL, so compression runs in parallel.
+    """
+
+    def __init__(self, bank, backup_dir: str = os.path.join("Banking_System", "backups"),
+                 workers: Optional[int] = None, compress_level: int = COMPRESS_LEVEL):
+        self.bank = bank
+        self.backup_dir = backup_dir
+        self.workers = workers or os.cpu_count() or 1
+        self.compress_level = compress_level
+
+    def _databases(self) -> List[str]:
+        return sorted(set(self.bank.databases.values()) | {self.bank.db_name})
+
+    def list_backups(self) -> List[str]:
+        """Backup ids, oldest first"""
+        if not os.path.isdir(self.backup_dir):
+            return []
+        return sorted(name for name in os.listdir(self.backup_dir)
+                      if os.path.isfile(os.path.join(self.backup_dir, name, MANIFEST_FILE)))
+
+    def load_manifest(self, backup_id: Optional[str] = None) -> Optional[Dict]:
+        """Manifest of a backup (default: the latest), None if there is none"""
+        backup_id = backup_id or next(iter(reversed(self.list_backups())), None)
+        if backup_id is None:
+            return None
+        with open(os.path.join(self.backup_dir, backup_id, MANIFEST_FILE), encoding="utf-8") as f:
+            return json.load(f)
+
+    def _document_hashes(self, database: str) -> Dict[str, str]:
+        """path -> sha256 (hex) of every XML document of a database, computed on the server"""
+        result = self.bank._execute_query(f'''
+        string-join(
+            for $p in db:list("{database}")[db:is-xml("{database}", .)]
+            return $p || "&#9;" || string(xs:hexBinary(hash:sha256(serialize(doc("{database}/" || $p))))),
+            "&#10;")
+        ''')
+        return dict(line.split("\t") for line in result.splitlines() if line)
+
+    def _export_document(self, backup_id: str, database: str, path: str) -> Dict[str, int]:
+        content = self.bank._execute_query(f'doc("{database}/{path}")').encode("utf-8")
+        compressed = gzip.compress(content, compresslevel=self.compress_level)
+        file_path = _document_file(self.backup_dir, backup_id, database, path)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "wb") as f:
+            f.write(compressed)
+        return {'bytes': len(content), 'compressed_bytes': len(compressed)}
+
+    def backup(self, full: bool = False) -> Dict:
+        """Write a backup of the documents changed since the latest one (all of them if full).
+
+        The manifest is written last, so an interrupted backup is not listed and the next
+        run starts again from the previous complete one. Returns timing and size figures.
+        """
+        started = time.perf_counter()
+        previous = None if full else self.load_manifest()
+        known = previous['documents'] if previous else {}
+        stamp = backup_id = datetime.now().strftime('%Y%m%dT%H%M%S')
+        n = 1
+        while os.path.exists(os.path.join(self.backup_dir, backup_id)):  # more than one backup in a second
+            backup_id = f"{stamp}-{n}"
+            n += 1
+
+        documents: Dict[str, Dict[str, Dict]] = {}
+        changed = []
+        for database in self._databases():
+            documents[database] = {}
+            for path, sha256 in self._document_hashes(database).items():
+                before = known.get(database, {}).get(path)
+                if before and before['sha256'] == sha256:
+                    documents[database][path] = before
+                else:
+                    documents[database][path] = {'sha256': sha256, 'backup': backup_id}
+                    changed.append((database, path))
+        hashed = time.perf_counter()
+
+        os.makedirs(os.path.join(self.backup_dir, backup_id), exist_ok=True)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            sizes = list(executor.map(lambda item: self._export_document(backup_id, *item), changed))
+        manifest = {
+            'id': backup_id,
+            'base': previous['id'] if previous else None,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'documents': documents,
+        }
+        tmp_path = os.path.join(self.backup_dir, backup_id, MANIFEST_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.backup_dir, backup_id, MANIFEST_FILE))
+
+        seconds = time.perf_counter() - started
+        raw = sum(s['bytes'] for s in sizes)
+        return {
+            'id': backup_id,
+            'base': manifest['base'],
+            'documents': sum(len(paths) for paths in documents.values()),
+            'exported': len(changed),
+            'bytes': raw,
+            'compressed_bytes': sum(s['compressed_bytes'] for s in sizes),
+            'hash_seconds': round(hashed - started, 3),
+            'seconds': round(seconds, 3),
+            'mb_per_second': round(raw / seconds / 1e6, 2) if seconds else None,
+        }
+
+    def _restore_database(self, manifest: Dict, database: str, target: str, executor: ThreadPoolExecutor) -> int:
+        """Load one database's documents into a fresh database target, then rebuild its indexes"""
+        entries = manifest['documents'][database]
+
+        def read(path):
+            with open(_document_file(self.backup_dir, entries[path]['backup'], database, path), "rb") as f:
+                return path, gzip.decompress(f.read())
+
+        bank = self.bank
+        session = Session(bank.db_host, bank.db_port, bank.db_user, bank.db_pass)
+        try:
+            session.execute("SET AUTOFLUSH false")  # one flush after the bulk load
+            session.create(target, "")  # replaces an existing database of that name
+            raw = 0
+
+            def load(future):
+                nonlocal raw
+                path, content = future.result()
+                session.replace(path, content.decode("utf-8"))
+                raw += len(content)
+
+            in_flight = deque()  # documents are decompressed ahead of the upload, a few at a time
+            for path in sorted(entries):
+                in_flight.append(executor.submit(read, path))
+                if len(in_flight) >= 2 * self.workers:
+                    load(in_flight.popleft())
+            while in_flight:
+                load(in_flight.popleft())
+            session.execute("FLUSH")
+            session.execute("OPTIMIZE ALL")
+            return raw
+        finally:
+            session.close()
+
+    def restore(self, backup_id: Optional[str] = None, suffix: str = "") -> Dict:
+        """Recreate every database of a backup (default: the latest) on bank's server.
+
+        Databases are replaced as a whole: documents created after the backup are gone.
+        With suffix, database X is restored as X<suffix> instead (e.g. to check a backup
+        next to the live data). Returns timing and size figures.
+        """
+        manifest = self.load_manifest(backup_id)
+        if manifest is None:
+            raise ValueError(f"No backup found in {self.backup_dir}.")
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            raw = sum(self._restore_database(manifest, database, database + suffix, executor)
+                      for database in sorted(manifest['documents']))
+        seconds = time.perf_counter() - started
+        return {
+            'id': manifest['id'],
+            'databases': len(manifest['documents']),
+            'documents': sum(len(paths) for paths in manifest['documents'].values()),
+            'bytes': raw,
+            'seconds': round(seconds, 3),
+            'mb_per_second': round(raw / seconds / 1e6, 2) if seconds else None,
+        }
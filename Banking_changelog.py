@@ -0,0 +1,192 @@
+import bisect
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+
+    def _lock_file(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+    def _unlock_file(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+except ImportError:  # Windows
+    import msvcrt
+
+    def _lock_file(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+    def _unlock_file(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class ChangeLog:
+    """Durable, sequenced, append-only log of every write made through BankingXMLQueries.
+
+    One JSON object per line:
+        {"seq": 42, "ts": "2024-05-01T10:00:00", "op": "create", "entity": "transactions",
+         "key": "TX-1A2B3C4D", "data": {...}}
+    Appends are serialized across processes with a file lock, so sequence numbers are
+    gapless and strictly increasing. A sparse side index (seq -> byte offset every
+    index_every records) lets readers seek to any sequence without scanning the whole log.
+    """
+
+    def __init__(self, path: str = os.path.join("Banking_System", "changelog", "changes.log"),
+                 fsync: bool = True, index_every: int = 1000):
+        self.path = path
+        self.index_path = path + ".idx"
+        self.fsync = fsync
+        self.index_every = index_every
+        self._lock = threading.Lock()
+        self._last_seq = 0
+        self._scanned_to = 0  # byte offset up to which _last_seq is known
+        self._holding_file_lock = False
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    # ==============================================
+    # Writing
+    # ==============================================
+
+    def _catch_up(self, f) -> None:
+        """Read records appended by other processes since our last look, to learn the last seq"""
+        f.seek(self._scanned_to)
+        for line in f:
+            if line.endswith(b"\n"):
+                self._last_seq = json.loads(line)["seq"]
+                self._scanned_to += len(line)
+        if f.seek(0, os.SEEK_END) > self._scanned_to and self._holding_file_lock:
+            f.truncate(self._scanned_to)  # torn record left by a writer that crashed mid-append
+
+    def append(self, op: str, entity: str, key: str, data: Optional[Dict] = None) -> int:
+        """Append one change record and return its sequence number"""
+        with self._lock, open(self.path, "a+b") as f:
+            _lock_file(f)
+            self._holding_file_lock = True
+            try:
+                self._catch_up(f)
+                seq = self._last_seq + 1
+                record = {"seq": seq, "ts": datetime.now().isoformat(timespec="microseconds"),
+                          "op": op, "entity": entity, "key": key, "data": data or {}}
+                line = (json.dumps(record, default=str, separators=(",", ":")) + "\n").encode("utf-8")
+                offset = self._scanned_to
+                f.seek(0, os.SEEK_END)
+                f.write(line)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+                if seq % self.index_every == 1 or self.index_every == 1:
+                    with open(self.index_path, "a", encoding="utf-8") as idx:
+                        idx.write(f"{seq} {offset}\n")
+                self._last_seq = seq
+                self._scanned_to = offset + len(line)
+                return seq
+            finally:
+                self._holding_file_lock = False
+                _unlock_file(f)
+
+    def last_sequence(self) -> int:
+        if not os.path.exists(self.path):
+            return 0
+        with self._lock, open(self.path, "rb") as f:
+            self._catch_up(f)
+            return self._last_seq
+
+    # ==============================================
+    # Reading
+    # ==============================================
+
+    def _offset_for(self, seq: int) -> int:
+        """Byte offset of a record at or before seq, from the sparse index"""
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as idx:
+                entries = [tuple(map(int, line.split())) for line in idx if line.strip()]
+        except FileNotFoundError:
+            return 0
+        pos = bisect.bisect_right(entries, (seq, float("inf"))) - 1
+        return entries[pos][1] if pos >= 0 else 0
+
+    def read(self, after_seq: int = 0, max_records: int = 1000) -> List[Dict]:
+        """Up to max_records records with seq > after_seq, in order"""
+        return self.read_from(None, after_seq, max_records)[0]
+
+    def read_from(self, offset: Optional[int], after_seq: int = 0,
+                  max_records: int = 1000) -> Tuple[List[Dict], int]:
+        """Like read, starting at a byte offset returned by an earlier call (None: look it up
+        in the sparse index). Also returns the offset just past the last record read, so a
+        reader that keeps it neither re-reads the index nor rescans records it already saw."""
+        if not os.path.exists(self.path):
+            return [], 0
+        records = []
+        with open(self.path, "rb") as f:
+            position = self._offset_for(after_seq + 1) if offset is None else offset
+            f.seek(position)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # a record still being written
+                position += len(line)
+                record = json.loads(line)
+                if record["seq"] <= after_seq:
+                    continue
+                records.append(record)
+                if len(records) >= max_records:
+                    break
+        return records, position
+
+    def size(self) -> int:
+        """Bytes in the log: a reader whose offset is at the end has nothing new to read"""
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def tail(self, after_seq: int = 0, batch_size: int = 500, poll_interval: float = 1.0,
+             stop: Optional[threading.Event] = None) -> Iterator[List[Dict]]:
+        """Yield batches of new records forever (until stop is set), polling when caught up"""
+        while stop is None or not stop.is_set():
+            batch = self.read(after_seq, batch_size)
+            if batch:
+                after_seq = batch[-1]["seq"]
+                yield batch
+            elif stop is not None:
+                stop.wait(poll_interval)
+            else:
+                time.sleep(poll_interval)
+
+
+class ChangeLogConsumer:
+    """Named reader of a ChangeLog that remembers how far it got (committed sequence)"""
+
+    def __init__(self, log: ChangeLog, name: str):
+        self.log = log
+        self.name = name
+        self.checkpoint_path = os.path.join(os.path.dirname(os.path.abspath(log.path)), "consumers", f"{name}.json")
+        self.position = self._load()
+
+    def _load(self) -> int:
+        try:
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                return json.load(f)["seq"]
+        except FileNotFoundError:
+            return 0
+
+    def poll(self, max_records: int = 500) -> List[Dict]:
+        """Next batch after the committed position (not committed until commit())"""
+        return self.log.read(self.position, max_records)
+
+    def commit(self, seq: int) -> None:
+        os.makedirs(os.path.dirname(self.checkpoint_path), exist_ok=True)
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"seq": seq, "committed_at": datetime.now().isoformat(timespec="seconds")}, f)
+        os.replace(tmp_path, self.checkpoint_path)
+        self.position = seq
+
+    def seek(self, seq: int) -> None:
+        """Move the position (e.g. 0 to replay everything); takes effect for the next poll"""
+        self.position = seq
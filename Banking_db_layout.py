@@ -0,0 +1,128 @@
+import os
+import threading
+import time
+from typing import Dict, List
+
+from BaseXClient import Session
+from Banking_xml_queries import ENTITY_DOCUMENTS, BankingXMLQueries
+
+# 'single': every document in db_name; 'per-entity': <db_name>_<entity> for each entity
+LAYOUTS = ('single', 'per-entity')
+
+# Writes cycled through by the benchmark's writer threads, one entity each
+WRITE_KINDS = ('transactions', 'cards', 'accounts')
+
+
+def layout_databases(layout: str, db_name: str = 'banking') -> Dict[str, str]:
+    """entity -> database name for a layout, as BankingXMLQueries(databases=...) takes it"""
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unsupported layout '{layout}'. Choose one of {', '.join(LAYOUTS)}.")
+    if layout == 'single':
+        return {}
+    return {entity: f"{db_name}_{entity}" for entity in ENTITY_DOCUMENTS}
+
+
+def _create_scratch_databases(bank: BankingXMLQueries, data_dir: str) -> List[str]:
+    """Load the sample documents of data_dir into the databases of bank's layout"""
+    session = Session(bank.db_host, bank.db_port, bank.db_user, bank.db_pass)
+    try:
+        created = []
+        for entity, (document, _, _) in ENTITY_DOCUMENTS.items():
+            database = bank.databases[entity]
+            if database not in created:
+                session.execute(f"CREATE DB {database}")
+                created.append(database)
+            session.execute(f"OPEN {database}")
+            with open(os.path.join(data_dir, document), encoding="utf-8") as f:
+                session.add(document, f.read())
+        if bank.db_name not in created:
+            session.execute(f"CREATE DB {bank.db_name}")
+            created.append(bank.db_name)
+        return created
+    finally:
+        session.close()
+
+
+def _drop_databases(bank: BankingXMLQueries, databases: List[str]) -> None:
+    session = Session(bank.db_host, bank.db_port, bank.db_user, bank.db_pass)
+    try:
+        for database in databases:
+            session.execute(f"DROP DB {database}")
+    finally:
+        session.close()
+
+
+def _writer(bank: BankingXMLQueries, kind: str, ids: Dict[str, List[str]], deadline: float,
+            counts: List[int], slot: int) -> None:
+    """Repeat one kind of write until the deadline; counts[slot] is the number completed"""
+    done = 0
+    i = 0
+    while time.perf_counter() < deadline:
+        accounts, cards = ids['accounts'], ids['cards']
+        if kind == 'transactions':
+            bank.create_transaction({'FromAccountID': accounts[i % len(accounts)],
+                                     'ToAccountID': accounts[(i + 1) % len(accounts)],
+                                     'Amount': '0.01', 'Type': 'transfer', 'Status': 'pending'})
+        elif kind == 'cards':
+            bank.block_card(cards[i % len(cards)])
+        else:
+            bank.update_account_balance(accounts[i % len(accounts)], ids['balances'][i % len(accounts)])
+        done += 1
+        i += 1
+    counts[slot] = done
+
+
+def _reporter(bank: BankingXMLQueries, deadline: float, counts: List[int], slot: int) -> None:
+    done = 0
+    while time.perf_counter() < deadline:
+        bank.get_transaction_volume_report('day')
+        done += 1
+    counts[slot] = done
+
+
+def benchmark(connection: Dict, layouts=LAYOUTS, writers: int = 6, seconds: float = 10.0,
+              report: bool = True, data_dir: str = "Banking_System", prefix: str = "layout_bench") -> List[Dict]:
+    """Concurrent write throughput per database layout, on scratch copies of the sample data.
+
+    For each layout the documents of data_dir are loaded into fresh databases named after
+    prefix, then `writers` threads write for `seconds`, cycling through WRITE_KINDS
+    (pending transfers, card blocks, balance updates), while with `report` one more
+    thread keeps running the daily volume report. The scratch databases are dropped
+    afterwards. connection holds db_host/db_port/db_user/db_pass.
+    """
+    results = []
+    for layout in layouts:
+        bank = BankingXMLQueries(db_name=prefix, databases=layout_databases(layout, prefix), **connection)
+        created = _create_scratch_databases(bank, data_dir)
+        try:
+            accounts = bank._execute_query(f'doc("{bank.accounts_db}/accounts.xml")/Accounts/Account/AccountID/text()').split()
+            balances = bank._execute_query(f'doc("{bank.accounts_db}/accounts.xml")/Accounts/Account/Balance/text()').split()
+            cards = bank._execute_query(f'doc("{bank.cards_db}/cards.xml")/Cards/Card/CardID/text()').split()
+            ids = {'accounts': accounts, 'balances': balances, 'cards': cards}
+            kinds = [WRITE_KINDS[n % len(WRITE_KINDS)] for n in range(writers)]
+            counts = [0] * (writers + 1)  # one slot per thread, the reporter's last
+            started = time.perf_counter()
+            deadline = started + seconds
+            threads = [threading.Thread(target=_writer, args=(bank, kind, ids, deadline, counts, n))
+                       for n, kind in enumerate(kinds)]
+            if report:
+                threads.append(threading.Thread(target=_reporter, args=(bank, deadline, counts, writers)))
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+        finally:
+            _drop_databases(bank, created)
+        per_kind = {kind: sum(n for k, n in zip(kinds, counts) if k == kind) for kind in WRITE_KINDS}
+        writes = sum(per_kind.values())
+        results.append({
+            'layout': layout,
+            'databases': len(created),
+            'writers': writers,
+            'writes': writes,
+            'writes_per_second': round(writes / elapsed, 1),
+            **{f'{kind}_per_second': round(n / elapsed, 1) for kind, n in per_kind.items()},
+            'reports': counts[writers],
+        })
+    return results
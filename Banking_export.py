@@ -0,0 +1,253 @@
+import json
+import os
+import time
+from datetime import datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_EVEN
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from Banking_money import parse_money_column
+from Banking_xml_queries import BankingXMLQueries
+
+# Column kinds:
+#   str       -> numpy unicode array
+#   category  -> int32 codes into a dictionary kept in the manifest (-1 = missing)
+#   money     -> int64 minor units (value * 10**scale, rounded half-even); INT64_MIN = missing
+#   date      -> datetime64[D];  datetime -> datetime64[s]; NaT = missing
+# Secrets (PasswordHash, CardNumber, CVV) are deliberately not exported.
+EXPORT_SCHEMA = {
+    'users': [
+        ('UserID', 'str'), ('FullName', 'str'), ('Email', 'str'), ('Phone', 'str'),
+        ('Address/Country', 'category'), ('Address/City', 'category'), ('Address/Street', 'str'),
+        ('Role', 'category'), ('Username', 'str'),
+    ],
+    'accounts': [
+        ('AccountID', 'str'), ('UserID', 'str'), ('AccountType', 'category'), ('Balance', 'money'),
+        ('Currency', 'category'), ('Status', 'category'), ('OpenDate', 'date'),
+    ],
+    'transactions': [
+        ('TransactionID', 'str'), ('FromAccountID', 'str'), ('ToAccountID', 'str'), ('Amount', 'money'),
+        ('Date', 'datetime'), ('Type', 'category'), ('Status', 'category'),
+    ],
+    'loans': [
+        ('LoanID', 'str'), ('UserID', 'str'), ('LoanAmount', 'money'), ('InterestRate', 'money'),
+        ('StartDate', 'date'), ('Duration', 'category'), ('Status', 'category'),
+    ],
+    'cards': [
+        ('CardID', 'str'), ('AccountID', 'str'), ('CardType', 'category'),
+        ('ExpiryDate', 'date'), ('Status', 'category'),
+    ],
+    'employees': [
+        ('EmployeeID', 'str'), ('UserID', 'str'), ('Position', 'category'), ('BranchID', 'category'),
+        ('HireDate', 'date'), ('Salary', 'money'),
+    ],
+}
+
+MONEY_SCALE = 2
+MISSING_INT = np.iinfo(np.int64).min
+MANIFEST_FILE = "manifest.json"
+
+
+def to_minor_units(text: str, scale: int = MONEY_SCALE) -> int:
+    """Exact decimal string -> integer minor units (no float round trip)"""
+    return int(Decimal(text).scaleb(scale).to_integral_value(rounding=ROUND_HALF_EVEN))
+
+
+def _money_column(values: List[str], scale: int) -> np.ndarray:
+    try:
+        return parse_money_column(values, scale)  # vectorized for the usual fixed-scale text
+    except ValueError:
+        pass  # invalid values become missing below
+    out = np.empty(len(values), dtype=np.int64)
+    for i, v in enumerate(values):
+        try:
+            out[i] = to_minor_units(v, scale) if v else MISSING_INT
+        except InvalidOperation:
+            out[i] = MISSING_INT
+    return out
+
+
+def _time_column(values: List[str], unit: str) -> np.ndarray:
+    width = 10 if unit == 'D' else 19  # drop time part / fractional seconds and zones
+    cleaned = [v[:width] if v else 'NaT' for v in values]
+    try:
+        return np.array(cleaned, dtype=f'datetime64[{unit}]')
+    except ValueError:
+        out = np.empty(len(cleaned), dtype=f'datetime64[{unit}]')
+        for i, v in enumerate(cleaned):
+            try:
+                out[i] = np.datetime64(v, unit)
+            except ValueError:
+                out[i] = np.datetime64('NaT')
+        return out
+
+
+def _category_column(values: List[str], dictionary: List[str], lookup: Dict[str, int]) -> np.ndarray:
+    out = np.empty(len(values), dtype=np.int32)
+    for i, v in enumerate(values):
+        if not v:
+            out[i] = -1
+            continue
+        code = lookup.get(v)
+        if code is None:
+            code = lookup[v] = len(dictionary)
+            dictionary.append(v)
+        out[i] = code
+    return out
+
+
+def columns_from_rows(entity: str, rows: List[List[str]], categories: Dict[str, List[str]]) -> Dict[str, np.ndarray]:
+    """Convert string rows (in EXPORT_SCHEMA order) into typed numpy columns.
+
+    categories holds the per-column dictionaries and is extended in place, so codes stay
+    stable across chunks and across incremental exports.
+    """
+    columns = {}
+    for i, (field, kind) in enumerate(EXPORT_SCHEMA[entity]):
+        values = [row[i] if i < len(row) else '' for row in rows]
+        name = field.replace('/', '.')
+        if kind == 'money':
+            columns[name] = _money_column(values, MONEY_SCALE)
+        elif kind == 'date':
+            columns[name] = _time_column(values, 'D')
+        elif kind == 'datetime':
+            columns[name] = _time_column(values, 's')
+        elif kind == 'category':
+            dictionary = categories.setdefault(name, [])
+            lookup = {v: c for c, v in enumerate(dictionary)}
+            columns[name] = _category_column(values, dictionary, lookup)
+        else:
+            columns[name] = np.array(values, dtype=str)
+    return columns
+
+
+class ColumnarExporter:
+    """Writes a typed columnar snapshot (.npy per column) of the banking database.
+
+    Layout: <out_dir>/<entity>/part-NNNNN/<column>.npy plus <out_dir>/manifest.json, which
+    records the column kinds, category dictionaries, parts and, for every source document,
+    how many rows were exported and the ID of the last one. Incremental runs only fetch rows
+    appended after that ID. Deleting rows before it (archive_transactions) only moves it to
+    a lower position; if the row itself is gone the entity is exported in full again.
+
+    Updates are not captured: rows modified in place (e.g. a balance or status change) keep
+    their exported values, and deleted rows stay in the export, until the next full export.
+    """
+
+    def __init__(self, bank: BankingXMLQueries, out_dir: str, chunk_size: int = 50000):
+        self.bank = bank
+        self.out_dir = out_dir
+        self.chunk_size = chunk_size
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.out_dir, MANIFEST_FILE)
+
+    def load_manifest(self) -> Dict:
+        try:
+            with open(self._manifest_path(), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"entities": {}}
+
+    def _save_manifest(self, manifest: Dict) -> None:
+        tmp_path = self._manifest_path() + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(tmp_path, self._manifest_path())
+
+    def export(self, entities: Optional[List[str]] = None, full: bool = False) -> Dict[str, int]:
+        """Export the given entities (default: all). Returns the number of new rows per entity."""
+        os.makedirs(self.out_dir, exist_ok=True)
+        manifest = self.load_manifest()
+        exported = {}
+        for entity in entities or list(EXPORT_SCHEMA):
+            started = time.perf_counter()
+            state = manifest["entities"].get(entity)
+            if full or state is None:
+                state = self._reset_entity(entity)
+            fields = [field for field, _ in EXPORT_SCHEMA[entity]]
+            sources = self.bank._entity_sources(entity)
+            positions = {source: self._resume_position(state, source, nodes, fields[0]) for source, nodes in sources}
+            if None in positions.values():
+                state = self._reset_entity(entity)
+                positions = dict.fromkeys(positions, 0)
+            new_rows = 0
+            for source, nodes in sources:
+                offset = positions[source]
+                for rows in self.bank.iter_rows(nodes, fields, start=offset, chunk_size=self.chunk_size):
+                    self._write_part(entity, state, rows)
+                    offset += len(rows)
+                    new_rows += len(rows)
+                    state["offsets"][source] = offset
+                    state["last_ids"][source] = rows[-1][0]
+                    # Checkpoint after every part so an interrupted export can resume
+                    manifest["entities"][entity] = state
+                    self._save_manifest(manifest)
+            state["rows"] = sum(p["rows"] for p in state["parts"])
+            state["exported_at"] = datetime.now().isoformat(timespec="seconds")
+            state["last_run_seconds"] = round(time.perf_counter() - started, 3)
+            manifest["entities"][entity] = state
+            self._save_manifest(manifest)
+            exported[entity] = new_rows
+        return exported
+
+    def _resume_position(self, state: Dict, source: str, nodes: str, key_field: str) -> Optional[int]:
+        """Number of a source's rows up to and including the last exported one, None if it is gone.
+
+        The stored offset is only a hint: rows deleted before the last exported one shift
+        it, so the row is looked up by its ID.
+        """
+        offset = state["offsets"].get(source, 0)
+        last_id = state.get("last_ids", {}).get(source)
+        if offset == 0:
+            return 0
+        if last_id is None:
+            return None  # manifest without IDs: positions cannot be trusted
+        last = self.bank._xquery_literal(last_id)
+        result = self.bank._execute_query(f'''
+        let $items := {nodes}
+        return if (string($items[{offset}]/{key_field}) = {last}) then {offset}
+        else (for $x at $i in $items where string($x/{key_field}) = {last} return $i)[1]
+        ''').strip()
+        return int(result) if result else None
+
+    def _reset_entity(self, entity: str) -> Dict:
+        entity_dir = os.path.join(self.out_dir, entity)
+        if os.path.isdir(entity_dir):
+            for part in os.listdir(entity_dir):
+                part_dir = os.path.join(entity_dir, part)
+                for name in os.listdir(part_dir):
+                    os.remove(os.path.join(part_dir, name))
+                os.rmdir(part_dir)
+        return {
+            "columns": [{"name": f.replace('/', '.'), "kind": k, **({"scale": MONEY_SCALE} if k == 'money' else {})}
+                        for f, k in EXPORT_SCHEMA[entity]],
+            "categories": {},
+            "parts": [],
+            "offsets": {},
+            "last_ids": {},
+            "rows": 0,
+        }
+
+    def _write_part(self, entity: str, state: Dict, rows: List[List[str]]) -> None:
+        part = f"part-{len(state['parts']):05d}"
+        part_dir = os.path.join(self.out_dir, entity, part)
+        os.makedirs(part_dir, exist_ok=True)
+        for name, column in columns_from_rows(entity, rows, state["categories"]).items():
+            np.save(os.path.join(part_dir, f"{name}.npy"), column)
+        state["parts"].append({"name": part, "rows": len(rows)})
+
+
+def load_columns(out_dir: str, entity: str, columns: Optional[List[str]] = None, mmap: bool = True) -> Dict[str, np.ndarray]:
+    """Read an exported entity back as one array per column (parts concatenated)"""
+    with open(os.path.join(out_dir, MANIFEST_FILE), "r", encoding="utf-8") as f:
+        state = json.load(f)["entities"][entity]
+    names = columns or [c["name"] for c in state["columns"]]
+    mode = "r" if mmap else None
+    result = {}
+    for name in names:
+        parts = [np.load(os.path.join(out_dir, entity, p["name"], f"{name}.npy"), mmap_mode=mode)
+                 for p in state["parts"]]
+        result[name] = np.concatenate(parts) if parts else np.array([])
+    return result
@@ -0,0 +1,61 @@
+import threading
+from typing import Dict, Tuple
+
+# Counters live in the main database (db_name) of the layout
+SEQUENCES_PATH = "ids/sequences.xml"
+
+# Allocated IDs are PREFIX-<10 digits>: never equal to a random PREFIX-<8 hex> ID
+ID_WIDTH = 10
+
+
+def format_id(prefix: str, number: int) -> str:
+    return f"{prefix}-{number:0{ID_WIDTH}d}"
+
+
+class IdAllocator:
+    """Sequential IDs per prefix, reserved from the server block_size at a time.
+
+    A reservation is one updating query that moves the prefix's counter in
+    ids/sequences.xml forward by block_size and returns its previous value. BaseX runs
+    updating queries on a database one at a time, so every process gets a disjoint
+    block and no ID is handed out twice; IDs of a block are then handed out locally
+    without a round trip. IDs left in a block when the process exits are skipped, so
+    sequences have gaps but never repeats.
+    """
+
+    def __init__(self, bank, block_size: int = 1000):
+        if block_size < 1:
+            raise ValueError("block_size must be at least 1.")
+        self.bank = bank
+        self.block_size = block_size
+        self._blocks: Dict[str, Tuple[int, int]] = {}  # prefix -> (next, end)
+        self._lock = threading.Lock()
+        self.reservations = 0
+
+    def _reserve(self, prefix: str) -> int:
+        """First number of a fresh block for prefix"""
+        path = f"{self.bank.db_name}/{SEQUENCES_PATH}"
+        query = f'''
+        let $s := if (doc-available("{path}")) then doc("{path}")/Sequences/Sequence[@name = "{prefix}"] else ()
+        let $next := if ($s) then xs:integer($s/@next) else 1
+        let $sequence := <Sequence name="{prefix}" next="{{$next + {self.block_size}}}"/>
+        return (
+          update:output($next),
+          if ($s) then replace value of node $s/@next with $next + {self.block_size}
+          else if (doc-available("{path}")) then insert node $sequence into doc("{path}")/Sequences
+          else db:add("{self.bank.db_name}", <Sequences>{{$sequence}}</Sequences>, "{SEQUENCES_PATH}")
+        )
+        '''
+        start = int(self.bank._execute_query(query, write=True).strip())
+        self.reservations += 1
+        return start
+
+    def next_id(self, prefix: str) -> str:
+        """A new ID such as TX-0000001001, unique across processes sharing the database"""
+        with self._lock:
+            number, end = self._blocks.get(prefix, (0, 0))
+            if number >= end:
+                number = self._reserve(prefix)
+                end = number + self.block_size
+            self._blocks[prefix] = (number + 1, end)
+        return format_id(prefix, number)
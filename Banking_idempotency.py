@@ -0,0 +1,157 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+# Results starting with this mean the outcome is unknown (e.g. the connection dropped):
+# the write may or may not have committed, so a retry runs the request again
+TRANSIENT_ERROR_PREFIX = "An error occurred"
+
+
+def key_transaction_id(key: str) -> str:
+    """TransactionID derived from an idempotency key, e.g. TX-K3F2A...; the K keeps it apart
+    from random (8 hex digits) and allocated (10 digits) IDs"""
+    return "TX-K" + hashlib.sha256(key.encode("utf-8")).hexdigest()[:20].upper()
+
+
+def request_fingerprint(request: Dict) -> bytes:
+    """sha256 of a request's fields, independent of their order"""
+    return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode("utf-8")).digest()
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "expires_at", "result", "done")
+
+    def __init__(self, fingerprint: bytes, expires_at: float):
+        self.fingerprint = fingerprint
+        self.expires_at = expires_at
+        self.result: Optional[str] = None
+        self.done = threading.Event()
+
+
+class IdempotencyStore:
+    """In-memory idempotency keys with a TTL, for create_transaction retries.
+
+    The first request with a key runs; its result is kept for ttl_seconds and returned
+    as is to every replay with the same key, without touching the database. A replay that
+    arrives while the first request is still running waits for its result. Reusing a
+    key for a request with different fields is refused. Keys are looked up in a dict
+    (O(1) however many there are) and kept in insertion order, which with a single TTL
+    is also expiry order, so expired keys are dropped from the front at O(1) each.
+
+    When the outcome of the first request is unknown (it raised, e.g. timed out, or
+    returned TRANSIENT_ERROR_PREFIX) the key stays, marked unknown, and the next request
+    with it runs again. That re-run must not post twice: run_create_transaction gives it
+    the same TransactionID, so it finds the earlier write instead of adding another.
+
+    Keys live in this process only: share one store between the BankingXMLQueries
+    instances of a process, and route a client's retries to the same process.
+    """
+
+    def __init__(self, ttl_seconds: float = 24 * 3600, max_keys: int = 1000000):
+        self.ttl_seconds = ttl_seconds
+        self.max_keys = max_keys
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._replays = 0
+        self._conflicts = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _expire(self, now: float) -> None:
+        """Drop expired keys, and the oldest ones beyond max_keys (never one still running)"""
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if not entry.done.is_set() or (entry.expires_at > now and len(self._entries) <= self.max_keys):
+                break
+            del self._entries[key]
+
+    def get(self, key: str) -> Optional[str]:
+        """Stored result for a key, None if unknown, expired or still running"""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or not entry.done.is_set() or entry.expires_at <= time.monotonic():
+            return None
+        return entry.result
+
+    def run(self, key: str, request: Dict, call: Callable[[], str]) -> str:
+        """call() once per key: its result, or the result of the first request with this key"""
+        fingerprint = request_fingerprint(request)
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                self._expire(now)
+                entry = self._entries.get(key)
+                if entry is not None and entry.done.is_set() and entry.expires_at <= now:
+                    del self._entries[key]
+                    entry = None
+                if entry is not None and entry.fingerprint != fingerprint:
+                    self._conflicts += 1
+                    return f"Cannot process request: idempotency key {key} was already used for a different request"
+                if entry is None or (entry.done.is_set() and entry.result is None):
+                    # First request with this key, or a re-run after an unknown outcome
+                    entry = self._entries[key] = _Entry(fingerprint, now + self.ttl_seconds)
+                    self._entries.move_to_end(key)
+                    break
+            entry.done.wait()
+            if entry.result is not None:
+                with self._lock:
+                    self._replays += 1
+                return entry.result
+            # The outcome of the request we waited for is unknown: run this one
+
+        try:
+            result = call()
+        except BaseException:
+            entry.done.set()  # result None: outcome unknown, the key stays for a re-run
+            raise
+        if not result.startswith(TRANSIENT_ERROR_PREFIX):
+            entry.result = result
+        entry.done.set()
+        return result
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'keys': len(self._entries), 'replays': self._replays, 'conflicts': self._conflicts}
+
+
+def run_create_transaction(store: IdempotencyStore, key: str, transaction_data: Dict,
+                           create: Callable[[Dict], str]) -> str:
+    """create(transaction_data) at most once per idempotency key.
+
+    Without a TransactionID in the request, the ID is derived from the key, so a re-run
+    after an unknown outcome cannot add a second transaction: if the earlier attempt did
+    commit, the re-run hits the existing-ID check, which is reported as the success it was.
+    """
+    if 'TransactionID' in transaction_data:
+        return store.run(key, transaction_data, lambda: create(transaction_data))
+    transaction_id = key_transaction_id(key)
+    data = {**transaction_data, 'TransactionID': transaction_id}
+
+    def call():
+        result = create(data)
+        if result.startswith(f"Cannot create transaction: Transaction ID {transaction_id} already exists"):
+            return f"Transaction {transaction_id} created successfully."
+        return result
+
+    return store.run(key, transaction_data, call)
+
+
+def benchmark(sizes: List[int] = (10000, 100000, 1000000), lookups: int = 100000) -> List[Dict]:
+    """Microseconds per replayed request with growing numbers of stored keys"""
+    results = []
+    for size in sizes:
+        store = IdempotencyStore()
+        request = {'FromAccountID': 'ACC1001', 'ToAccountID': 'ACC1002', 'Amount': '10.00'}
+        for i in range(size):
+            store.run(f"key-{i}", request, lambda: "Transaction TX created successfully.")
+        keys = [f"key-{i * 7919 % size}" for i in range(lookups)]
+        started = time.perf_counter()
+        for key in keys:
+            store.run(key, request, lambda: "not a replay")
+        seconds = time.perf_counter() - started
+        results.append({'keys': size, 'replay_us': round(seconds / lookups * 1e6, 2)})
+    return results
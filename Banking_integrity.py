@@ -0,0 +1,267 @@
+import csv
+import json
+import os
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from Banking_validation import BatchValidator, _chunks
+from Banking_xml_queries import ENTITY_DOCUMENTS
+
+SOURCES = ('files', 'db')
+
+# Documents are scanned so that every key set is complete before anything refers to it
+SCAN_ORDER = ('users', 'accounts', 'employees', 'loans', 'cards', 'transactions')
+
+PRIMARY_KEYS = {
+    'users': 'UserID',
+    'accounts': 'AccountID',
+    'employees': 'EmployeeID',
+    'loans': 'LoanID',
+    'cards': 'CardID',
+    'transactions': 'TransactionID',
+}
+
+# entity -> (field, key set it must be found in); 'employee_users' holds users with Role employee
+FOREIGN_KEYS = {
+    'accounts': [('UserID', 'users')],
+    'employees': [('UserID', 'users'), ('UserID', 'employee_users')],
+    'loans': [('UserID', 'users')],
+    'cards': [('AccountID', 'accounts')],
+    'transactions': [('FromAccountID', 'accounts'), ('ToAccountID', 'accounts')],
+}
+
+# Counterparties outside the bank (e.g. EXT-AMZN-123) have no Account element
+EXTERNAL_ACCOUNT_PREFIX = 'EXT-'
+
+# Loan payments name the loan (e.g. LOAN1003) as their counterparty, checked against loans
+LOAN_ACCOUNT_PREFIX = 'LOAN'
+
+ISSUE_COLUMNS = ['entity', 'document', 'index', 'id', 'check', 'field', 'value', 'message']
+
+
+class KeySet:
+    """Set of string keys stored as 64-bit hashes in sorted numpy runs (8 bytes per key).
+
+    Keys are added and looked up a chunk at a time. New keys form a sorted run; runs of
+    similar size are merged, so there are O(log n) runs and adding n keys costs
+    O(n log n) overall. Hashes come from hash(), so a KeySet is only meaningful inside the
+    process that built it. A 64-bit collision can make a missing key look present (odds
+    about n^2 / 2^65), never the other way round.
+    """
+
+    def __init__(self):
+        self._runs: List[np.ndarray] = []  # disjoint, largest first
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        return sum(run.nbytes for run in self._runs)
+
+    def _contains(self, hashes: np.ndarray) -> np.ndarray:
+        found = np.zeros(len(hashes), dtype=bool)
+        for run in self._runs:
+            positions = np.minimum(np.searchsorted(run, hashes), len(run) - 1)
+            found |= run[positions] == hashes
+        return found
+
+    def contains(self, keys: List[str]) -> np.ndarray:
+        """Boolean mask: which keys are in the set"""
+        return self._contains(np.fromiter(map(hash, keys), dtype=np.int64, count=len(keys)))
+
+    def add(self, keys: List[str]) -> np.ndarray:
+        """Add keys; returns a mask of the ones already present (earlier in keys included)"""
+        hashes = np.fromiter(map(hash, keys), dtype=np.int64, count=len(keys))
+        seen = self._contains(hashes)
+        order = np.argsort(hashes, kind='stable')  # stable: the first occurrence stays first
+        ordered = hashes[order]
+        seen[order[1:]] |= ordered[1:] == ordered[:-1]
+        run = np.sort(hashes[~seen])
+        self._size += len(run)
+        while self._runs and len(self._runs[-1]) <= 2 * len(run):
+            run = np.sort(np.concatenate((self._runs.pop(), run)))
+        if len(run):
+            self._runs.append(run)
+        return seen
+
+
+def iter_file_items(path: str, item_tag: str) -> Iterator:
+    """Item elements (lxml) of an XML file, parsed incrementally.
+
+    An element is cleared, and earlier ones dropped, once the caller asks for the next, so
+    memory stays flat however large the file is; use each element before moving on.
+    """
+    from lxml import etree
+    for _, element in etree.iterparse(path, events=("end",), tag=item_tag, huge_tree=True):
+        parent = element.getparent()
+        if parent is None or parent.getparent() is not None:
+            continue  # only children of the root element are items
+        element.tail = None
+        yield element
+        element.clear()
+        while element.getprevious() is not None:
+            del parent[0]
+
+
+def iter_db_items(bank, entity: str, chunk_size: int = 5000) -> Iterator[Tuple[str, object]]:
+    """(document path, item element) for every item of an entity in the database, chunk_size per query"""
+    from lxml import etree
+    _, root_tag, item_tag = ENTITY_DOCUMENTS[entity]
+    for path, nodes in bank._entity_sources(entity):
+        position = 0
+        while True:
+            result = bank._execute_query(f"<{root_tag}>{{subsequence({nodes}, {position + 1}, {chunk_size})}}</{root_tag}>")
+            items = list(etree.fromstring(result.encode("utf-8")).iterchildren(item_tag)) if result else []
+            for item in items:
+                item.tail = None
+                yield path, item
+            if len(items) < chunk_size:
+                break
+            position += len(items)
+
+
+class IntegrityChecker:
+    """Foreign keys, duplicate primary keys and XSD validity of all documents in one pass.
+
+    Documents are streamed in SCAN_ORDER. Each chunk of items has its keys added to the
+    entity's KeySet (flagging duplicates), its references looked up in the key sets
+    already complete, and is handed on to BatchValidator for XSD validation. Only the
+    key sets grow with the data; items are dropped chunk by chunk.
+    """
+
+    def __init__(self, xsd_dir: str, workers: Optional[int] = None, chunk_size: int = 5000, max_issues: int = 1000):
+        self.xsd_dir = xsd_dir
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.max_issues = max_issues
+        self.key_sets: Dict[str, KeySet] = {}
+        self.issues: List[Dict] = []
+        self.counts: Dict[str, Dict[str, int]] = {}
+
+    def _issue(self, entity: str, document: str, index: int, item_id: str, check: str,
+               field: str, value: str, message: str) -> None:
+        self.counts[entity][check] = self.counts[entity].get(check, 0) + 1
+        if len(self.issues) < self.max_issues:
+            self.issues.append({'entity': entity, 'document': document, 'index': index, 'id': item_id,
+                                'check': check, 'field': field, 'value': value, 'message': message})
+
+    def _check_keys(self, entity: str, chunk: List[Tuple[str, str, Dict[str, str]]], offset: int) -> None:
+        key_field = PRIMARY_KEYS[entity]
+        ids = [fields.get(key_field, '') for _, _, fields in chunk]
+        duplicate = self.key_sets.setdefault(entity, KeySet()).add(ids)
+        for i in np.flatnonzero(duplicate).tolist():
+            self._issue(entity, chunk[i][0], offset + i, ids[i], 'duplicate_key', key_field, ids[i],
+                        f"{key_field} {ids[i]} appears more than once")
+        if entity == 'users':
+            employees = [user_id for user_id, (_, _, fields) in zip(ids, chunk) if fields.get('Role') == 'employee']
+            self.key_sets.setdefault('employee_users', KeySet()).add(employees)
+
+        failed = set()  # (row, field): a reference already reported is not checked again
+        for field, target in FOREIGN_KEYS.get(entity, []):
+            values = [fields.get(field, '') for _, _, fields in chunk]
+            found = self.key_sets.setdefault(target, KeySet()).contains(values)
+            targets = [target] * len(values)
+            if target == 'accounts':
+                loan_rows = [i for i in np.flatnonzero(~found).tolist() if values[i].startswith(LOAN_ACCOUNT_PREFIX)]
+                if loan_rows:
+                    found[loan_rows] = self.key_sets.setdefault('loans', KeySet()).contains([values[i] for i in loan_rows])
+                    for i in loan_rows:
+                        targets[i] = 'loans'
+            for i in np.flatnonzero(~found).tolist():
+                value = values[i]
+                if (i, field) in failed or (target == 'accounts' and value.startswith(EXTERNAL_ACCOUNT_PREFIX)):
+                    continue
+                failed.add((i, field))
+                if target == 'employee_users':
+                    self._issue(entity, chunk[i][0], offset + i, ids[i], 'role_mismatch', field, value,
+                                f"{field} {value} is not a user with Role employee")
+                else:
+                    self._issue(entity, chunk[i][0], offset + i, ids[i], 'missing_reference', field, value,
+                                f"{field} {value} not found in {targets[i]}")
+
+    def check_entity(self, entity: str, items: Iterator[Tuple[str, object]]) -> None:
+        """Run every check over one entity's (document path, lxml item element) stream"""
+        from lxml import etree
+        _, root_tag, _ = ENTITY_DOCUMENTS[entity]
+        # Only the serialized item and its child texts are kept, until the chunk is checked
+        rows = ((path, etree.tostring(item, encoding="unicode"), {child.tag: child.text or '' for child in item})
+                for path, item in items)
+        self.counts[entity] = {'rows': 0}
+        documents: List[str] = []  # document of each row, run-length encoded with starts
+        starts: List[int] = []
+
+        def records():
+            for chunk in _chunks(rows, self.chunk_size):
+                offset = self.counts[entity]['rows']
+                for i, (path, _, _) in enumerate(chunk):
+                    if not documents or documents[-1] != path:
+                        documents.append(path)
+                        starts.append(offset + i)
+                self._check_keys(entity, chunk, offset)
+                self.counts[entity]['rows'] += len(chunk)
+                for _, record, _ in chunk:
+                    yield record
+
+        validator = BatchValidator(os.path.join(self.xsd_dir, f"{entity}.xsd"), root_tag,
+                                   workers=self.workers, chunk_size=self.chunk_size)
+        for index, message in validator.validate(records()):
+            document = documents[int(np.searchsorted(starts, index, side='right')) - 1]
+            self._issue(entity, document, index, '', 'schema', '', '', message)
+
+    def run(self, source: str, bank=None, data_dir: str = "Banking_System") -> Dict:
+        """Check every document from the Banking_System files or the database and return the report"""
+        if source not in SOURCES:
+            raise ValueError(f"Unsupported source '{source}'. Choose one of {', '.join(SOURCES)}.")
+        if source == 'db' and bank is None:
+            raise ValueError("The db source needs a BankingXMLQueries connection.")
+        started = time.perf_counter()
+        for entity in SCAN_ORDER:
+            document, _, item_tag = ENTITY_DOCUMENTS[entity]
+            if source == 'db':
+                items = iter_db_items(bank, entity, self.chunk_size)
+            else:
+                path = os.path.join(data_dir, document)
+                items = ((path, item) for item in iter_file_items(path, item_tag))
+            self.check_entity(entity, items)
+        return {
+            'checked_at': datetime.now().isoformat(timespec='seconds'),
+            'source': source,
+            'documents': self.counts,
+            'issue_count': sum(n for counts in self.counts.values() for check, n in counts.items() if check != 'rows'),
+            'issues': self.issues,
+            'key_set_bytes': sum(keys.nbytes for keys in self.key_sets.values()),
+            'seconds': round(time.perf_counter() - started, 3),
+        }
+
+
+def check_integrity(source: str = 'files', bank=None, data_dir: str = "Banking_System",
+                    workers: Optional[int] = None, chunk_size: int = 5000, max_issues: int = 1000) -> Dict:
+    """Referential integrity, duplicate keys and XSD validity of every document.
+
+    source 'files' reads the XML documents in data_dir, 'db' streams them from the database
+    of bank. At most max_issues issues are listed in the report; the per-document counts
+    cover all of them.
+    """
+    xsd_dir = bank.main_dir if source == 'db' and bank is not None else data_dir
+    checker = IntegrityChecker(xsd_dir, workers=workers, chunk_size=chunk_size, max_issues=max_issues)
+    return checker.run(source, bank, data_dir)
+
+
+def write_report(report: Dict, out_dir: str = os.path.join("Banking_System", "reports")) -> str:
+    """Write the issues as CSV plus a JSON summary; returns the CSV path"""
+    os.makedirs(out_dir, exist_ok=True)
+    stamp = report['checked_at'].replace(':', '').replace('-', '')
+    csv_path = os.path.join(out_dir, f"integrity-{stamp}.csv")
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=ISSUE_COLUMNS)
+        writer.writeheader()
+        writer.writerows(report['issues'])
+    summary = {k: v for k, v in report.items() if k != 'issues'}
+    with open(csv_path[:-4] + ".json", "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=1)
+    return csv_path
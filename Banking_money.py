@@ -0,0 +1,402 @@
+from __future__ import annotations
+
+import operator
+import threading
+import time
+from decimal import Decimal, InvalidOperation, ROUND_HALF_EVEN
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+DEFAULT_SCALE = 2
+
+# ISO 4217 minor unit digits that differ from DEFAULT_SCALE
+CURRENCY_SCALES = {
+    'JPY': 0, 'KRW': 0, 'VND': 0, 'CLP': 0, 'ISK': 0,
+    'BHD': 3, 'JOD': 3, 'KWD': 3, 'OMR': 3, 'TND': 3,
+}
+
+# Fields parsed into Money when BankingXMLQueries(money_type='minor'); rates stay Decimal
+MONEY_FIELDS = ('Balance', 'Amount', 'Salary')
+
+def currency_scale(currency: Optional[str]) -> int:
+    return CURRENCY_SCALES.get(currency, DEFAULT_SCALE) if currency else DEFAULT_SCALE
+
+
+def _parse_minor(text: str, scale: int) -> int:
+    """Decimal string -> minor units, exact; digits beyond scale are rounded half-even"""
+    text = text.strip()
+    if scale and len(text) > scale and text[-scale - 1] == '.':
+        # Fast path for the '1234.56' form every document uses: drop the point
+        try:
+            return int(text[:-scale - 1] + text[-scale:])
+        except ValueError:
+            pass
+    try:
+        return int(Decimal(text).scaleb(scale).to_integral_value(rounding=ROUND_HALF_EVEN))
+    except (InvalidOperation, ValueError, OverflowError):
+        raise ValueError(f"Invalid amount: {text!r}")
+
+
+class Money(int):
+    """An amount stored as an int of minor units (cents), typed by currency.
+
+    Every currency gets its own subclass (money_class) carrying `currency` and `scale`
+    as class attributes, so a value costs no more than a small int and sums and
+    comparisons between amounts of one currency run at int speed. Arithmetic and
+    comparisons with Decimal/int or with another currency work in major units and are
+    exact: both sides are rescaled to the finer scale. Mixed-currency results use the
+    currency-less class, just like summing Decimals ignores currency.
+
+    int(m) is the minor-unit count; use m.to_decimal() or str(m) for the amount itself.
+    """
+    __slots__ = ()
+    currency: Optional[str] = None
+    scale = DEFAULT_SCALE
+
+    @classmethod
+    def parse(cls, text: str) -> 'Money':
+        """'1234.56' -> 123456 minor units; ValueError for text that is not a finite number"""
+        dot = text.find('.')
+        if dot >= 0 and len(text) - dot == cls.scale + 1 and text.count('.') == 1:
+            try:
+                return cls(text.replace('.', ''))  # the common fixed-scale form: int() of the digits
+            except ValueError:
+                pass
+        return cls(_parse_minor(text, cls.scale))
+
+    @classmethod
+    def from_decimal(cls, value) -> 'Money':
+        return cls.parse(str(value))
+
+    @property
+    def minor(self) -> int:
+        return int(self)
+
+    def to_decimal(self) -> Decimal:
+        return Decimal(int(self)).scaleb(-self.scale)
+
+    def _align(self, other) -> Optional[Tuple[int, int, type]]:
+        """Both operands in minor units of a common scale, plus the class of the result"""
+        if isinstance(other, Money):
+            if other.scale == self.scale:
+                return int(self), int(other), type(self) if type(other) is type(self) else _scale_class(self.scale)
+            scale = max(self.scale, other.scale)
+            return (int(self) * 10 ** (scale - self.scale), int(other) * 10 ** (scale - other.scale),
+                    _scale_class(scale))
+        if type(other) is int:
+            return int(self), other * 10 ** self.scale, type(self)
+        if isinstance(other, (int, Decimal)) and not isinstance(other, bool):
+            value = Decimal(other)
+            if not value.is_finite():
+                return None
+            scale = max(self.scale, -value.as_tuple().exponent)  # keep all of other's digits
+            cls = type(self) if scale == self.scale else _scale_class(scale)
+            return int(self) * 10 ** (scale - self.scale), int(value.scaleb(scale)), cls
+        return None
+
+    def __add__(self, other):
+        if type(other) is type(self):
+            return type(self)(int.__add__(self, other))
+        aligned = self._align(other)
+        if aligned is None:
+            return NotImplemented
+        a, b, cls = aligned
+        return cls(a + b)
+
+    __radd__ = __add__  # sum() starts from 0
+
+    def __sub__(self, other):
+        aligned = self._align(other)
+        if aligned is None:
+            return NotImplemented
+        a, b, cls = aligned
+        return cls(a - b)
+
+    def __rsub__(self, other):
+        aligned = self._align(other)
+        if aligned is None:
+            return NotImplemented
+        a, b, cls = aligned
+        return cls(b - a)
+
+    def __mul__(self, other):
+        if isinstance(other, int) and not isinstance(other, (Money, bool)):
+            return type(self)(int(self) * other)
+        raise TypeError("Money can only be multiplied by an int; use to_decimal() for rates")
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        raise TypeError("Money does not support division; use to_decimal()")
+
+    __rtruediv__ = __floordiv__ = __rfloordiv__ = __mod__ = __rmod__ = __truediv__
+
+    def __neg__(self):
+        return type(self)(-int(self))
+
+    def __abs__(self):
+        return type(self)(abs(int(self)))
+
+    def _compare(self, other, op):
+        if type(other) is type(self):
+            return op(int(self), int(other))
+        aligned = self._align(other)
+        if aligned is None:
+            return NotImplemented
+        return op(aligned[0], aligned[1])
+
+    def __eq__(self, other):
+        return self._compare(other, operator.eq)
+
+    def __ne__(self, other):
+        return self._compare(other, operator.ne)
+
+    def __lt__(self, other):
+        return self._compare(other, operator.lt)
+
+    def __le__(self, other):
+        return self._compare(other, operator.le)
+
+    def __gt__(self, other):
+        return self._compare(other, operator.gt)
+
+    def __ge__(self, other):
+        return self._compare(other, operator.ge)
+
+    def __hash__(self):
+        return hash(self.to_decimal())  # equal amounts hash alike across scales and with Decimal
+
+    def __float__(self):
+        return int(self) / 10 ** self.scale
+
+    def __str__(self):
+        if self.scale == 0:
+            return int.__repr__(self)
+        minor = int(self)
+        whole, frac = divmod(abs(minor), 10 ** self.scale)
+        return f"{'-' if minor < 0 else ''}{whole}.{frac:0{self.scale}d}"
+
+    def __format__(self, spec):
+        return format(self.to_decimal(), spec) if spec else str(self)
+
+    def __repr__(self):
+        return f"{type(self).__name__}('{self}')"
+
+    def __reduce__(self):
+        return _restore, (self.currency, self.scale, int(self))  # the per-currency classes are dynamic
+
+    @staticmethod
+    def sum(values: Iterable['Money'], currency: Optional[str] = None) -> 'Money':
+        """Total of Money values: one plain int sum per scale (an empty total is zero in currency)"""
+        by_class: Dict[type, List[int]] = {}
+        for value in values:
+            by_class.setdefault(type(value), []).append(value)
+        if not by_class:
+            return money_class(currency)(0)
+        if len(by_class) == 1:
+            cls, items = by_class.popitem()
+            return cls(sum(map(int, items)))
+        scale = max(cls.scale for cls in by_class)
+        total = sum(sum(map(int, items)) * 10 ** (scale - cls.scale) for cls, items in by_class.items())
+        return _scale_class(scale)(total)
+
+
+_CLASSES: Dict[Tuple[Optional[str], int], type] = {}
+_CLASSES_LOCK = threading.Lock()
+
+
+def _class_for(currency: Optional[str], scale: int) -> type:
+    cls = _CLASSES.get((currency, scale))
+    if cls is None:
+        with _CLASSES_LOCK:
+            cls = _CLASSES.get((currency, scale))
+            if cls is None:
+                name = f"Money_{currency}" if currency else f"Money_{scale}"
+                cls = type(name, (Money,), {'__slots__': (), 'currency': currency, 'scale': scale})
+                _CLASSES[(currency, scale)] = cls
+    return cls
+
+
+def _scale_class(scale: int) -> type:
+    return _class_for(None, scale)
+
+
+def _restore(currency: Optional[str], scale: int, minor: int) -> Money:
+    return _class_for(currency, scale)(minor)
+
+
+def money_class(currency: Optional[str] = None) -> type:
+    """The Money subclass for a currency (scale from CURRENCY_SCALES); None = no currency"""
+    return _class_for(currency or None, currency_scale(currency))
+
+
+def parse_money(text: str, currency: Optional[str] = None) -> Money:
+    return money_class(currency).parse(text)
+
+
+MISSING = -2 ** 63  # INT64_MIN, as in Banking_export
+
+
+def _parse_joined(texts: List[str], scale: int) -> Optional[np.ndarray]:
+    """Vectorized parse for the case where every value is '-?digits.dd' with exactly scale
+    decimals (None otherwise): validate the joined bytes with numpy, then let numpy read
+    the digits with the decimal points removed."""
+    import numpy as np
+    joined = "\n".join(texts)
+    try:
+        raw = np.frombuffer(joined.encode('ascii'), dtype=np.uint8)
+    except UnicodeEncodeError:
+        return None
+    newlines = np.flatnonzero(raw == 10)
+    starts = np.r_[0, newlines + 1]
+    ends = np.r_[newlines, len(raw)]
+    if len(starts) != len(texts) or (ends - starts).max() > 19 or (ends - starts).min() < scale + 2:
+        return None  # empty values, or too long for int64
+    digits = int(np.count_nonzero((raw >= 48) & (raw <= 57)))
+    minus = np.flatnonzero(raw == 45)
+    if scale:
+        dots = np.flatnonzero(raw == 46)
+        if len(dots) != len(texts) or not np.array_equal(ends - dots, np.full(len(texts), scale + 1)):
+            return None
+    elif np.any(raw == 46):
+        return None
+    if digits + len(minus) + len(newlines) + (len(texts) if scale else 0) != len(raw):
+        return None  # characters other than digits, '-', '.' and separators
+    if len(minus) and not np.isin(minus, starts).all():
+        return None
+    values = np.fromstring(joined.replace('.', '') if scale else joined, dtype=np.int64, sep='\n')
+    return values if len(values) == len(texts) else None
+
+
+def parse_money_column(texts: List[str], scale: int = DEFAULT_SCALE) -> np.ndarray:
+    """Decimal strings -> int64 minor units; '' is missing (INT64_MIN), invalid text raises ValueError.
+
+    Columns in the canonical fixed-scale form (what the documents hold) are parsed by
+    numpy in one pass; anything else falls back to exact per-value parsing.
+    """
+    import numpy as np
+    if not texts:
+        return np.empty(0, dtype=np.int64)
+    values = _parse_joined(texts, scale)
+    if values is not None:
+        return values
+    out = np.empty(len(texts), dtype=np.int64)
+    for i, text in enumerate(texts):
+        out[i] = _parse_minor(text, scale) if text else MISSING
+    return out
+
+
+def money_column(values: List, scale: int = DEFAULT_SCALE) -> np.ndarray:
+    """Money/Decimal/str values -> int64 minor units at scale (None stays missing as INT64_MIN)"""
+    import numpy as np
+    classes = set(map(type, values))
+    if all(issubclass(cls, Money) and cls.scale == scale for cls in classes):
+        return np.fromiter(values, dtype=np.int64, count=len(values))  # already minor units
+    out = np.empty(len(values), dtype=np.int64)
+    for i, v in enumerate(values):
+        if isinstance(v, Money):
+            out[i] = int(v) * 10 ** (scale - v.scale) if v.scale <= scale else \
+                int(v.to_decimal().scaleb(scale).to_integral_value(rounding=ROUND_HALF_EVEN))
+        elif v is None or v == '' or (isinstance(v, float) and v != v):  # NaN: key missing in some rows
+            out[i] = MISSING
+        else:
+            out[i] = _parse_minor(str(v), scale)
+    return out
+
+
+def to_dataframe(rows: List[Dict], minor_units: bool = False) -> pd.DataFrame:
+    """DataFrame of parsed rows, Money columns converted straight to numpy.
+
+    Money columns become float64 in major units (what charts and Arrow expect), or int64
+    minor units at the column's finest scale with minor_units=True. Missing amounts are NaN
+    in the float form and INT64_MIN in the integer form. Other columns pass through.
+    """
+    import numpy as np
+    import pandas as pd
+    names = list(dict.fromkeys(name for row in rows for name in row))
+    columns = {}
+    for name in names:
+        values = [row.get(name) for row in rows]
+        scales = {v.scale for v in values if isinstance(v, Money)}
+        if not scales:
+            columns[name] = values
+            continue
+        scale = max(scales)
+        minor = money_column(values, scale)
+        if minor_units:
+            columns[name] = minor
+        else:
+            floats = minor.astype(np.float64) / 10 ** scale
+            floats[minor == MISSING] = np.nan
+            columns[name] = floats
+    return pd.DataFrame(columns, columns=names)
+
+
+# ==============================================
+# Benchmark
+# ==============================================
+
+def _timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, round(time.perf_counter() - started, 4)
+
+
+def benchmark(n: int = 500000, accounts_per_customer: int = 3, seed: int = 7) -> Dict[str, Dict]:
+    """Time the Decimal path against the minor-unit path on n balance strings.
+
+    parse_s      one value object per string (Decimal vs Money)
+    column_s     the strings as one column (Decimal list vs parse_money_column)
+    aggregate_s  get_customer_segments' work: total per customer, then bucket by threshold
+    dataframe_s  parsed rows to a DataFrame with a numeric Balance column
+    values_mb    memory held by the n parsed values (tracemalloc, measured in a separate pass)
+    """
+    import tracemalloc
+
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    texts = [f"{v / 100:.2f}" for v in rng.integers(0, 5_000_000, n)]
+    owners = np.arange(n) // accounts_per_customer
+    thresholds = [Decimal(1000), Decimal(5000), Decimal(10000)]
+    money = money_class()
+
+    def decimal_segments(values):
+        counts = [0] * (len(thresholds) + 1)
+        for i in range(0, len(values), accounts_per_customer):
+            balance = sum(values[i:i + accounts_per_customer])
+            counts[next((k for k, t in enumerate(thresholds) if balance < t), len(thresholds))] += 1
+        return counts
+
+    def minor_segments(column):
+        totals = np.zeros(owners[-1] + 1, dtype=np.int64)
+        np.add.at(totals, owners, column)
+        limits = np.array([int(t.scaleb(money.scale)) for t in thresholds], dtype=np.int64)
+        return np.bincount(np.searchsorted(limits, totals, side='right'), minlength=len(limits) + 1).tolist()
+
+    results = {}
+    for name, parse in (('decimal', Decimal), ('minor', money.parse)):
+        values, parse_s = _timed(lambda: [parse(t) for t in texts])
+        if name == 'decimal':
+            column, column_s = _timed(lambda: [Decimal(t) for t in texts])
+            counts, aggregate_s = _timed(lambda: decimal_segments(column))
+            rows = [{'AccountID': f"A{i}", 'Balance': v} for i, v in enumerate(values)]
+            _, frame_s = _timed(lambda: pd.DataFrame(rows).astype({'Balance': float}))
+        else:
+            column, column_s = _timed(lambda: parse_money_column(texts, money.scale))
+            counts, aggregate_s = _timed(lambda: minor_segments(column))
+            rows = [{'AccountID': f"A{i}", 'Balance': v} for i, v in enumerate(values)]
+            _, frame_s = _timed(lambda: to_dataframe(rows))
+        del values, column, rows
+        tracemalloc.start()
+        kept = [parse(t) for t in texts]
+        held = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del kept
+        results[name] = {'parse_s': parse_s, 'column_s': column_s, 'aggregate_s': aggregate_s,
+                         'dataframe_s': frame_s, 'values_mb': round(held / 2 ** 20, 1), 'segments': counts}
+    return results
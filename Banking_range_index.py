@@ -0,0 +1,301 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation, ROUND_CEILING, ROUND_HALF_EVEN
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from Banking_money import MISSING, parse_money_column
+
+# Transaction amounts have no currency of their own; cents, as in Banking_export
+AMOUNT_SCALE = 2
+LATEST = 2 ** 63 - 1
+
+
+def _amount_column(values: List[str]):
+    import numpy as np
+    try:
+        return parse_money_column(values, AMOUNT_SCALE)
+    except ValueError:
+        pass  # invalid values become missing below
+    out = np.empty(len(values), dtype=np.int64)
+    for i, v in enumerate(values):
+        try:
+            out[i] = int(Decimal(v).scaleb(AMOUNT_SCALE).to_integral_value(ROUND_HALF_EVEN)) if v else MISSING
+        except InvalidOperation:
+            out[i] = MISSING
+    return out
+
+
+def _seconds_column(values: List[str]):
+    """ISO dates/datetimes -> int64 seconds since the epoch (missing or invalid = MISSING, sorts first)"""
+    import numpy as np
+    cleaned = [v[:19] if v else 'NaT' for v in values]
+    try:
+        return np.array(cleaned, dtype='datetime64[s]').view(np.int64)
+    except ValueError:
+        out = np.empty(len(cleaned), dtype=np.int64)
+        for i, v in enumerate(cleaned):
+            try:
+                out[i] = np.datetime64(v, 's').astype(np.int64)
+            except ValueError:
+                out[i] = MISSING
+        return out
+
+
+def date_bounds(start_date: Optional[str] = None, end_date: Optional[str] = None) -> Tuple[int, int]:
+    """Inclusive [low, high] in seconds for a date range as get_transactions_by_account reads it:
+    a plain end date includes that whole day; a missing bound is open"""
+    low, high = MISSING + 1, LATEST
+    if start_date:
+        low = int(_seconds_column([start_date])[0])
+        if start_date[19:20] == '.' and start_date[20:26].strip('0'):
+            low += 1  # stored dates have whole seconds
+    if end_date:
+        if len(end_date) == 10:
+            end_date = (datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1, seconds=-1)).isoformat()
+        high = int(_seconds_column([end_date])[0])
+    return low, high
+
+
+class TransactionRangeIndex:
+    """In-process secondary index for range predicates on transaction Date and Amount.
+
+    BaseX value indexes only answer equality on text, so `xs:dateTime(Date) >= ...` and
+    `xs:decimal(Amount) >= ...` cast every row. This index keeps Date (epoch seconds) and
+    Amount (cents) as int64 numpy columns with a permutation sorted by each, plus
+    (account, Date) entries for both sides of every transfer, and answers range lookups
+    with binary search. The query layer then fetches only the matching TransactionIDs,
+    which BaseX looks up in its text index.
+
+    Transactions added after the build go to a small unsorted buffer that lookups scan;
+    it is merged into the sorted arrays once it holds merge_threshold rows. Removed IDs
+    are filtered out until the next merge. With a shared ChangeLog, catch_up applies the
+    writes of every process recorded since log_seq, the last sequence the index reflects.
+    """
+
+    FIELDS = ['TransactionID', 'FromAccountID', 'ToAccountID', 'Amount', 'Date']
+
+    def __init__(self, merge_threshold: int = 10000):
+        self.merge_threshold = merge_threshold
+        self._lock = threading.RLock()
+        self._accounts: Dict[str, int] = {}
+        self._pending: List[Tuple[str, str, str, int, int]] = []  # (id, from, to, cents, seconds)
+        self._removed = set()
+        self._columns = None
+        self.log_seq = 0
+        self._log_offset: Optional[Tuple[int, int]] = None  # (log_seq, byte offset in the log just past it)
+        self.is_built = False
+
+    # ==============================================
+    # Maintenance
+    # ==============================================
+
+    def build(self, chunks: Iterable[List[List[str]]]) -> None:
+        """Rebuild from chunks of [TransactionID, FromAccountID, ToAccountID, Amount, Date] rows"""
+        import numpy as np
+        with self._lock:
+            self._accounts = {}
+            ids, froms, tos, amounts, dates = [], [], [], [], []
+            for rows in chunks:
+                ids.extend(row[0] for row in rows)
+                froms.append(self._codes([row[1] for row in rows]))
+                tos.append(self._codes([row[2] for row in rows]))
+                amounts.append(_amount_column([row[3] for row in rows]))
+                dates.append(_seconds_column([row[4] for row in rows]))
+            self._pending = []
+            self._removed = set()
+            self._sort(np.array(ids, dtype=object), *(np.concatenate(parts or [np.empty(0, dtype=np.int64)])
+                                                      for parts in (froms, tos, amounts, dates)))
+            self.is_built = True
+
+    def add(self, transaction: Dict) -> None:
+        """Index a new transaction (a dict with at least FIELDS)"""
+        row = [str(transaction.get(field) or '') for field in self.FIELDS]
+        with self._lock:
+            self._removed.discard(row[0])
+            self._pending.append((row[0], row[1], row[2], int(_amount_column([row[3]])[0]),
+                                  int(_seconds_column([row[4]])[0])))
+            if len(self._pending) >= self.merge_threshold:
+                self._merge()
+
+    def remove(self, transaction_id: str) -> None:
+        with self._lock:
+            self._removed.add(transaction_id)
+            if len(self._removed) >= self.merge_threshold:
+                self._merge()
+
+    def catch_up(self, change_log, batch_size: int = 10000) -> int:
+        """Apply the transaction creates and archives recorded after log_seq; returns how many
+        records were read"""
+        read = 0
+        with self._lock:
+            # Resume at the byte offset reached last time, if log_seq was not moved since
+            offset = self._log_offset[1] if self._log_offset and self._log_offset[0] == self.log_seq else None
+            size = change_log.size()
+            if offset == size:
+                return read  # nothing appended since the last look
+            if offset is not None and offset > size:
+                offset = None  # the log was replaced
+            while True:
+                records, offset = change_log.read_from(offset, self.log_seq, batch_size)
+                if not records:
+                    self._log_offset = (self.log_seq, offset)
+                    return read
+                for record in records:
+                    if record['entity'] != 'transactions':
+                        continue
+                    if record['op'] == 'create':
+                        self.add(record['data'])
+                    elif record['op'] == 'archive':
+                        self.remove(record['key'])
+                self.log_seq = records[-1]['seq']
+                read += len(records)
+
+    def __len__(self) -> int:
+        columns = self._columns
+        return (len(columns['ids']) if columns else 0) + len(self._pending) - len(self._removed)
+
+    def _codes(self, accounts: List[str]):
+        import numpy as np
+        lookup = self._accounts
+        return np.fromiter((lookup.setdefault(a, len(lookup)) for a in accounts), dtype=np.int64, count=len(accounts))
+
+    def _sort(self, ids, froms, tos, amounts, dates) -> None:
+        import numpy as np
+        rows = np.arange(len(ids))
+        by_date = np.argsort(dates, kind='stable')
+        by_amount = np.argsort(amounts, kind='stable')
+        entry_rows = np.concatenate((rows, rows))
+        entry_accounts = np.concatenate((froms, tos))
+        entry_dates = dates[entry_rows]
+        order = np.lexsort((entry_dates, entry_accounts))
+        self._columns = {
+            'ids': ids, 'from': froms, 'to': tos, 'amounts': amounts, 'dates': dates,
+            'by_date': by_date, 'dates_sorted': dates[by_date],
+            'by_amount': by_amount, 'amounts_sorted': amounts[by_amount],
+            'entry_accounts': entry_accounts[order], 'entry_dates': entry_dates[order], 'entry_rows': entry_rows[order],
+        }
+
+    def _merge(self) -> None:
+        """Fold the pending buffer into the sorted arrays and drop removed rows"""
+        import numpy as np
+        c = self._columns
+        ids, froms, tos, amounts, dates = c['ids'], c['from'], c['to'], c['amounts'], c['dates']
+        if self._removed:
+            keep = np.fromiter((i not in self._removed for i in ids), dtype=bool, count=len(ids))
+            ids, froms, tos, amounts, dates = ids[keep], froms[keep], tos[keep], amounts[keep], dates[keep]
+        pending = [p for p in self._pending if p[0] not in self._removed]
+        if pending:
+            new_ids, new_from, new_to, new_amounts, new_dates = zip(*pending)
+            ids = np.concatenate((ids, np.array(new_ids, dtype=object)))
+            froms = np.concatenate((froms, self._codes(list(new_from))))
+            tos = np.concatenate((tos, self._codes(list(new_to))))
+            amounts = np.concatenate((amounts, np.array(new_amounts, dtype=np.int64)))
+            dates = np.concatenate((dates, np.array(new_dates, dtype=np.int64)))
+        self._pending = []
+        self._removed = set()
+        self._sort(ids, froms, tos, amounts, dates)
+
+    # ==============================================
+    # Lookups
+    # ==============================================
+
+    def high_value(self, threshold: Decimal, since: Optional[str] = None) -> List[str]:
+        """TransactionIDs with Amount >= threshold dated at or after since,
+        largest amount first, then newest"""
+        import numpy as np
+        cents = int(Decimal(str(threshold)).scaleb(AMOUNT_SCALE).to_integral_value(ROUND_CEILING))
+        low = date_bounds(since)[0]
+        with self._lock:
+            c = self._columns
+            n = len(c['ids'])
+            first_amount = int(np.searchsorted(c['amounts_sorted'], cents, 'left'))
+            first_date = int(np.searchsorted(c['dates_sorted'], low, 'left'))
+            # Read the narrower of the two ranges and filter it on the other column
+            if n - first_amount <= n - first_date:
+                rows = c['by_amount'][first_amount:]
+                rows = rows[c['dates'][rows] >= low]
+            else:
+                rows = c['by_date'][first_date:]
+                rows = rows[c['amounts'][rows] >= cents]
+            hits = list(zip(c['amounts'][rows].tolist(), c['dates'][rows].tolist(), c['ids'][rows].tolist()))
+            hits += [(amount, date, tx_id) for tx_id, _, _, amount, date in self._pending
+                     if amount >= cents and date >= low]
+            removed = self._removed
+        hits.sort(reverse=True)
+        # A transaction replayed from the change log may also have been read by the build
+        return [tx_id for tx_id in dict.fromkeys(tx_id for _, _, tx_id in hits) if tx_id not in removed]
+
+    def account_range(self, account_id: str, start_date: Optional[str] = None,
+                      end_date: Optional[str] = None) -> List[str]:
+        """TransactionIDs from or to account_id within [start_date, end_date] (see date_bounds), newest first"""
+        import numpy as np
+        low, high = date_bounds(start_date, end_date)
+        with self._lock:
+            c = self._columns
+            hits = []
+            code = self._accounts.get(account_id)
+            if code is not None:
+                left = int(np.searchsorted(c['entry_accounts'], code, 'left'))
+                right = int(np.searchsorted(c['entry_accounts'], code, 'right'))
+                dates = c['entry_dates'][left:right]
+                first = left + int(np.searchsorted(dates, low, 'left'))
+                last = left + int(np.searchsorted(dates, high, 'right'))
+                rows = c['entry_rows'][first:last]
+                hits = list(zip(c['dates'][rows].tolist(), c['ids'][rows].tolist()))
+            hits += [(date, tx_id) for tx_id, from_acc, to_acc, _, date in self._pending
+                     if account_id in (from_acc, to_acc) and low <= date <= high]
+            removed = self._removed
+        hits.sort(key=lambda hit: hit[0], reverse=True)
+        return [tx_id for tx_id in dict.fromkeys(tx_id for _, tx_id in hits) if tx_id not in removed]
+
+
+def _synthetic_rows(n: int, accounts: int, seed: int = 7) -> List[List[str]]:
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    start = np.datetime64('2023-01-01T00:00:00').astype(np.int64)
+    dates = np.datetime_as_string((start + rng.integers(0, 2 * 365 * 86400, n)).astype('datetime64[s]'))
+    cents = np.minimum(rng.lognormal(8, 1.5, n), 1e9).astype(np.int64)
+    froms = rng.integers(0, accounts, n)
+    tos = (froms + 1 + rng.integers(0, accounts - 1, n)) % accounts
+    return [[f"TX{i}", f"ACC{f}", f"ACC{t}", f"{c // 100}.{c % 100:02d}", d]
+            for i, (f, t, c, d) in enumerate(zip(froms.tolist(), tos.tolist(), cents.tolist(), dates.tolist()))]
+
+
+def benchmark(sizes: Iterable[int] = (10000, 100000, 1000000), lookups: int = 200) -> List[Dict]:
+    """Index lookups vs. a full vectorized scan (the best case for a cast on every row), per index size.
+
+    Lookups are the ones the query layer makes: high-value transactions of the last week
+    and one account's transactions over a month. Synthetic data, no server needed.
+    """
+    import numpy as np
+    results = []
+    for n in sizes:
+        rows = _synthetic_rows(n, max(n // 50, 2))
+        index = TransactionRangeIndex()
+        started = time.perf_counter()
+        index.build([rows[i:i + 100000] for i in range(0, n, 100000)])
+        build_seconds = time.perf_counter() - started
+        c = index._columns
+        threshold, since = Decimal(50000), '2024-12-24T00:00:00'
+        accounts = [rows[i][1] for i in range(0, n, max(n // lookups, 1))][:lookups]
+
+        def timed(fn) -> float:
+            started = time.perf_counter()
+            for account in accounts:
+                fn(account)
+            return (time.perf_counter() - started) / len(accounts) * 1e6
+
+        low, high = date_bounds('2024-06-01', '2024-06-30')
+        cents, since_s = 50000 * 100, date_bounds(since)[0]
+        results.append({
+            'rows': n,
+            'build_seconds': round(build_seconds, 3),
+            'high_value_index_us': round(timed(lambda _: index.high_value(threshold, since)), 1),
+            'high_value_scan_us': round(timed(lambda _: np.flatnonzero((c['amounts'] >= cents) & (c['dates'] >= since_s))), 1),
+            'account_index_us': round(timed(lambda a: index.account_range(a, '2024-06-01', '2024-06-30')), 1),
+            'account_scan_us': round(timed(lambda a: np.flatnonzero(
+                ((c['from'] == index._accounts[a]) | (c['to'] == index._accounts[a]))
+                & (c['dates'] >= low) & (c['dates'] <= high))), 1),
+        })
+    return results
@@ -0,0 +1,212 @@
+import csv
+import json
+import os
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Optional, Set, Tuple
+
+from Banking_archive import TransactionArchive
+from Banking_export import to_minor_units
+from Banking_xml_queries import BankingXMLQueries
+
+# Only settled transactions move money
+SETTLED_STATUSES = ('completed',)
+
+
+def account_bucket(account_id: str, buckets: int) -> int:
+    """Hash range of an account: sum of its code points modulo buckets.
+
+    Cheap to evaluate on the server too (see _bucket_predicate), so each worker only
+    receives the rows of its own accounts.
+    """
+    return sum(map(ord, account_id)) % buckets
+
+
+def _bucket_predicate(field: str, bucket: int, buckets: int) -> str:
+    return f"sum(string-to-codepoints({field})) mod {buckets} = {bucket}"
+
+
+def _connection(bank: BankingXMLQueries) -> Dict:
+    """What a worker process needs to open its own BankingXMLQueries"""
+    return {'db_name': bank.db_name, 'db_host': bank.db_host, 'db_port': bank.db_port,
+            'db_user': bank.db_user, 'db_pass': bank.db_pass, 'databases': bank.databases,
+            'partition_transactions': bank._uses_transaction_partitions()}
+
+
+def reconcile_bucket(connection: Dict, archived_months: List[str], bucket: int, buckets: int,
+                     chunk_size: int = 50000) -> Dict:
+    """Net live ledger flow and stored Balance of the accounts in one hash range (runs in a worker).
+
+    Live transactions dated in an archived month may also be in the archive (an archive
+    run interrupted midway leaves a copy in both places); they are returned as overlap
+    instead of booked, for the parent to book unless the archive holds them.
+    """
+    started = time.perf_counter()
+    bank = BankingXMLQueries(**connection)
+    inflow: Dict[str, int] = {}
+    outflow: Dict[str, int] = {}
+    overlap: List[Tuple[str, str, str, int, str, int]] = []
+    archived = set(archived_months)
+    seen = set()
+    rows = 0
+
+    statuses = ", ".join(f'"{s}"' for s in SETTLED_STATUSES)
+    nodes = (f"{bank._transaction_nodes()}[Status = ({statuses}) and "
+             f"({_bucket_predicate('FromAccountID', bucket, buckets)} or "
+             f"{_bucket_predicate('ToAccountID', bucket, buckets)})]")
+    fields = ['TransactionID', 'FromAccountID', 'ToAccountID', 'Amount', 'Date']
+    for chunk in bank.iter_rows(nodes, fields, chunk_size=chunk_size):
+        rows += len(chunk)
+        for tx_id, from_acc, to_acc, amount, date in chunk:
+            if tx_id in seen:
+                continue
+            seen.add(tx_id)
+            if date[:7] in archived:
+                overlap.append((tx_id, from_acc, to_acc, to_minor_units(amount), date[:7], bucket))
+            else:
+                _book(inflow, outflow, from_acc, to_acc, to_minor_units(amount), bucket, buckets)
+
+    balances = {}
+    account_nodes = (f'doc("{bank.accounts_db}/accounts.xml")/Accounts/Account'
+                     f'[{_bucket_predicate("AccountID", bucket, buckets)}]')
+    for chunk in bank.iter_rows(account_nodes, ['AccountID', 'Balance', 'Currency', 'Status'], chunk_size=chunk_size):
+        for account_id, balance, currency, status in chunk:
+            balances[account_id] = (balance, currency, status)
+    return {'bucket': bucket, 'balances': balances, 'inflow': inflow, 'outflow': outflow, 'overlap': overlap,
+            'transactions': rows, 'seconds': round(time.perf_counter() - started, 3)}
+
+
+def reconcile_archive(archive_dir: str, months: List[str], overlap_ids: Set[str]) -> Dict:
+    """Net settled flow per account of some archived months (runs in a worker).
+
+    Each worker decompresses and parses only its own months. Returns which of overlap_ids
+    (live transactions dated in these months) the archive holds, so they are booked once.
+    """
+    started = time.perf_counter()
+    archive = TransactionArchive(archive_dir)
+    inflow: Dict[str, int] = {}
+    outflow: Dict[str, int] = {}
+    found = set()
+    rows = 0
+    for month in months:
+        seen = set()  # a month's file can hold a transaction twice after an interrupted run
+        for t in archive.iter_month(month):
+            rows += 1
+            tx_id = t.findtext('TransactionID') or ''
+            if t.findtext('Status') not in SETTLED_STATUSES or tx_id in seen:
+                continue
+            seen.add(tx_id)
+            if tx_id in overlap_ids:
+                found.add(tx_id)
+            _book(inflow, outflow, t.findtext('FromAccountID') or '', t.findtext('ToAccountID') or '',
+                  to_minor_units(t.findtext('Amount')), 0, 1)
+    return {'inflow': inflow, 'outflow': outflow, 'found': found, 'transactions': rows,
+            'seconds': round(time.perf_counter() - started, 3)}
+
+
+def _book(inflow: Dict[str, int], outflow: Dict[str, int], from_acc: str, to_acc: str, cents: int,
+          bucket: int, buckets: int) -> None:
+    if account_bucket(from_acc, buckets) == bucket:
+        outflow[from_acc] = outflow.get(from_acc, 0) + cents
+    if account_bucket(to_acc, buckets) == bucket:
+        inflow[to_acc] = inflow.get(to_acc, 0) + cents
+
+
+def _merge_flows(into: Dict[str, int], flows: Dict[str, int]) -> None:
+    for account_id, cents in flows.items():
+        into[account_id] = into.get(account_id, 0) + cents
+
+
+def reconcile(bank: BankingXMLQueries, workers: Optional[int] = None, include_archived: bool = True,
+              chunk_size: int = 50000) -> Dict:
+    """Compare every account's Balance with the net flow of its settled transactions.
+
+    The ledger balance of an account is inflow minus outflow over all completed
+    transactions (including archived ones). One worker process per account hash range
+    streams only the live transactions touching its accounts; the archived months are
+    then split across the workers, so each month is decompressed and parsed once. Wall
+    time drops with the number of cores until the BaseX server becomes the bottleneck.
+    """
+    workers = workers or os.cpu_count() or 1
+    connection = _connection(bank)
+    archive_dir = bank.transaction_archive.archive_dir if include_archived else None
+    months = sorted(bank.transaction_archive.months()) if include_archived else []
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) if workers > 1 else _InProcess() as pool:
+        futures = [pool.submit(reconcile_bucket, connection, months, b, workers, chunk_size) for b in range(workers)]
+        buckets = [f.result() for f in futures]
+        overlap = [entry for r in buckets for entry in r['overlap']]
+        futures = []
+        for w in range(min(workers, len(months))):
+            share = months[w::workers]
+            overlap_ids = {entry[0] for entry in overlap if entry[4] in share}
+            futures.append(pool.submit(reconcile_archive, archive_dir, share, overlap_ids))
+        archives = [f.result() for f in futures]
+
+    inflow: Dict[str, int] = {}
+    outflow: Dict[str, int] = {}
+    balances = {}
+    for r in buckets + archives:
+        _merge_flows(inflow, r['inflow'])
+        _merge_flows(outflow, r['outflow'])
+        balances.update(r.get('balances', {}))
+    archived_ids = set().union(*(r['found'] for r in archives)) if archives else set()
+    for tx_id, from_acc, to_acc, cents, _, bucket in overlap:
+        if tx_id not in archived_ids:
+            _book(inflow, outflow, from_acc, to_acc, cents, bucket, workers)
+
+    discrepancies = []
+    for account_id, (balance, currency, status) in sorted(balances.items()):
+        net = inflow.get(account_id, 0) - outflow.get(account_id, 0)
+        stored = to_minor_units(balance) if balance else 0
+        if stored != net:
+            discrepancies.append({
+                'AccountID': account_id, 'Currency': currency, 'Status': status,
+                'Balance': balance, 'Inflow': str(Decimal(inflow.get(account_id, 0)) / 100),
+                'Outflow': str(Decimal(outflow.get(account_id, 0)) / 100),
+                'LedgerBalance': str(Decimal(net) / 100), 'Difference': str(Decimal(stored - net) / 100),
+            })
+    return {
+        'checked_at': datetime.now().isoformat(timespec='seconds'),
+        'workers': workers,
+        'accounts': len(balances),
+        'transactions_scanned': sum(r['transactions'] for r in buckets + archives),
+        'archived_months': len(months),
+        'discrepancies': discrepancies,
+        'seconds': round(time.perf_counter() - started, 3),
+        'worker_seconds': [r['seconds'] for r in buckets + archives],
+    }
+
+
+class _InProcess:
+    """Runs submitted calls right away (workers=1), with the executor interface reconcile uses"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def submit(self, fn, *args) -> Future:
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+def write_report(report: Dict, out_dir: str = os.path.join("Banking_System", "reports")) -> str:
+    """Write the discrepancies as CSV plus a JSON summary; returns the CSV path"""
+    os.makedirs(out_dir, exist_ok=True)
+    stamp = report['checked_at'].replace(':', '').replace('-', '')
+    csv_path = os.path.join(out_dir, f"reconciliation-{stamp}.csv")
+    columns = ['AccountID', 'Currency', 'Status', 'Balance', 'Inflow', 'Outflow', 'LedgerBalance', 'Difference']
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(report['discrepancies'])
+    summary = {k: v for k, v in report.items() if k != 'discrepancies'}
+    summary['discrepancy_count'] = len(report['discrepancies'])
+    with open(csv_path[:-4] + ".json", "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=1)
+    return csv_path
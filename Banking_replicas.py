@@ -0,0 +1,238 @@
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from BaseXClient import Session
+
+HEARTBEAT_PATH = "_replication/heartbeat.xml"
+
+
+def parse_endpoints(spec: str) -> List[Tuple[str, int]]:
+    """'localhost:1985,localhost:1986' -> [('localhost', 1985), ('localhost', 1986)]"""
+    endpoints = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        host, _, port = item.rpartition(":")
+        endpoints.append((host or "localhost", int(port)))
+    return endpoints
+
+
+class Endpoint:
+    """One BaseX server plus what the router knows about it"""
+
+    def __init__(self, host: str, port: int, role: str):
+        self.host = host
+        self.port = port
+        self.role = role
+        self.in_flight = 0
+        self.queries = 0
+        self.heartbeat_at: Optional[float] = None  # newest primary heartbeat seen on this server
+        self.lag_seconds: Optional[float] = None
+        self.down_until = 0.0
+
+    @property
+    def name(self) -> str:
+        return f"{self.host}:{self.port}"
+
+
+class ReplicaRouter:
+    """Routes reads across read replicas and sends writes to the primary.
+
+    policy is 'round_robin' or 'least_loaded' (fewest queries in flight from this process).
+    Replication itself happens outside the router (see Banking_admin.py sync-replica); the
+    router measures how far each replica is behind through a heartbeat document that
+    write_heartbeat stores on the primary and that replicates like any other document.
+    Replicas lagging more than max_lag seconds, or unreachable in the last retry_after
+    seconds, are skipped; when no replica qualifies the read goes to the primary.
+
+    Read-your-writes: note_write() stamps the time of every write made through this router.
+    A consistent read only uses a replica whose last seen heartbeat is newer than that stamp,
+    i.e. one that has provably applied those writes.
+    """
+
+    POLICIES = ('round_robin', 'least_loaded')
+
+    def __init__(self, primary: Tuple[str, int], replicas: List[Tuple[str, int]],
+                 policy: str = 'round_robin', max_lag: Optional[float] = None, retry_after: float = 30.0):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unsupported policy '{policy}'. Choose one of {', '.join(self.POLICIES)}.")
+        self.primary = Endpoint(*primary, role='primary')
+        self.replicas = [Endpoint(host, port, role='replica') for host, port in replicas]
+        self.policy = policy
+        self.max_lag = max_lag
+        self.retry_after = retry_after
+        self.last_write_at = 0.0
+        self._lock = threading.Lock()
+        self._rotation = itertools.count()
+        self._heartbeat_thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    # ==============================================
+    # Routing
+    # ==============================================
+
+    def _eligible(self, endpoint: Endpoint, now: float, consistent: bool) -> bool:
+        if endpoint.down_until > now:
+            return False
+        if consistent and (endpoint.heartbeat_at is None or endpoint.heartbeat_at < self.last_write_at):
+            return False
+        if self.max_lag is not None and endpoint.lag_seconds is not None and endpoint.lag_seconds > self.max_lag:
+            return False
+        return True
+
+    def choose(self, consistent: bool = False) -> Endpoint:
+        """Endpoint for the next read (the primary when no replica qualifies)"""
+        with self._lock:
+            now = time.time()
+            candidates = [r for r in self.replicas if self._eligible(r, now, consistent)]
+            if not candidates:
+                return self.primary
+            if self.policy == 'least_loaded':
+                fewest = min(r.in_flight for r in candidates)
+                candidates = [r for r in candidates if r.in_flight == fewest]
+            return candidates[next(self._rotation) % len(candidates)]
+
+    @contextmanager
+    def route(self, consistent: bool = False):
+        """Pick an endpoint for one read and count it as in flight while the block runs"""
+        endpoint = self.choose(consistent)
+        with self._lock:
+            endpoint.in_flight += 1
+            endpoint.queries += 1
+        try:
+            yield endpoint
+        finally:
+            with self._lock:
+                endpoint.in_flight -= 1
+
+    def mark_down(self, endpoint: Endpoint) -> None:
+        if endpoint is not self.primary:
+            endpoint.down_until = time.time() + self.retry_after
+
+    def note_write(self) -> None:
+        self.last_write_at = time.time()
+
+    # ==============================================
+    # Heartbeat and lag
+    # ==============================================
+
+    def _read_heartbeat(self, bank, endpoint: Endpoint) -> Optional[float]:
+        session = Session(endpoint.host, endpoint.port, bank.db_user, bank.db_pass)
+        try:
+            session.execute(f"OPEN {bank.db_name}")
+            path = f"{bank.db_name}/{HEARTBEAT_PATH}"
+            value = session.execute(f'XQUERY if (doc-available("{path}")) then string(doc("{path}")/Heartbeat/Time) else ""')
+            return float(value) if value.strip() else None
+        finally:
+            session.close()
+
+    def write_heartbeat(self, bank) -> float:
+        """Store the current time in the heartbeat document on the primary"""
+        stamp = time.time()
+        session = Session(self.primary.host, self.primary.port, bank.db_user, bank.db_pass)
+        try:
+            session.execute(f"OPEN {bank.db_name}")
+            session.replace(HEARTBEAT_PATH, f"<Heartbeat><Time>{stamp:.6f}</Time></Heartbeat>")
+        finally:
+            session.close()
+        self.primary.heartbeat_at = stamp
+        self.primary.lag_seconds = 0.0
+        return stamp
+
+    def measure_lag(self, bank) -> Dict[str, Optional[float]]:
+        """Seconds each replica is behind the primary's latest heartbeat (None = unknown)"""
+        try:
+            primary_beat = self._read_heartbeat(bank, self.primary)
+        except Exception as e:
+            print(f"Warning: could not read heartbeat from primary {self.primary.name}: {e}")
+            primary_beat = self.primary.heartbeat_at
+        lags = {}
+        for replica in self.replicas:
+            try:
+                replica.heartbeat_at = self._read_heartbeat(bank, replica)
+            except Exception as e:
+                print(f"Warning: replica {replica.name} unreachable: {e}")
+                self.mark_down(replica)
+                lags[replica.name] = None
+                continue
+            if replica.heartbeat_at is None or primary_beat is None:
+                replica.lag_seconds = None
+            else:
+                replica.lag_seconds = max(0.0, primary_beat - replica.heartbeat_at)
+            lags[replica.name] = replica.lag_seconds
+        return lags
+
+    def start_heartbeat(self, bank, interval: float = 1.0) -> None:
+        """Write a heartbeat and re-measure lag every interval seconds on a daemon thread"""
+        if self._heartbeat_thread is not None:
+            return
+
+        def loop():
+            while not self._stop.is_set():
+                try:
+                    self.write_heartbeat(bank)
+                    self.measure_lag(bank)
+                except Exception as e:
+                    print(f"Warning: replication heartbeat failed: {e}")
+                self._stop.wait(interval)
+
+        self._heartbeat_thread = threading.Thread(target=loop, name="replica-heartbeat", daemon=True)
+        self._heartbeat_thread.start()
+
+    def stop_heartbeat(self) -> None:
+        self._stop.set()
+        if self._heartbeat_thread is not None:
+            self._heartbeat_thread.join()
+            self._heartbeat_thread = None
+        self._stop.clear()
+
+    def status(self) -> List[Dict]:
+        """Role, load, lag and availability of every endpoint"""
+        now = time.time()
+        with self._lock:
+            return [{
+                'endpoint': e.name,
+                'role': e.role,
+                'in_flight': e.in_flight,
+                'queries': e.queries,
+                'lag_seconds': None if e.lag_seconds is None else round(e.lag_seconds, 3),
+                'available': e.down_until <= now,
+            } for e in [self.primary] + self.replicas]
+
+
+def sync_replica(bank, host: str, port: int) -> int:
+    """Copy every XML document of bank's databases from the primary to a replica server.
+
+    A full copy, meant for local replica instances refreshed on a schedule. The primary's
+    heartbeat is read before and written after the data, so the replica never claims to be
+    fresher than it is. Every database of bank's layout is copied (see
+    BankingXMLQueries databases). Returns the number of documents copied.
+    """
+    source = Session(bank.db_host, bank.db_port, bank.db_user, bank.db_pass)
+    target = Session(host, port, bank.db_user, bank.db_pass)
+    try:
+        source.execute(f"OPEN {bank.db_name}")
+        heartbeat_path = f"{bank.db_name}/{HEARTBEAT_PATH}"
+        heartbeat = source.execute(
+            f'XQUERY if (doc-available("{heartbeat_path}")) then doc("{heartbeat_path}") else ()')
+
+        copied = 0
+        for database in sorted(set(bank.databases.values()) | {bank.db_name}):
+            skip = HEARTBEAT_PATH if database == bank.db_name else None
+            paths = [p for p in source.execute(f'XQUERY string-join(db:list("{database}"), "&#10;")').split("\n")
+                     if p and p != skip]
+            target.execute(f"CHECK {database}")
+            for path in paths:
+                target.replace(path, source.execute(f'XQUERY doc("{database}/{path}")'))
+            keep = ", ".join(f'"{p}"' for p in paths + [HEARTBEAT_PATH])
+            target.execute(f'XQUERY for $p in db:list("{database}")[not(. = ({keep}))] '
+                           f'return db:delete("{database}", $p)')
+            copied += len(paths)
+        if heartbeat.strip():
+            target.execute(f"OPEN {bank.db_name}")
+            target.replace(HEARTBEAT_PATH, heartbeat)
+        return copied
+    finally:
+        source.close()
+        target.close()
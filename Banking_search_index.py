@@ -0,0 +1,219 @@
+import re
+import threading
+from array import array
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+class UserSearchIndex:
+    """In-process n-gram inverted index over the searchable User fields.
+
+    Every field value is lower-cased and split into tokens. Each token is
+    indexed as the n-grams of "^" + token, so the same postings answer both
+    substring search (grams of the term) and prefix autocomplete (grams of
+    "^" + prefix). Prefixes shorter than the gram size are looked up through the
+    "^x"/"^xy" keys, and tokens are also indexed by their shorter grams, so a
+    two-character substring term is one posting lookup ("oe" still finds "joe").
+    A one-character term would match nearly every user as a substring; it
+    matches the start of a token instead.
+
+    Candidates from the postings are always verified against the stored field
+    values, so results are exact; the index only narrows the scan. With a shared
+    ChangeLog, catch_up applies the user writes of every process recorded since
+    log_seq, the last sequence the index reflects.
+    """
+
+    FIELDS = ("UserID", "FullName", "Email", "Phone", "Username", "Role")
+    # Higher weight = a hit on this field ranks first
+    FIELD_WEIGHTS = {"UserID": 5, "Username": 4, "FullName": 4, "Email": 3, "Phone": 2, "Role": 1}
+
+    _TOKEN_SPLIT = re.compile(r"[^0-9a-z]+")
+
+    def __init__(self, gram_size: int = 3):
+        self.gram_size = gram_size
+        self._lock = threading.RLock()
+        self._postings: Dict[str, array] = {}
+        self._docs: List[Optional[Dict]] = []          # doc number -> user dict (None once replaced/removed)
+        self._values: List[Optional[Dict[str, str]]] = []  # doc number -> lower-cased field values
+        self._doc_by_user: Dict[str, int] = {}
+        self._dead = 0
+        self.log_seq = 0
+        self._log_offset: Optional[Tuple[int, int]] = None  # (log_seq, byte offset in the log just past it)
+        self.is_built = False
+
+    # ==============================================
+    # Maintenance
+    # ==============================================
+
+    def build(self, users: Iterable[Dict]) -> None:
+        """Rebuild the whole index from a list of user dicts"""
+        with self._lock:
+            self._postings = {}
+            self._docs = []
+            self._values = []
+            self._doc_by_user = {}
+            self._dead = 0
+            for user in users:
+                self._add(user)
+            self.is_built = True
+
+    def add(self, user: Dict) -> None:
+        """Index a new user, or re-index an existing one (same UserID)"""
+        with self._lock:
+            self._add(user)
+            self._maybe_compact()
+
+    def remove(self, user_id: str) -> None:
+        with self._lock:
+            self._tombstone(user_id)
+            self._maybe_compact()
+
+    def catch_up(self, change_log, batch_size: int = 10000) -> int:
+        """Apply the user creates, updates and deletes recorded after log_seq; returns how many records were read"""
+        read = 0
+        with self._lock:
+            # Resume at the byte offset reached last time, if log_seq was not moved since
+            offset = self._log_offset[1] if self._log_offset and self._log_offset[0] == self.log_seq else None
+            size = change_log.size()
+            if offset == size:
+                return read  # nothing appended since the last look
+            if offset is not None and offset > size:
+                offset = None  # the log was replaced
+            while True:
+                records, offset = change_log.read_from(offset, self.log_seq, batch_size)
+                if not records:
+                    self._log_offset = (self.log_seq, offset)
+                    return read
+                for record in records:
+                    if record['entity'] != 'users':
+                        continue
+                    if record['op'] in ('create', 'update'):
+                        self._add(record['data'])
+                    elif record['op'] == 'delete':
+                        self._tombstone(record['key'])
+                self._maybe_compact()
+                self.log_seq = records[-1]['seq']
+                read += len(records)
+
+    def __len__(self) -> int:
+        return len(self._doc_by_user)
+
+    def _add(self, user: Dict) -> None:
+        user_id = user.get("UserID")
+        if not user_id:
+            return
+        self._tombstone(user_id)
+
+        doc = len(self._docs)
+        values = {f: str(user[f]).lower() for f in self.FIELDS if user.get(f) is not None}
+        self._docs.append(user)
+        self._values.append(values)
+        self._doc_by_user[user_id] = doc
+
+        keys: Set[str] = set()
+        for value in values.values():
+            for token in self._tokens(value):
+                keys.update(self._keys_for(token))
+        for key in keys:
+            posting = self._postings.get(key)
+            if posting is None:
+                posting = self._postings[key] = array("I")
+            posting.append(doc)  # doc numbers only grow, so postings stay sorted
+
+    def _tombstone(self, user_id: str) -> None:
+        doc = self._doc_by_user.pop(user_id, None)
+        if doc is not None:
+            self._docs[doc] = None
+            self._values[doc] = None
+            self._dead += 1
+
+    def _maybe_compact(self) -> None:
+        # Replaced/removed docs stay in the postings until more than half are dead
+        if self._dead > 1000 and self._dead * 2 > len(self._docs):
+            self.build([d for d in self._docs if d is not None])
+
+    def _tokens(self, value: str) -> Set[str]:
+        tokens = {t for t in self._TOKEN_SPLIT.split(value) if t}
+        tokens.add(value)  # whole value, so "john.doe@" style prefixes still match
+        return tokens
+
+    def _keys_for(self, token: str) -> Set[str]:
+        marked = "^" + token
+        keys = {marked[:i] for i in range(2, min(self.gram_size, len(marked)) + 1)}
+        keys.update(marked[i:i + self.gram_size] for i in range(len(marked) - self.gram_size + 1))
+        for size in range(2, self.gram_size):
+            keys.update(token[i:i + size] for i in range(len(token) - size + 1))
+        return keys
+
+    # ==============================================
+    # Lookups
+    # ==============================================
+
+    def _candidates(self, term: str, prefix_only: bool) -> Set[int]:
+        """Doc numbers that may contain term (superset, verified by the caller)"""
+        if len(term) < self.gram_size:
+            keys = ["^" + term if prefix_only else term]
+        else:
+            marked = "^" + term if prefix_only else term
+            keys = list({marked[i:i + self.gram_size] for i in range(len(marked) - self.gram_size + 1)})
+        postings = []
+        for key in keys:
+            posting = self._postings.get(key)
+            if posting is None:
+                return set()
+            postings.append(posting)
+        postings.sort(key=len)
+        # Intersecting the two rarest grams is enough; verification handles the rest
+        candidates = set(postings[0])
+        if len(postings) > 1:
+            candidates.intersection_update(postings[1])
+        return candidates
+
+    def _score(self, values: Dict[str, str], term: str, fields: Iterable[str], prefix_only: bool) -> int:
+        best = 0
+        for field in fields:
+            value = values.get(field)
+            if not value or term not in value:
+                continue
+            weight = self.FIELD_WEIGHTS.get(field, 1)
+            tokens = self._tokens(value)
+            if value == term:
+                score = 100 * weight
+            elif term in tokens:
+                score = 60 * weight
+            elif any(t.startswith(term) for t in tokens):
+                score = 40 * weight
+            elif prefix_only:
+                continue
+            else:
+                score = 10 * weight
+            best = max(best, score)
+        return best
+
+    def _ranked(self, term: str, fields: Optional[List[str]], limit: Optional[int], prefix_only: bool) -> List[Dict]:
+        term = term.strip().lower()
+        if not term:
+            return []
+        if len(term) == 1:
+            prefix_only = True
+        fields = [f for f in (fields or self.FIELDS) if f in self.FIELDS]
+        with self._lock:
+            scored = []
+            for doc in self._candidates(term, prefix_only):
+                values = self._values[doc]
+                if values is None:
+                    continue
+                score = self._score(values, term, fields, prefix_only)
+                if score:
+                    scored.append((-score, values.get("FullName", ""), doc))
+            scored.sort()
+            if limit is not None:
+                scored = scored[:limit]
+            return [self._docs[doc] for _, _, doc in scored]
+
+    def search(self, term: str, fields: Optional[List[str]] = None, limit: Optional[int] = None) -> List[Dict]:
+        """Case-insensitive substring search, best matches first"""
+        return self._ranked(term, fields, limit, prefix_only=False)
+
+    def autocomplete(self, prefix: str, fields: Optional[List[str]] = None, limit: int = 10) -> List[Dict]:
+        """Users having a token (or whole field) starting with prefix, best matches first"""
+        return self._ranked(prefix, fields, limit, prefix_only=True)
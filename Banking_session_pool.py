@@ -0,0 +1,65 @@
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+from BaseXClient import Session
+
+
+class SessionPool:
+    """Reusable BaseX sessions, kept open with their database already opened.
+
+    Sessions are keyed by server, credentials and database, so one pool can serve several
+    BankingXMLQueries instances and every replica endpoint. Any number of sessions can be
+    checked out at once; at most max_idle per key are kept open between uses. A session
+    whose query failed is closed instead of being returned.
+    """
+
+    def __init__(self, max_idle: int = 8):
+        self.max_idle = max_idle
+        self._idle: Dict[Tuple, List[Session]] = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    @contextmanager
+    def session(self, host: str, port: int, user: str, password: str, db_name: str):
+        key = (host, port, user, password, db_name)
+        with self._lock:
+            idle = self._idle.get(key)
+            session = idle.pop() if idle else None
+            if session is not None:
+                self.reused += 1
+        if session is None:
+            session = Session(host, port, user, password)
+            try:
+                session.execute(f"OPEN {db_name}")
+            except Exception:
+                session.close()
+                raise
+            with self._lock:
+                self.created += 1
+        try:
+            yield session
+        except Exception:
+            try:
+                session.close()
+            except OSError:
+                pass
+            raise
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append(session)
+                return
+        session.close()
+
+    def close(self) -> None:
+        """Close every idle session"""
+        with self._lock:
+            sessions = [s for idle in self._idle.values() for s in idle]
+            self._idle.clear()
+        for session in sessions:
+            try:
+                session.close()
+            except OSError:
+                pass
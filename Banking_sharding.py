@@ -0,0 +1,516 @@
+import bisect
+import hashlib
+import json
+import os
+import threading
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+from typing import Callable, Dict, List, Optional, Tuple
+
+from Banking_idempotency import run_create_transaction
+from Banking_xml_queries import ENTITY_DOCUMENTS, BankingXMLQueries
+
+# Placed by AccountID (transactions by FromAccountID); users are copied to every shard so
+# each can check account ownership locally; everything else lives on the catalog shard
+SHARDED_ENTITIES = ('accounts', 'cards', 'transactions')
+
+# Where applied cross-shard credits are remembered, so a retried credit is not booked twice
+CREDITS_PATH = "shards/credits.xml"
+
+
+def parse_shards(spec: str) -> List[Tuple[str, int, str]]:
+    """'localhost:1984/banking,localhost:1985/banking' -> [('localhost', 1984, 'banking'), ...]"""
+    shards = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        address, _, db_name = item.partition("/")
+        host, _, port = address.rpartition(":")
+        shards.append((host or "localhost", int(port), db_name or "banking"))
+    return shards
+
+
+class HashRing:
+    """Consistent-hash ring over shard names.
+
+    Each shard owns vnodes points on a 64-bit ring; a key belongs to the first point at or
+    after its hash. Adding or removing a shard only moves the keys of the ring segments it
+    gains or loses (about 1/N of them), unlike hash(key) % N which moves almost all.
+    """
+
+    def __init__(self, names: List[str], vnodes: int = 128):
+        if len(set(names)) != len(names):
+            raise ValueError("Shard names must be unique.")
+        points = sorted((self._hash(f"{name}#{i}"), name) for name in names for i in range(vnodes))
+        self._hashes = [h for h, _ in points]
+        self._names = [name for _, name in points]
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+    def shard_for(self, key: str) -> str:
+        i = bisect.bisect_left(self._hashes, self._hash(key))
+        return self._names[i % len(self._names)]
+
+
+class ShardedBankingXMLQueries:
+    """BankingXMLQueries over N shards, each its own BaseX server or database.
+
+    Accounts and their cards are placed by consistent hashing of AccountID, transactions
+    with their FromAccountID. Users are written to every shard (a create that fails on
+    one shard is undone on the others); loans, employees and everything not listed here
+    are served by the catalog shard (the first one), to which unknown attributes are
+    delegated.
+
+    Point operations on an account go to its shard; lookups by TransactionID or CardID and
+    list queries ask every shard in parallel and merge the results. Analytics run on every
+    shard in parallel and merge partial aggregates (counts and sums add up, avg is
+    rebuilt from sum and count). A transfer between shards is written with the debit on
+    the sending shard; the credit on the receiving shard is applied once (marked in
+    shards/credits.xml) and, if it fails, kept in an outbox file for settle_pending_credits().
+    """
+
+    def __init__(self, shards: List[BankingXMLQueries], vnodes: int = 128, max_workers: Optional[int] = None,
+                 outbox_path: str = os.path.join("Banking_System", "shards", "pending_credits.jsonl")):
+        if not shards:
+            raise ValueError("At least one shard is needed.")
+        self.shards = {f"{bank.db_host}:{bank.db_port}/{bank.db_name}": bank for bank in shards}
+        self.catalog = shards[0]
+        self.ring = HashRing(list(self.shards), vnodes)
+        self.max_workers = max_workers or len(shards)
+        self.outbox_path = outbox_path
+        self._outbox_lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if name == 'catalog':  # not set yet
+            raise AttributeError(name)
+        return getattr(self.catalog, name)
+
+    def shard_for_account(self, account_id: str) -> BankingXMLQueries:
+        return self.shards[self.ring.shard_for(account_id)]
+
+    def placement(self) -> Dict[str, Dict[str, int]]:
+        """Accounts per shard and how many of them the ring now places elsewhere (e.g. after adding a shard)"""
+        def count(bank):
+            ids = [row[0] for rows in bank.iter_rows(f'doc("{bank.accounts_db}/accounts.xml")/Accounts/Account', ['AccountID'])
+                   for row in rows]
+            return {'accounts': len(ids), 'misplaced': sum(self.shard_for_account(i) is not bank for i in ids)}
+        return dict(zip(self.shards, self._scatter(count)))
+
+    def _scatter(self, call: Callable[[BankingXMLQueries], object]) -> List:
+        """call(shard) on every shard in parallel; results in shard order"""
+        if len(self.shards) == 1:
+            return [call(self.catalog)]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(self.shards))) as executor:
+            futures = [executor.submit(call, bank) for bank in self.shards.values()]
+        return [future.result() for future in futures]
+
+    def _gather(self, method: str, *args, **kwargs) -> List[Dict]:
+        return [row for rows in self._scatter(lambda bank: getattr(bank, method)(*args, **kwargs)) for row in rows]
+
+    def _shard_holding(self, entity: str, key_field: str, key: str) -> Optional[BankingXMLQueries]:
+        document, root_tag, item_tag = ENTITY_DOCUMENTS[entity]
+
+        def holds(bank):
+            nodes = (bank._transaction_nodes() if entity == 'transactions'
+                     else f'doc("{bank.databases[entity]}/{document}")/{root_tag}/{item_tag}')
+            return bank._execute_query(f'exists({nodes}[{key_field} = "{key}"])').strip() == "true"
+
+        return next((bank for bank, found in zip(self.shards.values(), self._scatter(holds)) if found), None)
+
+    # ==============================================
+    # Users (written to every shard)
+    # ==============================================
+
+    def create_user(self, user_data: Dict) -> str:
+        """Create the user on every shard, or on none: if any shard refuses or fails, the
+        copies written to the others are deleted again"""
+        user_id = user_data.get('UserID') or self.catalog._new_id("USER")
+        user_data = {**user_data, 'UserID': user_id}
+        results = self._scatter(lambda bank: bank.create_user(user_data))
+        failed = [r for r in results if "successfully" not in r]
+        if not failed:
+            return results[0]
+        for bank, result in zip(self.shards.values(), results):
+            if "successfully" in result:
+                self._delete_user(bank, user_id)
+        return failed[0]
+
+    def _delete_user(self, bank: BankingXMLQueries, user_id: str) -> None:
+        """Compensate a partly created user (best effort: a failure is reported, not raised)"""
+        try:
+            bank._execute_query(f'delete nodes doc("{bank.users_db}/users.xml")/Users/User[UserID = "{user_id}"]',
+                                write=True)
+            if bank.change_log is None and bank.user_search_index is not None and bank.user_search_index.is_built:
+                bank.user_search_index.remove(user_id)
+            bank._record_change('delete', 'users', user_id)
+        except Exception as e:
+            print(f"Warning: could not remove user {user_id} from a shard after a failed create: {e}")
+
+    def update_user(self, user_id: str, update_data: Dict) -> str:
+        results = self._scatter(lambda bank: bank.update_user(user_id, update_data))
+        failed = [r for r in results if "successfully" not in r]
+        return failed[0] if failed else results[0]
+
+    # ==============================================
+    # Accounts and cards (routed by AccountID)
+    # ==============================================
+
+    def create_account(self, account_data: Dict) -> str:
+        account_data = {**account_data, 'AccountID': account_data.get('AccountID') or self.catalog._new_id("ACC")}
+        return self.shard_for_account(account_data['AccountID']).create_account(account_data)
+
+    def get_account_balance(self, account_id: str) -> Optional[Decimal]:
+        return self.shard_for_account(account_id).get_account_balance(account_id)
+
+    def update_account_balance(self, account_id: str, amount: Decimal) -> str:
+        return self.shard_for_account(account_id).update_account_balance(account_id, amount)
+
+    def close_account(self, account_id: str) -> str:
+        return self.shard_for_account(account_id).close_account(account_id)
+
+    def _get_account_by_id(self, account_id: str) -> Optional[Dict]:
+        return self.shard_for_account(account_id)._get_account_by_id(account_id)
+
+    def get_accounts_by_user(self, user_id: str) -> List[Dict]:
+        return self._gather('get_accounts_by_user', user_id)
+
+    def get_accounts_by_type(self, account_type: str) -> List[Dict]:
+        return self._gather('get_accounts_by_type', account_type)
+
+    def get_accounts_with_min_balance(self, min_balance: Decimal) -> List[Dict]:
+        return self._gather('get_accounts_with_min_balance', min_balance)
+
+    def get_accounts_sorted_by_balance(self, account_type: Optional[str] = None, reverse: bool = True) -> List[Dict]:
+        accounts = self._gather('get_accounts_sorted_by_balance', account_type, reverse)
+        return sorted(accounts, key=lambda a: Decimal(str(a.get('Balance') or 0)), reverse=reverse)
+
+    def create_card(self, card_data: Dict) -> str:
+        return self.shard_for_account(card_data['AccountID']).create_card(card_data)
+
+    def get_cards_by_account(self, account_id: str) -> List[Dict]:
+        return self.shard_for_account(account_id).get_cards_by_account(account_id)
+
+    def block_card(self, card_id: str) -> bool:
+        bank = self._shard_holding('cards', 'CardID', card_id)
+        return bank.block_card(card_id) if bank is not None else False
+
+    def get_active_cards(self) -> List[Dict]:
+        return self._gather('get_active_cards')
+
+    def get_expired_cards(self) -> List[Dict]:
+        return self._gather('get_expired_cards')
+
+    def get_blocked_cards(self) -> List[Dict]:
+        return self._gather('get_blocked_cards')
+
+    def get_expiring_cards(self, months: int = 1) -> List[Dict]:
+        return self._gather('get_expiring_cards', months)
+
+    # ==============================================
+    # Transactions (stored with the sending account)
+    # ==============================================
+
+    def create_transaction(self, transaction_data: Dict, idempotency_key: Optional[str] = None) -> str:
+        """Create a transaction on the sending account's shard, crediting the receiver's shard if different"""
+        store = self.catalog.idempotency_store
+        if idempotency_key is not None and store is not None:
+            return run_create_transaction(store, idempotency_key, transaction_data, self._create_transaction)
+        return self._create_transaction(transaction_data)
+
+    def _create_transaction(self, transaction_data: Dict) -> str:
+        # IDs come from the catalog, so shards never hand out the same one
+        check_id = self.catalog._needs_id_check(transaction_data, 'TransactionID')
+        if 'TransactionID' not in transaction_data:
+            transaction_data = {**transaction_data, 'TransactionID': self.catalog._new_id("TX")}
+        from_bank = self.shard_for_account(transaction_data.get('FromAccountID', ''))
+        to_bank = self.shard_for_account(transaction_data.get('ToAccountID', ''))
+        if from_bank is to_bank:
+            return from_bank.create_transaction(transaction_data)
+
+        prepared, error = from_bank._prepare_transaction(transaction_data)
+        if error:
+            return error
+        transaction_id = prepared['TransactionID']
+        if check_id and self._shard_holding('transactions', 'TransactionID', transaction_id) is not None:
+            return f"Cannot create transaction: Transaction ID {transaction_id} already exists"
+        for bank, field in ((from_bank, 'FromAccountID'), (to_bank, 'ToAccountID')):
+            if bank._get_account_by_id(prepared[field]) is None:
+                return f"Cannot create transaction: {field} {prepared[field]} not found"
+
+        from lxml import etree
+        insert_query = from_bank._insert_transaction_query(
+            etree.tostring(etree.fromstring(prepared['xml'])).decode(), prepared['Date'])
+        deltas = from_bank._balance_deltas([prepared]) if from_bank.maintain_balances else {}
+        debit = {account: delta for account, delta in deltas.items() if account == prepared['FromAccountID']}
+        credit = {account: delta for account, delta in deltas.items() if account not in debit}
+        if debit:
+            insert_query = f"({insert_query}), {from_bank._balance_update_query(debit)}"
+        try:
+            from_bank._execute_query(insert_query, write=True)
+        except Exception as e:
+            print(f"Error creating transaction: {e}")
+            return f"An error occurred during transaction creation: {e}"
+        from_bank._record_change('create', 'transactions', transaction_id,
+                                 from_bank._element_to_dict(ET.fromstring(prepared['xml'])))
+        from_bank._record_balance_changes(debit)
+        if credit:
+            self._apply_credit(to_bank, self.catalog._new_id("CREDIT"), transaction_id, credit)
+        return f"Transaction {transaction_id} created successfully."
+
+    def update_transaction_status(self, transaction_id: str, new_status: str) -> str:
+        bank = self._shard_holding('transactions', 'TransactionID', transaction_id)
+        if bank is None:
+            return f"Transaction with ID {transaction_id} does not exist."
+        # The deltas come from the status the update itself replaced, so they are applied once
+        result, deltas = bank._update_transaction_status(transaction_id, new_status)
+        for account, change in deltas.items():
+            to_bank = self.shard_for_account(account)
+            if to_bank is not bank:
+                # The sending shard moved its own account; the receiver's Balance is on another shard
+                self._apply_credit(to_bank, self.catalog._new_id("CREDIT"), transaction_id, {account: change})
+        return result
+
+    def _credit_query(self, bank: BankingXMLQueries, credit_id: str, deltas: Dict[str, Decimal]) -> str:
+        """Updating query applying deltas on bank unless credit_id was already applied there"""
+        path = f"{bank.db_name}/{CREDITS_PATH}"
+        marker = f'<Credit id="{credit_id}" at="{datetime.now().isoformat(timespec="seconds")}"/>'
+        return f'''
+        if (doc-available("{path}") and exists(doc("{path}")/Credits/Credit[@id = "{credit_id}"])) then ()
+        else (
+            {bank._balance_update_query(deltas)},
+            if (doc-available("{path}")) then insert node {marker} into doc("{path}")/Credits
+            else db:add("{bank.db_name}", <Credits>{marker}</Credits>, "{CREDITS_PATH}")
+        )'''
+
+    def _apply_credit(self, bank: BankingXMLQueries, credit_id: str, transaction_id: str,
+                      deltas: Dict[str, Decimal]) -> bool:
+        try:
+            bank._execute_query(self._credit_query(bank, credit_id, deltas), write=True)
+        except Exception as e:
+            print(f"Warning: cross-shard credit for transaction {transaction_id} failed, queued for retry: {e}")
+            entry = {'credit_id': credit_id, 'transaction_id': transaction_id,
+                     'shard': next(name for name, b in self.shards.items() if b is bank),
+                     'deltas': {account: str(delta) for account, delta in deltas.items()}}
+            with self._outbox_lock:
+                os.makedirs(os.path.dirname(os.path.abspath(self.outbox_path)), exist_ok=True)
+                with open(self.outbox_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry) + "\n")
+            return False
+        bank._record_balance_changes(deltas)
+        return True
+
+    def settle_pending_credits(self) -> Tuple[int, int]:
+        """Retry queued cross-shard credits; returns (applied, still pending)"""
+        with self._outbox_lock:
+            if not os.path.exists(self.outbox_path):
+                return 0, 0
+            with open(self.outbox_path, encoding="utf-8") as f:
+                entries = [json.loads(line) for line in f if line.strip()]
+            os.remove(self.outbox_path)
+        applied = 0
+        for entry in entries:  # failures are appended to a fresh outbox
+            deltas = {account: Decimal(delta) for account, delta in entry['deltas'].items()}
+            applied += self._apply_credit(self.shards[entry['shard']], entry['credit_id'],
+                                          entry['transaction_id'], deltas)
+        return applied, len(entries) - applied
+
+    def get_transaction_by_id(self, transaction_id: str) -> Optional[Dict]:
+        return next((t for t in self._scatter(lambda bank: bank.get_transaction_by_id(transaction_id)) if t), None)
+
+    def get_transactions_by_account(self, account_id: str, start_date: Optional[str] = None,
+                                    end_date: Optional[str] = None, include_archived: bool = False) -> List[Dict]:
+        """Outgoing transactions live on the account's shard, incoming ones on the senders' shards"""
+        transactions = self._gather('get_transactions_by_account', account_id, start_date, end_date, include_archived)
+        unique = {t.get('TransactionID'): t for t in transactions}
+        return sorted(unique.values(), key=lambda t: t.get('Date') or '', reverse=True)
+
+    def get_all_transactions(self) -> List[Dict]:
+        return self._gather('get_all_transactions')
+
+    def get_largest_transactions(self, top_n: int = 10) -> List[Dict]:
+        transactions = sorted(self._gather('get_largest_transactions', top_n),
+                              key=lambda t: Decimal(str(t.get('Amount') or 0)), reverse=True)
+        return transactions if top_n == -1 else transactions[:top_n]
+
+    def detect_high_value_transactions(self, threshold: Decimal, days: int = 7) -> List[Dict]:
+        transactions = self._gather('detect_high_value_transactions', threshold, days)
+        return sorted(transactions, key=lambda t: (Decimal(str(t.get('Amount') or 0)), t.get('Date') or ''), reverse=True)
+
+    def get_user_with_accounts_and_transactions(self, user_id: str) -> Optional[Dict]:
+        # Same composition as the single-database version, over the routed lookups above
+        return BankingXMLQueries.get_user_with_accounts_and_transactions(self, user_id)
+
+    # ==============================================
+    # Analytics (scatter-gather, partial aggregates merged)
+    # ==============================================
+
+    def aggregate(self, entity: str, measures: Dict[str, Tuple[str, Optional[str]]],
+                  filters: Optional[List[Tuple[str, str, object]]] = None,
+                  group_by: Optional[List[str]] = None) -> List[Dict]:
+        """BankingXMLQueries.aggregate over all shards.
+
+        Sharded entities are aggregated on every shard in parallel. avg is asked for as a
+        sum and a count, and the partial rows are merged per group.
+        """
+        if entity not in SHARDED_ENTITIES:
+            return self.catalog.aggregate(entity, measures, filters, group_by)
+        group_by = group_by or []
+        partial_measures = {}
+        for name, (function, field) in measures.items():
+            if function == 'avg':
+                partial_measures[f"{name}.sum"] = ('sum', field)
+                partial_measures[f"{name}.count"] = ('count', field)
+            else:
+                partial_measures[name] = (function, field)
+        merged: Dict[Tuple, Dict] = {}
+        for rows in self._scatter(lambda bank: bank.aggregate(entity, partial_measures, filters, group_by)):
+            for row in rows:
+                key = tuple(row[field] for field in group_by)
+                total = merged.setdefault(key, dict(row))
+                if total is row:
+                    continue
+                for name, (function, _) in partial_measures.items():
+                    a, b = total[name], row[name]
+                    if a is None or b is None:
+                        total[name] = a if b is None else b
+                    elif function in ('count', 'sum'):
+                        total[name] = a + b
+                    else:
+                        total[name] = min(a, b) if function == 'min' else max(a, b)
+        results = []
+        for key in sorted(merged):
+            row = merged[key]
+            for name, (function, _) in measures.items():
+                if function == 'avg':
+                    total, count = row.pop(f"{name}.sum"), row.pop(f"{name}.count")
+                    row[name] = total / count if count else None
+            results.append(row)
+        return results
+
+    def get_bank_overview(self) -> Dict:
+        """Overview per shard, added up; users and loans come from the catalog shard"""
+        overviews = self._scatter(lambda bank: bank.get_bank_overview())
+        overview = {'users_by_role': overviews[0]['users_by_role'], 'loans_by_status': overviews[0]['loans_by_status']}
+        for section in ('accounts_by_type', 'accounts_by_status', 'balances_by_currency', 'cards_by_status'):
+            totals = {}
+            for part in overviews:
+                for key, value in part[section].items():
+                    totals[key] = totals.get(key, 0) + value
+            overview[section] = dict(sorted(totals.items()))
+        overview['transactions'] = sum(part['transactions'] for part in overviews)
+        return overview
+
+    def _balances_by_user(self) -> Dict[str, Decimal]:
+        rows = self.aggregate('accounts', {'total': ('sum', 'Balance')}, group_by=['UserID'])
+        return {row['UserID']: row['total'] for row in rows}
+
+    def get_customer_segments(self, balance_thresholds: Optional[List[Decimal]] = None) -> Dict:
+        """Customers by total balance, from per-user balance sums of every shard"""
+        thresholds = sorted(balance_thresholds or [Decimal(1000), Decimal(5000), Decimal(10000)])
+        segments = {f"< {threshold}": 0 for threshold in thresholds}
+        segments[f">= {thresholds[-1]}"] = 0
+        balances = self._balances_by_user()
+        customers = self.catalog._execute_query(
+            f"doc(\"{self.catalog.users_db}/users.xml\")/Users/User[Role='customer']/UserID/text()").split()
+        for user_id in customers:
+            balance = balances.get(user_id, Decimal(0))
+            label = next((f"< {t}" for t in thresholds if balance < t), f">= {thresholds[-1]}")
+            segments[label] += 1
+        return segments
+
+    def get_top_customers(self, top_n: int = 10) -> List[Dict]:
+        balances = self._balances_by_user()
+        customers = self.catalog.get_users_by_role('customer')
+        ranked = sorted(({'UserID': u['UserID'], 'FullName': u.get('FullName'),
+                          'TotalBalance': balances.get(u['UserID'], Decimal(0))} for u in customers),
+                        key=lambda c: c['TotalBalance'], reverse=True)
+        return ranked[:top_n]
+
+    def get_transaction_volume_report(self, period: str = 'month') -> List[Dict]:
+        totals: Dict[str, Dict] = {}
+        for item in self._gather('get_transaction_volume_report', period):
+            total = totals.setdefault(str(item['period']), {'period': item['period'], 'count': 0, 'amount': Decimal(0)})
+            total['count'] += int(item.get('count') or 0)
+            total['amount'] += Decimal(str(item.get('amount') or 0))
+        return [totals[key] for key in sorted(totals)]
+
+    def get_transaction_stats(self, account_id: str) -> Dict:
+        """Count, total, average, min and max over the account's transactions on every shard"""
+        parts = [p for p in self._scatter(lambda bank: bank.get_transaction_stats(account_id)) if p.get('count')]
+        if not parts:
+            return {}
+        count = sum(p['count'] for p in parts)
+        total = sum((p['total'] for p in parts), Decimal(0))
+        return {'count': count, 'total': total, 'average': total / count,
+                'max': max(p['max'] for p in parts), 'min': min(p['min'] for p in parts)}
+
+    # ==============================================
+    # Maintenance and past balances (every shard)
+    # ==============================================
+
+    def migrate_transactions_to_partitions(self, dry_run: bool = False) -> Dict[str, int]:
+        """Partition the transactions of every shard; counts per month are added up"""
+        counts: Dict[str, int] = {}
+        for part in self._scatter(lambda bank: bank.migrate_transactions_to_partitions(dry_run)):
+            for month, count in part.items():
+                counts[month] = counts.get(month, 0) + count
+        return dict(sorted(counts.items()))
+
+    def archive_transactions(self, cutoff_date: str, dry_run: bool = False) -> Dict[str, int]:
+        """Archive the aged transactions of every shard; counts per month are added up.
+
+        Shards run one after the other, since they may share one archive directory.
+        """
+        counts: Dict[str, int] = {}
+        for bank in self.shards.values():
+            for month, count in bank.archive_transactions(cutoff_date, dry_run).items():
+                counts[month] = counts.get(month, 0) + count
+        return dict(sorted(counts.items()))
+
+    def create_balance_snapshot(self, at: Optional[str] = None) -> str:
+        """Snapshot the current balances of every shard under one timestamp.
+
+        A shard derives past balances from the transactions it stores, which miss the credits
+        sent from other shards, so only the current balances can be snapshotted here.
+        """
+        if at is not None:
+            raise ValueError("A sharded balance snapshot is taken of the current balances; pass no 'at'.")
+        for bank in self.shards.values():
+            bank._require_maintained_balances()
+        at = datetime.now().strftime('%Y-%m-%dT%H:%M:%S')
+        self._scatter(lambda bank: bank.create_balance_snapshot(at))
+        return at
+
+    def get_balance_at(self, account_id: str, at: str) -> Optional[Decimal]:
+        """Balance of an account at a point in time, as BankingXMLQueries.get_balance_at.
+
+        The starting point (nearest snapshot or the current Balance) is read on the account's
+        shard; the settled transactions in between are summed on every shard, since a transfer
+        is stored on the sender's shard only.
+        """
+        home = self.shard_for_account(account_id)
+        home._require_maintained_balances()
+        at = home._normalize_timestamp(at)
+        now = datetime.now().strftime('%Y-%m-%dT%H:%M:%S')
+        base, balance = home._balance_starting_point(account_id, at, now)
+        start = home._execute_query(f'for $b in ({balance})[1] return string($b)').strip()
+        if not start:
+            return None
+        after, up_to = min(base, at), max(base, at)
+
+        def live_net(bank):
+            result = bank._execute_query(f'''
+            let $tx := {bank._transaction_nodes(after, up_to)}[Status = "completed" and Date > "{after}" and Date <= "{up_to}"]
+            return sum($tx[ToAccountID = "{account_id}"]/Amount ! xs:decimal(.))
+                   - sum($tx[FromAccountID = "{account_id}"]/Amount ! xs:decimal(.))
+            ''').strip()
+            return Decimal(result or 0)
+
+        net = sum(self._scatter(live_net), Decimal(0))
+        # Each archive directory once: shards may share one
+        archives = {bank.transaction_archive.archive_dir: bank for bank in self.shards.values()}
+        for bank in archives.values():
+            net += bank._archived_flows(after, up_to, account_id).get(account_id, Decimal(0))
+        return Decimal(start) + net if base <= at else Decimal(start) - net
@@ -0,0 +1,180 @@
+import bisect
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Compiled schemas, per thread: an lxml XMLSchema keeps its error_log on the object,
+# so concurrent validations must not share one. Worker processes fill theirs once.
+_local = threading.local()
+
+
+def load_schema(xsd_path: str):
+    """Compiled lxml XMLSchema for xsd_path, compiled once and again only if the file changes.
+
+    Raises FileNotFoundError, ValueError (empty file) or lxml's XMLSchemaParseError.
+    """
+    from lxml import etree
+    schemas = getattr(_local, 'schemas', None)
+    if schemas is None:
+        schemas = _local.schemas = {}
+    mtime = os.path.getmtime(xsd_path)
+    cached = schemas.get(xsd_path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with open(xsd_path, 'rb') as f:
+        content = f.read()
+    if not content:
+        raise ValueError(f"XSD file is empty: {xsd_path}")
+    schema = etree.XMLSchema(etree.XML(content))
+    schemas[xsd_path] = (mtime, schema)
+    return schema
+
+
+def _pack(root_tag: str, records: List[str]) -> Tuple[bytes, List[int]]:
+    """One document holding all records, plus the line each record starts on
+    (followed by the line of the closing root tag)"""
+    starts = []
+    line = 2  # line 1 is the opening root tag
+    for record in records:
+        starts.append(line)
+        line += record.count("\n") + 1
+    starts.append(line)
+    document = "\n".join([f"<{root_tag}>", *records, f"</{root_tag}>"])
+    return document.encode("utf-8"), starts
+
+
+def _record_at(starts: List[int], line: Optional[int]) -> Optional[int]:
+    """Index of the record containing line (None for the root tags or an unknown line)"""
+    if not line or line < starts[0] or line >= starts[-1]:
+        return None
+    return bisect.bisect_right(starts, line) - 1
+
+
+def _validate_one(schema, root_tag: str, record: str) -> Optional[str]:
+    from lxml import etree
+    try:
+        tree = etree.fromstring(f"<{root_tag}>{record}</{root_tag}>".encode("utf-8"))
+    except etree.XMLSyntaxError as e:
+        return f"XML Syntax Error: {e.msg}"
+    if schema.validate(tree):
+        return None
+    return "; ".join(f"{e.message} (column {e.column})" for e in list(schema.error_log)[:5])
+
+
+def validate_chunk(xsd_path: str, root_tag: str, records: List[str], offset: int = 0) -> Tuple[List[Tuple[int, str]], float]:
+    """Validate records as one document; returns ([(row index, message)], busy seconds).
+
+    libxml2 reports errors by line, which is mapped back to the record. A chunk may not
+    report every bad record at once (a syntax error stops parsing), so flagged records are
+    dropped and the rest re-validated until the remainder passes. Runs in worker processes.
+    """
+    from lxml import etree
+    started = time.process_time()
+    schema = load_schema(xsd_path)
+    pending = list(range(len(records)))
+    errors: Dict[int, str] = {}
+    while pending:
+        document, starts = _pack(root_tag, [records[i] for i in pending])
+        bad: Dict[int, str] = {}
+        try:
+            tree = etree.fromstring(document)
+        except etree.XMLSyntaxError as e:
+            row = _record_at(starts, e.lineno)
+            # The parser may only notice a broken record further on; blame it only if it fails alone
+            if row is not None and _validate_one(schema, root_tag, records[pending[row]]):
+                bad[row] = f"XML Syntax Error: {e.msg} (line {e.lineno - starts[row] + 1})"
+        else:
+            if schema.validate(tree):
+                break
+            for entry in schema.error_log:
+                row = _record_at(starts, entry.line)
+                if row is not None and row not in bad:
+                    bad[row] = f"{entry.message} (line {entry.line - starts[row] + 1}, column {entry.column})"
+        if not bad:
+            # Errors not attributable to a record: fall back to one document per record
+            for i in pending:
+                message = _validate_one(schema, root_tag, records[i])
+                if message:
+                    errors[i] = message
+            break
+        for row, message in bad.items():
+            errors[pending[row]] = message
+        pending = [index for row, index in enumerate(pending) if row not in bad]
+    return sorted((offset + i, message) for i, message in errors.items()), time.process_time() - started
+
+
+def _chunks(records: Iterable[str], chunk_size: int) -> Iterator[List[str]]:
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class BatchValidator:
+    """Validate many records against an XSD, chunk by chunk, in worker processes.
+
+    Each chunk of chunk_size serialized records (e.g. '<Transaction>...</Transaction>') is
+    wrapped in one root_tag document and validated at once, instead of one document per
+    record. Every worker compiles the schema once when it starts. Records are consumed
+    lazily with at most two chunks per worker in flight, so a million-row iterable is
+    never held in memory at once. Errors come back as (row index, message), indices
+    counting from 0 in input order.
+    """
+
+    def __init__(self, xsd_path: str, root_tag: str, workers: Optional[int] = None, chunk_size: int = 2000):
+        self.xsd_path = xsd_path
+        self.root_tag = root_tag
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.last_stats: Dict = {}
+
+    def validate(self, records: Iterable[str]) -> List[Tuple[int, str]]:
+        load_schema(self.xsd_path)  # fail fast on a missing or broken schema
+        started = time.perf_counter()
+        errors: List[Tuple[int, str]] = []
+        rows = chunks = 0
+        busy = 0.0
+
+        def collect(result):
+            nonlocal busy
+            chunk_errors, seconds = result
+            errors.extend(chunk_errors)
+            busy += seconds
+
+        if self.workers == 1:
+            for chunk in _chunks(records, self.chunk_size):
+                collect(validate_chunk(self.xsd_path, self.root_tag, chunk, rows))
+                rows += len(chunk)
+                chunks += 1
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=load_schema,
+                                     initargs=(self.xsd_path,)) as pool:
+                in_flight = deque()
+                for chunk in _chunks(records, self.chunk_size):
+                    in_flight.append(pool.submit(validate_chunk, self.xsd_path, self.root_tag, chunk, rows))
+                    rows += len(chunk)
+                    chunks += 1
+                    if len(in_flight) >= 2 * self.workers:
+                        collect(in_flight.popleft().result())
+                while in_flight:
+                    collect(in_flight.popleft().result())
+
+        seconds = time.perf_counter() - started
+        self.last_stats = {
+            'rows': rows,
+            'chunks': chunks,
+            'workers': self.workers,
+            'invalid_rows': len(errors),
+            'seconds': round(seconds, 3),
+            'rows_per_second': round(rows / seconds) if seconds else None,
+            'rows_per_cpu_second': round(rows / busy) if busy else None,  # throughput per core
+        }
+        errors.sort()
+        return errors
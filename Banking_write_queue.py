@@ -0,0 +1,224 @@
+import queue
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+
+from BaseXClient import Session
+from Banking_idempotency import run_create_transaction
+
+
+class _Request:
+    __slots__ = ("data", "future", "submitted")
+
+    def __init__(self, data: Dict):
+        self.data = data
+        self.future: Future = Future()
+        self.submitted = time.perf_counter()
+
+
+class GroupCommitWriter:
+    """Background writer that merges create_transaction calls into batched updating queries.
+
+    Requests are queued and a single thread drains the queue. A batch is closed once it
+    holds max_batch_size requests or max_delay seconds after its first request, whichever
+    comes first. Each batch costs two round trips on one persistent session: one query
+    checks every TransactionID and account of the batch, one updating query inserts all
+    accepted transactions. Every caller's future resolves to exactly the message
+    create_transaction would have returned for its request.
+
+    max_delay trades latency for throughput: 0 flushes whatever is queued immediately,
+    larger values build bigger batches under load.
+    """
+
+    def __init__(self, bank, max_batch_size: int = 200, max_delay: float = 0.005, latency_samples: int = 10000):
+        self.bank = bank
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self._queue: "queue.Queue[Optional[_Request]]" = queue.Queue()
+        self._session: Optional[Session] = None
+        self._closed = False
+
+        self._stats_lock = threading.Lock()
+        self._latencies = deque(maxlen=latency_samples)
+        self._requests = 0
+        self._batches = 0
+        self._started = time.perf_counter()
+
+        self._thread = threading.Thread(target=self._run, name="group-commit-writer", daemon=True)
+        self._thread.start()
+
+    # ==============================================
+    # Public API
+    # ==============================================
+
+    def submit(self, transaction_data: Dict) -> Future:
+        """Queue a create_transaction request; the future resolves to its result message"""
+        if self._closed:
+            raise RuntimeError("GroupCommitWriter is closed")
+        request = _Request(transaction_data)
+        self._queue.put(request)
+        return request.future
+
+    def create_transaction(self, transaction_data: Dict, timeout: Optional[float] = None,
+                           idempotency_key: Optional[str] = None) -> str:
+        """Blocking drop-in for BankingXMLQueries.create_transaction (idempotency keys included)"""
+        store = self.bank.idempotency_store
+        if idempotency_key is not None and store is not None:
+            # A timeout leaves the key unknown; the request stays queued, and a retry reuses its
+            # TransactionID, so it is rejected as existing once the first one commits
+            return run_create_transaction(store, idempotency_key, transaction_data,
+                                          lambda data: self.submit(data).result(timeout))
+        return self.submit(transaction_data).result(timeout)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Flush queued requests and stop the writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+        if self._session is not None:
+            try:
+                self._session.close()
+            except OSError:
+                pass
+            self._session = None
+
+    def stats(self) -> Dict:
+        """Throughput and latency measured since the writer started"""
+        with self._stats_lock:
+            latencies = sorted(self._latencies)
+            elapsed = time.perf_counter() - self._started
+            requests, batches = self._requests, self._batches
+
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 3)
+
+        return {
+            'requests': requests,
+            'batches': batches,
+            'avg_batch_size': round(requests / batches, 2) if batches else 0.0,
+            'throughput_per_s': round(requests / elapsed, 2) if elapsed > 0 else 0.0,
+            'latency_ms_p50': percentile(0.50),
+            'latency_ms_p95': percentile(0.95),
+            'latency_ms_p99': percentile(0.99),
+        }
+
+    # ==============================================
+    # Writer thread
+    # ==============================================
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = time.perf_counter() + self.max_delay
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    stopping = True
+                    break
+                batch.append(request)
+            self._commit(batch)
+
+    def _get_session(self) -> Session:
+        if self._session is None:
+            self._session = Session(self.bank.db_host, self.bank.db_port, self.bank.db_user, self.bank.db_pass)
+            self._session.execute(f"OPEN {self.bank.db_name}")
+        return self._session
+
+    def _resolve(self, request: _Request, result: str) -> None:
+        with self._stats_lock:
+            self._latencies.append(time.perf_counter() - request.submitted)
+            self._requests += 1
+        request.future.set_result(result)
+
+    def _commit(self, batch: List[_Request]) -> None:
+        bank = self.bank
+        with self._stats_lock:
+            self._batches += 1
+
+        # Validation and XML building need no database access
+        pending = []
+        for request in batch:
+            prepared, error = bank._prepare_transaction(request.data)
+            if error:
+                self._resolve(request, error)
+            else:
+                pending.append((request, prepared))
+        if not pending:
+            return
+
+        try:
+            session = self._get_session()
+            ids = ", ".join(f'"{p["TransactionID"]}"' for _, p in pending)
+            accounts = ", ".join(sorted({f'"{p[k]}"' for _, p in pending for k in ('FromAccountID', 'ToAccountID')}))
+            # One round trip for all existence checks of the batch
+            check_query = f'''
+            string-join((
+                {bank._transaction_nodes()}[TransactionID = ({ids})]/TransactionID ! ("T:" || .),
+                doc("{bank.accounts_db}/accounts.xml")/Accounts/Account[AccountID = ({accounts})]/AccountID ! ("A:" || .)
+            ), " ")
+            '''
+            found = set(session.execute(f"XQUERY {check_query}").split())
+
+            accepted = []
+            batch_ids = set()
+            for request, p in pending:
+                tx_id = p['TransactionID']
+                if f"T:{tx_id}" in found or tx_id in batch_ids:
+                    self._resolve(request, f"Cannot create transaction: Transaction ID {tx_id} already exists")
+                elif f"A:{p['FromAccountID']}" not in found:
+                    self._resolve(request, f"Cannot create transaction: FromAccountID {p['FromAccountID']} not found")
+                elif f"A:{p['ToAccountID']}" not in found:
+                    self._resolve(request, f"Cannot create transaction: ToAccountID {p['ToAccountID']} not found")
+                else:
+                    batch_ids.add(tx_id)
+                    accepted.append((request, p))
+            if not accepted:
+                return
+
+            # One updating query for the whole batch, grouped by target partition
+            by_partition: Dict[str, List[Dict]] = {}
+            for _, p in accepted:
+                by_partition.setdefault(bank._transaction_partition_path(p['Date']), []).append(p)
+            # The new nodes form one sequence expression: (<Transaction>..</Transaction>, <Transaction>..</Transaction>)
+            updates = [
+                "(" + bank._insert_transaction_query("(" + ", ".join(p['xml'] for p in group) + ")", group[0]['Date']) + ")"
+                for group in by_partition.values()
+            ]
+            # Balance changes are netted per account: one node may only be replaced once per query
+            deltas = bank._balance_deltas([p for _, p in accepted]) if bank.maintain_balances else {}
+            if deltas:
+                updates.append(bank._balance_update_query(deltas))
+            session.execute("XQUERY " + ",\n".join(updates))
+        except Exception as e:
+            print(f"Error committing transaction batch: {e}")
+            if self._session is not None:
+                try:
+                    self._session.close()
+                except OSError:
+                    pass
+                self._session = None  # reconnect for the next batch
+            for request, _ in pending:
+                if not request.future.done():
+                    self._resolve(request, f"An error occurred during transaction creation: {e}")
+            return
+
+        bank._record_balance_changes(deltas)
+        for request, p in accepted:
+            bank._record_change('create', 'transactions', p['TransactionID'],
+                                bank._element_to_dict(ET.fromstring(p['xml'])))
+            self._resolve(request, f"Transaction {p['TransactionID']} created successfully.")
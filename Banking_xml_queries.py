@@ -1,41 +1,201 @@
-from lxml import etree # Keep for parsing results if needed
+# Heavy dependencies are imported where they are used, so importing this module stays
+# cheap: lxml only validates and serializes new records, numpy only backs the
+# minor-unit aggregations. See `Banking_admin.py bench-import`.
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Tuple
+from typing import Iterable, List, Dict, Optional, Tuple
 from decimal import Decimal
-import operator
-import uuid
 import os
-from pathlib import Path
-import json
 
-# import date
-from datetime import datetime
 from BaseXClient import Session
-import uuid
+from Banking_search_index import UserSearchIndex
+from Banking_archive import TransactionArchive
+from Banking_changelog import ChangeLog
+from Banking_replicas import ReplicaRouter
+from Banking_session_pool import SessionPool
+from Banking_money import MONEY_FIELDS, Money, money_class, parse_money_column
+from Banking_range_index import TransactionRangeIndex
+from Banking_idempotency import IdempotencyStore, run_create_transaction
+from Banking_id_allocator import IdAllocator
+from Banking_validation import BatchValidator, load_schema
 import xml.etree.ElementTree as ET # Using standard library for simple parsing
-import pandas as pd # For DataFrame operations if needed
 import re
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+# entity name -> (document, root element, item element)
+ENTITY_DOCUMENTS = {
+    'users': ('users.xml', 'Users', 'User'),
+    'accounts': ('accounts.xml', 'Accounts', 'Account'),
+    'transactions': ('transactions.xml', 'Transactions', 'Transaction'),
+    'loans': ('loans.xml', 'Loans', 'Loan'),
+    'cards': ('cards.xml', 'Cards', 'Card'),
+    'employees': ('employees.xml', 'Employees', 'Employee'),
+}
+
+# Errors raised by the socket itself. BaseX reports a failed query or login as a plain
+# IOError, which says nothing about whether the server is reachable.
+SOCKET_ERRORS = (ConnectionError, socket.timeout, socket.gaierror)
+
+# Tries to append a change record before the write is reported as unlogged
+CHANGE_LOG_ATTEMPTS = 3
+
+# How parsed Balance/Amount/Salary values are represented (see Banking_money)
+MONEY_TYPES = ('decimal', 'minor')
+
+# Fields compared and aggregated as xs:decimal by aggregate()
+NUMERIC_FIELDS = {'Balance', 'Amount', 'InterestRate', 'Salary', 'LoanAmount'}
+
+AGGREGATE_FUNCTIONS = ('count', 'sum', 'avg', 'min', 'max')
+FILTER_OPERATORS = ('=', '!=', '<', '<=', '>', '>=', 'in')
+_FIELD_PATH = re.compile(r'^[A-Za-z]+(/[A-Za-z]+)*$')
+
+# Compiled once for validate_user_data
+_PLACE_NAME = re.compile(r"^[A-Za-z\s]+$")
+_EMAIL = re.compile(r"[^@]+@[^@]+\.[^@]+")
+_PHONE = re.compile(r"^\+?\d{7,15}$")
+
+
+def _random_id(prefix: str) -> str:
+    """Default ID for a new record, e.g. TX-1A2B3C4D"""
+    import uuid
+    return f"{prefix}-{uuid.uuid4().hex[:8].upper()}"
+
 
 class BankingXMLQueries:
-    def __init__(self, db_name: str = 'banking', db_host: str = 'localhost', db_port: int = 1984, db_user: str = 'Bank_Admin', db_pass: str = 'bankadmin'):
-        """Initialize with BaseX connection details"""
+    def __init__(self, db_name: str = 'banking', db_host: str = 'localhost', db_port: int = 1984, db_user: str = 'Bank_Admin', db_pass: str = 'bankadmin',
+                 user_search_index: Optional[UserSearchIndex] = None, partition_transactions: Optional[bool] = None,
+                 transaction_archive: Optional[TransactionArchive] = None, analytics_engine=None,
+                 change_log: Optional[ChangeLog] = None, replica_router: Optional[ReplicaRouter] = None,
+                 read_your_writes: bool = False, session_pool: Optional[SessionPool] = None,
+                 maintain_balances: bool = False, money_type: str = 'decimal',
+                 range_index: Optional[TransactionRangeIndex] = None, databases: Optional[Dict[str, str]] = None,
+                 idempotency_store: Optional[IdempotencyStore] = None, id_allocator: Optional[IdAllocator] = None):
+        """Initialize with BaseX connection details.
+
+        user_search_index: optional in-process index used by search_users/autocomplete_users.
+        With a change_log it catches up from the log before every lookup, so users written by
+        other processes sharing the log are found too.
+        It is built from the database on first use and kept up to date by create_user/update_user.
+        partition_transactions: store transactions in monthly documents (transactions/YYYY-MM.xml)
+        instead of transactions.xml. None detects the layout from the database on first use.
+        transaction_archive: cold storage used by archive_transactions and by
+        get_transactions_by_account(include_archived=True). Defaults to Banking_System/archive/.
+        analytics_engine: optional Banking_analytics.AnalyticsEngine. When set, get_customer_segments,
+        get_top_customers, get_transaction_volume_report and detect_high_value_transactions are
+        computed from its in-memory snapshot instead of querying the server.
+        change_log: optional change-data-capture log; every successful write appends a record to it.
+        replica_router: optional Banking_replicas.ReplicaRouter. Reads are spread over its replicas,
+        writes go to its primary (which then replaces db_host/db_port).
+        read_your_writes: route every read to a server that has applied this process's writes;
+        use consistent_reads() to ask for it around individual calls instead.
+        session_pool: optional Banking_session_pool.SessionPool; read queries reuse its open
+        sessions instead of connecting (and opening the database) on every call.
+        maintain_balances: completed transactions also move the Balance of both accounts, in the
+        same updating query, so current balances stay in line with the ledger.
+        money_type: 'decimal' parses Balance/Amount/Salary as Decimal; 'minor' parses them as
+        Banking_money.Money (int minor units at the currency's scale), and get_customer_segments
+        and get_user_with_accounts_and_transactions then aggregate integers instead of Decimals.
+        range_index: optional Banking_range_index.TransactionRangeIndex over transaction Date and
+        Amount. detect_high_value_transactions and get_transactions_by_account then find the
+        matching TransactionIDs by binary search and fetch only those. It is built from the
+        database on first use (build_range_index() rebuilds it). With a change_log it catches
+        up from the log before every lookup, so writes of other processes sharing the log are
+        included; without one it only sees this process's writes.
+        databases: optional entity -> database name (see Banking_db_layout), e.g.
+        {'cards': 'banking_cards'}; entities not listed stay in db_name. BaseX locks whole
+        databases, so entities in separate databases are written concurrently.
+        split_databases() moves existing documents into the layout.
+        idempotency_store: optional Banking_idempotency.IdempotencyStore. create_transaction calls
+        with the same idempotency_key then return the first call's result without touching
+        the database.
+        id_allocator: optional Banking_id_allocator.IdAllocator. New records without an ID then get
+        sequential IDs from blocks reserved on the server, which are never handed out twice,
+        so the create methods skip their ID existence check.
+        """
+        if money_type not in MONEY_TYPES:
+            raise ValueError(f"Unsupported money_type '{money_type}'. Choose one of {', '.join(MONEY_TYPES)}.")
+        unknown = sorted(set(databases or {}) - set(ENTITY_DOCUMENTS))
+        if unknown:
+            raise ValueError(f"Unsupported entity '{unknown[0]}' in databases. Choose one of {', '.join(ENTITY_DOCUMENTS)}.")
         self.main_dir = "Banking_System/"
         self.db_host = db_host
         self.db_port = db_port
         self.db_user = db_user
         self.db_pass = db_pass
         self.db_name = db_name
+        self.databases = {entity: (databases or {}).get(entity) or db_name for entity in ENTITY_DOCUMENTS}
+        self.users_db = self.databases['users']
+        self.accounts_db = self.databases['accounts']
+        self.transactions_db = self.databases['transactions']
+        self.loans_db = self.databases['loans']
+        self.cards_db = self.databases['cards']
+        self.employees_db = self.databases['employees']
         self.cards_xsd_path = os.path.join(self.main_dir, 'cards.xsd') 
         self.users_xsd_path = os.path.join(self.main_dir, 'users.xsd') 
         self.accounts_xsd_path = os.path.join(self.main_dir, 'accounts.xsd') 
         self.transactions_xsd_path = os.path.join(self.main_dir, 'transactions.xsd') 
         self.loans_xsd_path = os.path.join(self.main_dir, 'loans.xsd') 
         self.employees_xsd_path = os.path.join(self.main_dir, 'employees.xsd')
+        self.user_search_index = user_search_index
+        self.partition_transactions = partition_transactions
+        self.transaction_archive = transaction_archive or TransactionArchive(os.path.join(self.main_dir, 'archive'))
+        self.analytics_engine = analytics_engine
+        self.change_log = change_log
+        self.replica_router = replica_router
+        self.read_your_writes = read_your_writes
+        self._local = threading.local()
+        self.session_pool = session_pool
+        self.maintain_balances = maintain_balances
+        self.money_type = money_type
+        self.range_index = range_index
+        self.idempotency_store = idempotency_store
+        self.id_allocator = id_allocator
+        self.last_validation_stats: Dict = {}
+        if replica_router is not None:
+            self.db_host, self.db_port = replica_router.primary.host, replica_router.primary.port
 
    
-    def _execute_query(self, query: str) -> str:
-        """Helper to execute an XQuery against BaseX"""
-        session = Session(self.db_host, self.db_port, self.db_user, self.db_pass)
+    def _execute_query(self, query: str, write: bool = False) -> str:
+        """Helper to execute an XQuery against BaseX.
+
+        Reads go to a read replica when a replica router is configured; updating queries
+        must pass write=True so they run on the primary.
+        """
+        if self.replica_router is None:
+            return self._execute_on(self.db_host, self.db_port, query)
+        if write:
+            try:
+                return self._execute_on(self.db_host, self.db_port, query)
+            finally:
+                self.replica_router.note_write()
+        consistent = self.read_your_writes or getattr(self._local, 'consistent', False)
+        with self.replica_router.route(consistent) as endpoint:
+            if endpoint is self.replica_router.primary:
+                return self._execute_on(endpoint.host, endpoint.port, query)
+            try:
+                return self._execute_on(endpoint.host, endpoint.port, query)
+            except ConnectionError as e:
+                # Only an unreachable replica fails over; a query error would fail on the primary too
+                if not isinstance(e.__cause__, SOCKET_ERRORS):
+                    raise
+                self.replica_router.mark_down(endpoint)
+        return self._execute_on(self.db_host, self.db_port, query)
+
+    def _execute_on(self, host: str, port: int, query: str) -> str:
+        if self.session_pool is not None:
+            try:
+                with self.session_pool.session(host, port, self.db_user, self.db_pass, self.db_name) as session:
+                    return session.execute(f'XQUERY {query}')
+            except IOError as e:
+                print(f"BaseX connection error: {e}")
+                raise ConnectionError(f"Could not connect to BaseX server at {host}:{port}") from e
+        try:
+            session = Session(host, port, self.db_user, self.db_pass)
+        except IOError as e:
+            print(f"BaseX connection error: {e}")
+            raise ConnectionError(f"Could not connect to BaseX server at {host}:{port}") from e
         try:
             session.execute(f"OPEN {self.db_name}")
             result = session.execute(f'XQUERY {query}')
@@ -43,10 +203,466 @@ class BankingXMLQueries:
         except IOError as e:
             # Handle potential connection errors more gracefully
             print(f"BaseX connection error: {e}")
-            raise ConnectionError(f"Could not connect to BaseX server at {self.db_host}:{self.db_port}") from e
+            raise ConnectionError(f"Could not connect to BaseX server at {host}:{port}") from e
         finally:
             session.close()
 
+    def run_batch(self, calls: Dict[str, Tuple], max_workers: int = 8) -> Dict:
+        """Run independent read calls concurrently and return their results by name.
+
+        calls maps a name to (method, *args), e.g.
+            bank.run_batch({'customers': (bank.get_users_by_role, 'customer'),
+                            'loans': (bank.get_approved_loans,)})
+        Each call runs on its own worker thread, so the round trips overlap; with a session
+        pool they also skip connecting. The first exception raised by a call is re-raised
+        once all calls have finished.
+        """
+        consistent = getattr(self._local, 'consistent', False)
+
+        def run(call):
+            self._local.consistent = consistent
+            return call[0](*call[1:])
+
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(calls)) or 1) as executor:
+            futures = {name: executor.submit(run, call) for name, call in calls.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+    @contextmanager
+    def consistent_reads(self):
+        """Reads inside the block see every write this process has made (read-your-writes)"""
+        previous = getattr(self._local, 'consistent', False)
+        self._local.consistent = True
+        try:
+            yield self
+        finally:
+            self._local.consistent = previous
+
+    def _record_change(self, op: str, entity: str, key: str, data: Optional[Dict] = None) -> None:
+        """Append a change record to the change log, if one is configured.
+
+        Called after the database update succeeded; secrets are never logged. A record that
+        still cannot be written after CHANGE_LOG_ATTEMPTS tries raises OSError.
+        """
+        if self.replica_router is not None:
+            self.replica_router.note_write()
+        if (entity == 'transactions' and self.change_log is None
+                and self.range_index is not None and self.range_index.is_built):
+            # With a change log the index replays this record from it (see _built_range_index)
+            if op == 'create':
+                self.range_index.add(data or {})
+            elif op == 'archive':
+                self.range_index.remove(key)
+        if self.change_log is None:
+            return
+        # Money is an int of minor units: log the amount itself, as in decimal mode
+        data = {k: str(v) if isinstance(v, Money) else v
+                for k, v in (data or {}).items() if k not in ('PasswordHash', 'CVV')}
+        for attempt in range(CHANGE_LOG_ATTEMPTS):
+            try:
+                self.change_log.append(op, entity, key, data)
+                return
+            except OSError as e:
+                error = e
+                if attempt + 1 < CHANGE_LOG_ATTEMPTS:
+                    time.sleep(0.05 * (attempt + 1))
+        # The derived indexes replay the log and would never see this change: rebuild them
+        # from the database on their next use, and tell the caller the record is missing
+        for index in (self.range_index, self.user_search_index):
+            if index is not None:
+                index.is_built = False
+        raise OSError(f"{entity} {key} was saved but its change record could not be written: {error}") from error
+
+    def _new_id(self, prefix: str) -> str:
+        """ID for a new record: from the id_allocator if there is one, random otherwise"""
+        if self.id_allocator is not None:
+            return self.id_allocator.next_id(prefix)
+        return _random_id(prefix)
+
+    def _needs_id_check(self, data: Dict, field: str) -> bool:
+        """Whether a new record's ID may already exist (caller-supplied or random)"""
+        return field in data or self.id_allocator is None
+
+    # ==============================================
+    # Database layout (one database or one per entity)
+    # ==============================================
+
+    @staticmethod
+    def _entity_paths_predicate(entity: str) -> str:
+        """XQuery predicate on a database path: the entity's document(s), partitions and snapshots included"""
+        document = ENTITY_DOCUMENTS[entity][0]
+        prefixes = {'transactions': ['transactions/'], 'accounts': ['snapshots/']}.get(entity, [])
+        return " or ".join([f'. = "{document}"'] + [f'starts-with(., "{prefix}")' for prefix in prefixes])
+
+    def split_databases(self, dry_run: bool = False) -> Dict[str, int]:
+        """Move each entity's documents from db_name into the database the layout gives it.
+
+        Target databases are created as needed; documents are added there and deleted from
+        db_name in the same updating query, one entity at a time. Raises ValueError if a
+        target already holds a document of the same path. Returns the number of documents
+        moved per entity.
+        """
+        moves = {entity: target for entity, target in self.databases.items() if target != self.db_name}
+        counts = {}
+        for entity, target in moves.items():
+            query = f'''
+            for $p in db:list("{self.db_name}")[{self._entity_paths_predicate(entity)}]
+            return (if (db:exists("{target}", $p)) then "!" else "") || $p
+            '''
+            paths = self._execute_query(query).split()
+            conflicts = [path[1:] for path in paths if path.startswith("!")]
+            if conflicts:
+                raise ValueError(f"Cannot move {entity}: database {target} already holds {', '.join(conflicts)}.")
+            counts[entity] = len(paths)
+        if dry_run:
+            return counts
+
+        for entity, target in moves.items():
+            if not counts[entity]:
+                continue
+            self._execute_query(f'''
+            let $paths := db:list("{self.db_name}")[{self._entity_paths_predicate(entity)}]
+            return (
+              if (db:exists("{target}"))
+              then for $p in $paths return db:add("{target}", doc("{self.db_name}/" || $p), $p)
+              else db:create("{target}", $paths ! doc("{self.db_name}/" || .), $paths),
+              for $p in $paths return db:delete("{self.db_name}", $p)
+            )
+            ''', write=True)
+        return counts
+
+    # ==============================================
+    # Transaction storage layout (single document or monthly partitions)
+    # ==============================================
+
+    def _uses_transaction_partitions(self) -> bool:
+        """Whether transactions live in monthly partition documents (detected once if not configured)"""
+        if self.partition_transactions is None:
+            query = f'''
+            empty(db:list("{self.transactions_db}", "transactions.xml")) and exists(db:list("{self.transactions_db}", "transactions/"))
+            '''
+            self.partition_transactions = self._execute_query(query).strip() == "true"
+        return self.partition_transactions
+
+    @staticmethod
+    def _transaction_partition_path(date_str: str) -> str:
+        """Database path of the monthly partition holding a transaction dated date_str (ISO format)"""
+        return f"transactions/{date_str[:7]}.xml"
+
+    def _transaction_nodes(self, start_date: Optional[str] = None, end_date: Optional[str] = None) -> str:
+        """XQuery expression selecting Transaction elements.
+
+        With partitioned storage only the partitions overlapping [start_date, end_date] are
+        opened; the partition filter looks at document paths only, not their content.
+        """
+        if not self._uses_transaction_partitions():
+            return f'doc("{self.transactions_db}/transactions.xml")/Transactions/Transaction'
+        bounds = []
+        if start_date:
+            bounds.append(f'db:path(.) >= "{self._transaction_partition_path(start_date)}"')
+        if end_date:
+            bounds.append(f'db:path(.) <= "{self._transaction_partition_path(end_date)}"')
+        partition_filter = f'[{" and ".join(bounds)}]' if bounds else ''
+        return f'collection("{self.transactions_db}/transactions/"){partition_filter}/Transactions/Transaction'
+
+    def _insert_transaction_query(self, transaction_xml: str, date_str: str) -> str:
+        """Updating XQuery adding transaction nodes, creating the monthly partition if needed"""
+        if not self._uses_transaction_partitions():
+            return f'''
+            insert nodes {transaction_xml}
+            into doc("{self.transactions_db}/transactions.xml")/Transactions
+            '''
+        partition = self._transaction_partition_path(date_str)
+        return f'''
+            let $partition := collection("{self.transactions_db}/{partition}")
+            return if (exists($partition))
+                   then insert nodes {transaction_xml} into $partition/Transactions
+                   else db:add("{self.transactions_db}", <Transactions>{{ {transaction_xml} }}</Transactions>, "{partition}")
+            '''
+
+    @staticmethod
+    def _balance_deltas(transactions: List[Dict], sign: int = 1) -> Dict[str, Decimal]:
+        """Net Balance change per account caused by the completed transactions among these"""
+        deltas: Dict[str, Decimal] = {}
+        for t in transactions:
+            if t.get('Status') != 'completed':
+                continue
+            amount = Decimal(str(t['Amount'])) * sign
+            deltas[t['FromAccountID']] = deltas.get(t['FromAccountID'], Decimal(0)) - amount
+            deltas[t['ToAccountID']] = deltas.get(t['ToAccountID'], Decimal(0)) + amount
+        return {account: delta for account, delta in deltas.items() if delta}
+
+    def _balance_update_query(self, deltas: Dict[str, Decimal]) -> str:
+        """Updating XQuery adding each delta to its account's Balance (one update per account)"""
+        return ",\n".join(f'''
+            for $a in doc("{self.accounts_db}/accounts.xml")/Accounts/Account[AccountID = "{account}"]
+            return replace value of node $a/Balance with xs:decimal($a/Balance) + xs:decimal("{delta}")'''
+            for account, delta in deltas.items())
+
+    def _record_balance_changes(self, deltas: Dict[str, Decimal]) -> None:
+        for account, delta in deltas.items():
+            self._record_change('update', 'accounts', account, {'BalanceDelta': str(delta)})
+
+    def migrate_transactions_to_partitions(self, dry_run: bool = False) -> Dict[str, int]:
+        """Split transactions.xml into monthly partition documents and remove it.
+
+        Returns the number of transactions per partition month. Running it again after new
+        transactions were written to transactions.xml merges them into existing partitions.
+        """
+        counts_query = f'''
+        if (doc-available("{self.transactions_db}/transactions.xml")) then
+            for $t in doc("{self.transactions_db}/transactions.xml")/Transactions/Transaction
+            group by $month := substring($t/Date, 1, 7)
+            order by $month
+            return $month || ":" || count($t)
+        else ()
+        '''
+        counts = {}
+        for item in self._execute_query(counts_query).split():
+            month, count = item.split(":")
+            counts[month] = int(count)
+        if dry_run or not counts:
+            return counts
+
+        migrate_query = f'''
+        (
+          for $t in doc("{self.transactions_db}/transactions.xml")/Transactions/Transaction
+          group by $month := substring($t/Date, 1, 7)
+          let $path := "transactions/" || $month || ".xml"
+          let $partition := collection("{self.transactions_db}/" || $path)
+          return if (exists($partition))
+                 then insert nodes $t into $partition/Transactions
+                 else db:add("{self.transactions_db}", <Transactions>{{ $t }}</Transactions>, $path),
+          db:delete("{self.transactions_db}", "transactions.xml")
+        )
+        '''
+        self._execute_query(migrate_query, write=True)
+        self.partition_transactions = True
+        return counts
+
+    def archive_transactions(self, cutoff_date: str, dry_run: bool = False) -> Dict[str, int]:
+        """Move transactions dated before cutoff_date from the database into the archive.
+
+        Works one month at a time: the month's aged transactions are appended to the archive
+        first and only then deleted by TransactionID, so nothing is lost if a run is interrupted.
+        Returns the number of archived transactions per month.
+        """
+        try:
+            cutoff = datetime.fromisoformat(cutoff_date.replace('Z', '+00:00')).strftime('%Y-%m-%dT%H:%M:%S')
+        except ValueError:
+            raise ValueError(f"Invalid cutoff_date '{cutoff_date}'. Expected ISO 8601 format.")
+
+        counts_query = f'''
+        for $t in {self._transaction_nodes(None, cutoff)}
+        where xs:dateTime($t/Date) < xs:dateTime("{cutoff}")
+        group by $month := substring($t/Date, 1, 7)
+        order by $month
+        return $month || ":" || count($t)
+        '''
+        counts = {}
+        for item in self._execute_query(counts_query).split():
+            month, count = item.split(":")
+            counts[month] = int(count)
+        if dry_run:
+            return counts
+
+        for month in counts:
+            month_end = f"{month}-31T23:59:59"
+            aged_query = f'''
+            for $t in {self._transaction_nodes(month, month_end)}
+            where substring($t/Date, 1, 7) = "{month}" and xs:dateTime($t/Date) < xs:dateTime("{cutoff}")
+            return $t
+            '''
+            result = self._execute_query(aged_query)
+            if not result.strip():
+                continue
+            transactions = ET.fromstring(f"<Transactions>{result}</Transactions>").findall("Transaction")
+            counts[month] = self.transaction_archive.append(month, transactions)
+
+            ids = ", ".join(f'"{t.findtext("TransactionID")}"' for t in transactions)
+            self._execute_query(f'''
+            delete nodes {self._transaction_nodes(month, month_end)}[TransactionID = ({ids})]
+            ''', write=True)
+            for t in transactions:
+                self._record_change('archive', 'transactions', t.findtext("TransactionID"))
+
+        if counts and self._uses_transaction_partitions():
+            # Drop partitions left without any transaction
+            self._execute_query(f'''
+            for $d in collection("{self.transactions_db}/transactions/")[not(Transactions/Transaction)]
+            return db:delete("{self.transactions_db}", db:path($d))
+            ''', write=True)
+        return counts
+
+    # ==============================================
+    # Balance snapshots (point-in-time balances)
+    # ==============================================
+
+    @staticmethod
+    def _normalize_timestamp(value: str, end_of_day: bool = True) -> str:
+        """ISO date or datetime -> 'YYYY-MM-DDTHH:MM:SS' (a plain date means the end of that day)"""
+        if len(value) == 10 and end_of_day:
+            value += "T23:59:59"
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).strftime('%Y-%m-%dT%H:%M:%S')
+
+    def _archived_flows(self, after: str, up_to: str, account_id: Optional[str] = None) -> Dict[str, Decimal]:
+        """AccountID -> net settled inflow in (after, up_to] of the archived transactions
+        (only account_id's, when given)"""
+        if account_id is not None:
+            months = self.transaction_archive.months_for_account(account_id, after, up_to)
+        else:
+            months = [m for m in sorted(self.transaction_archive.months()) if after[:7] <= m <= up_to[:7]]
+        net: Dict[str, Decimal] = {}
+        seen = set()
+        for month in months:
+            for t in self.transaction_archive.iter_month(month):
+                tx_id = t.findtext("TransactionID")
+                date = (t.findtext("Date") or "")[:19]
+                if tx_id in seen or t.findtext("Status") != "completed" or not after < date <= up_to:
+                    continue
+                seen.add(tx_id)
+                amount = Decimal(t.findtext("Amount"))
+                for tag, signed in (("FromAccountID", -amount), ("ToAccountID", amount)):
+                    account = t.findtext(tag)
+                    if account_id is None or account == account_id:
+                        net[account] = net.get(account, Decimal(0)) + signed
+        return net
+
+    def _settled_flows_query(self, after: str, up_to: str, account_id: Optional[str] = None) -> str:
+        """XQuery prolog binding $net: AccountID -> net settled inflow in (after, up_to], archived
+        transactions included"""
+        archived = ", ".join(f'"{account}": xs:decimal("{amount}")'
+                             for account, amount in self._archived_flows(after, up_to, account_id).items())
+        return f'''
+        let $tx := {self._transaction_nodes(after, up_to)}[Status = "completed" and Date > "{after}" and Date <= "{up_to}"]
+        let $in := map:merge(for $t in $tx group by $k := string($t/ToAccountID)
+                             return map {{ $k: sum($t/Amount ! xs:decimal(.)) }})
+        let $out := map:merge(for $t in $tx group by $k := string($t/FromAccountID)
+                              return map {{ $k: sum($t/Amount ! xs:decimal(.)) }})
+        let $archived := map {{ {archived} }}
+        let $net := function($id) {{ ($in($id), 0)[1] - ($out($id), 0)[1] + ($archived($id), 0)[1] }}'''
+
+    def _require_maintained_balances(self) -> None:
+        """Past balances are derived from the current Balance, which only follows the ledger
+        when it is maintained"""
+        if not self.maintain_balances:
+            raise ValueError("Past balances need maintain_balances=True: without it the stored "
+                             "Balance does not follow the ledger.")
+
+    def create_balance_snapshot(self, at: Optional[str] = None) -> str:
+        """Store every account's balance as of `at` (default: now) in snapshots/balances-<at>.xml.
+
+        A snapshot in the past is derived from the current balances minus the settled flows
+        since then (archived ones included), in a single server-side query, so it needs
+        maintain_balances. Meant to run periodically (e.g. month end). Returns the timestamp
+        of the snapshot.
+        """
+        self._require_maintained_balances()
+        now = datetime.now().strftime('%Y-%m-%dT%H:%M:%S')
+        at = self._normalize_timestamp(at) if at else now
+        if at > now:
+            raise ValueError("Cannot snapshot balances in the future.")
+        path = f"snapshots/balances-{at.replace('-', '').replace(':', '')}.xml"
+        query = f'''
+        {self._settled_flows_query(at, now)}
+        return db:add("{self.accounts_db}", <BalanceSnapshot at="{at}">{{
+            for $a in doc("{self.accounts_db}/accounts.xml")/Accounts/Account
+            let $id := string($a/AccountID)
+            return <Account id="{{$id}}" currency="{{$a/Currency}}"
+                            balance="{{xs:decimal($a/Balance) - $net($id)}}"/>
+        }}</BalanceSnapshot>, "{path}")
+        '''
+        self._execute_query(query, write=True)
+        self._record_change('create', 'balance_snapshots', at, {'path': path})
+        return at
+
+    def list_balance_snapshots(self) -> List[str]:
+        """Timestamps of the stored balance snapshots, oldest first"""
+        query = f'''
+        string-join(sort(db:list("{self.accounts_db}", "snapshots/")[starts-with(., "snapshots/balances-")]), " ")
+        '''
+        snapshots = []
+        for path in self._execute_query(query).split():
+            stamp = path[len("snapshots/balances-"):-len(".xml")]
+            snapshots.append(datetime.strptime(stamp, '%Y%m%dT%H%M%S').strftime('%Y-%m-%dT%H:%M:%S'))
+        return snapshots
+
+    def _balance_starting_point(self, account_id: str, at: str, now: str) -> Tuple[str, str]:
+        """(timestamp, XQuery of account_id's balance then) for the snapshot nearest to `at`,
+        or for the current Balance when that is nearer"""
+        target = datetime.fromisoformat(at)
+        candidates = self.list_balance_snapshots() + [now]
+        base = min(candidates, key=lambda stamp: abs((datetime.fromisoformat(stamp) - target).total_seconds()))
+        if base == now:
+            return base, f'doc("{self.accounts_db}/accounts.xml")/Accounts/Account[AccountID = "{account_id}"]/Balance'
+        path = f"snapshots/balances-{base.replace('-', '').replace(':', '')}.xml"
+        return base, f'doc("{self.accounts_db}/{path}")/BalanceSnapshot/Account[@id = "{account_id}"]/@balance'
+
+    def get_balance_at(self, account_id: str, at: str) -> Optional[Decimal]:
+        """Balance of an account at a point in time (a plain date means the end of that day).
+
+        Starts from the nearest snapshot, before or after `at`, or from the current Balance
+        when that is nearer, and applies only the settled transactions in between (archived
+        ones included). Needs maintain_balances, since both starting points assume balances
+        move with the ledger. Returns None for an unknown account.
+        """
+        self._require_maintained_balances()
+        at = self._normalize_timestamp(at)
+        now = datetime.now().strftime('%Y-%m-%dT%H:%M:%S')
+        base, balance = self._balance_starting_point(account_id, at, now)
+        after, up_to, sign = (base, at, '+') if base <= at else (at, base, '-')
+        query = f'''
+        {self._settled_flows_query(after, up_to, account_id)}
+        for $b in {balance}
+        return xs:decimal($b) {sign} $net("{account_id}")
+        '''
+        result = self._execute_query(query).strip()
+        return Decimal(result) if result else None
+
+    # ==============================================
+    # Bulk row access (exports, analytics, batch jobs)
+    # ==============================================
+
+    def _entity_sources(self, entity: str) -> List[Tuple[str, str]]:
+        """(document path, XQuery node expression) for every document holding an entity's items.
+
+        New items are appended at the end of a document, but archive_transactions deletes
+        old ones, so a position within a source is only stable between writes; resume by ID.
+        """
+        if entity not in ENTITY_DOCUMENTS:
+            raise ValueError(f"Unknown entity: {entity}")
+        document, root_tag, item_tag = ENTITY_DOCUMENTS[entity]
+        if entity == 'transactions' and self._uses_transaction_partitions():
+            paths = self._execute_query(f'string-join(db:list("{self.transactions_db}", "transactions/"), " ")').split()
+            return [(path, f'doc("{self.transactions_db}/{path}")/{root_tag}/{item_tag}') for path in sorted(paths)]
+        return [(document, f'doc("{self.databases[entity]}/{document}")/{root_tag}/{item_tag}')]
+
+    def iter_rows(self, nodes: str, fields: List[str], start: int = 0, chunk_size: int = 10000):
+        """Stream the given child fields of a node sequence as lists of string rows.
+
+        nodes is an XQuery expression (e.g. from _entity_sources); fields are relative paths
+        such as 'Amount' or 'Address/City'. Rows are fetched chunk_size at a time as tab
+        separated text, which is far cheaper to transfer and split than XML, so memory stays
+        bounded by one chunk. Missing fields come back as empty strings.
+        """
+        columns = ", ".join(f'translate(string($x/{field}), "&#9;&#10;&#13;", "   ")' for field in fields)
+        position = start
+        while True:
+            query = f'''
+            string-join(
+                for $x in subsequence({nodes}, {position + 1}, {chunk_size})
+                return string-join(({columns}), "&#9;"),
+                "&#10;")
+            '''
+            result = self._execute_query(query)
+            if not result:
+                return
+            rows = [line.split("\t") for line in result.split("\n")]
+            yield rows
+            if len(rows) < chunk_size:
+                return
+            position += len(rows)
+
     def _parse_xml_string(self, xml_string: str, root_tag: str, item_tag: str) -> List[Dict]:
         """Parses an XML string potentially containing multiple items."""
         if not xml_string or not xml_string.strip():
@@ -98,14 +714,10 @@ class BankingXMLQueries:
     
     def _validate_xml_against_xsd(self, xml_str: str, xsd_path: str) -> tuple[bool, str]:
         """Validates an XML string against an XSD schema. Returns (bool, error_message_or_empty_string)."""
+        from lxml import etree
         try:
             xml_doc = etree.fromstring(xml_str.encode('utf-8')) # Ensure UTF-8 encoding
-            with open(xsd_path, 'rb') as f:
-                xsd_doc_content = f.read()
-            if not xsd_doc_content:
-                return False, f"XSD file is empty: {xsd_path}"
-            xsd_doc = etree.XML(xsd_doc_content)
-            schema = etree.XMLSchema(xsd_doc)
+            schema = load_schema(xsd_path) # Compiled once per thread, not on every call
             is_valid = schema.validate(xml_doc)
             if not is_valid:
                 error_log = schema.error_log
@@ -122,6 +734,22 @@ class BankingXMLQueries:
             return False, f"XSD file not found: {xsd_path}"
         except Exception as e:
             return False, f"Generic XSD Validation Error: {e}"
+
+    def validate_records(self, entity: str, records: Iterable[str], workers: Optional[int] = None,
+                         chunk_size: int = 2000) -> List[Tuple[int, str]]:
+        """Validate serialized item elements (e.g. '<Account>...</Account>') against the entity's XSD in bulk.
+
+        Records are packed chunk_size at a time into one document and validated by worker
+        processes (see Banking_validation.BatchValidator). Returns (row index, message) for
+        every invalid record; throughput is in self.last_validation_stats.
+        """
+        if entity not in ENTITY_DOCUMENTS:
+            raise ValueError(f"Unknown entity '{entity}'. Choose one of {', '.join(ENTITY_DOCUMENTS)}.")
+        validator = BatchValidator(os.path.join(self.main_dir, f"{entity}.xsd"), ENTITY_DOCUMENTS[entity][1],
+                                   workers=workers, chunk_size=chunk_size)
+        errors = validator.validate(records)
+        self.last_validation_stats = validator.last_stats
+        return errors
         
     def validate_user_data(self, user_data: Dict) -> Optional[str]:
         required = ['FullName', 'Email', 'Phone', 'Address', 'Role', 'Username', 'PasswordHash']
@@ -139,7 +767,7 @@ class BankingXMLQueries:
             if not isinstance(val, str) or not val.strip():
                 return f"Error: {k} must be a non-empty string"
             # Country and City should only contain letters and spaces
-            if not re.match(r"^[A-Za-z\s]+$", val.strip()):
+            if not _PLACE_NAME.match(val.strip()):
                 return f"Error: {k} must only contain letters and spaces"
 
         # Street can contain digits and letters
@@ -156,14 +784,14 @@ class BankingXMLQueries:
 
         # Email validation
         email = user_data['Email']
-        if not isinstance(email, str) or not re.match(r"[^@]+@[^@]+\.[^@]+", email):
+        if not isinstance(email, str) or not _EMAIL.match(email):
             return "Error: Invalid email format"
 
         # Phone validation
         phone = user_data['Phone']
         if not isinstance(phone, str):
             phone = str(phone)
-        if not re.match(r"^\+?\d{7,15}$", phone):
+        if not _PHONE.match(phone):
             return "Error: Invalid phone number format"
 
         # Role validation
@@ -192,7 +820,7 @@ class BankingXMLQueries:
         if validation_error:
             return validation_error
         
-        user_id = user_data.get("UserID", f"USER-{uuid.uuid4().hex[:8].upper()}")
+        user_id = user_data["UserID"] if "UserID" in user_data else self._new_id("USER")
         full_name = user_data["FullName"]
         email = user_data["Email"]
         phone = user_data["Phone"]
@@ -233,27 +861,31 @@ class BankingXMLQueries:
             session.execute(f"OPEN {self.db_name}")
 
             # Check for existing UserID
-            user_id_query = f'XQUERY exists(doc("{self.db_name}/users.xml")//User[UserID="{user_id}"])'
-            if session.execute(user_id_query).strip() == "true":
+            user_id_query = f'XQUERY exists(doc("{self.users_db}/users.xml")//User[UserID="{user_id}"])'
+            if self._needs_id_check(user_data, "UserID") and session.execute(user_id_query).strip() == "true":
                 return f"Cannot create user: User ID {user_id} already exists"
 
             # Check for existing Email
-            email_query = f'XQUERY exists(doc("{self.db_name}/users.xml")//User[Email="{email}"])'
+            email_query = f'XQUERY exists(doc("{self.users_db}/users.xml")//User[Email="{email}"])'
             if session.execute(email_query).strip() == "true":
                 return f"Cannot create user: Email {email} already exists"
 
             # Check for existing Username
-            username_query = f'XQUERY exists(doc("{self.db_name}/users.xml")//User[Username="{username}"])'
+            username_query = f'XQUERY exists(doc("{self.users_db}/users.xml")//User[Username="{username}"])'
             if session.execute(username_query).strip() == "true":
                 return f"Cannot create user: Username {username} already exists"
 
             # Insert new user
+            from lxml import etree
             insert_node = etree.tostring(etree.fromstring(user_xml)).decode()
             insert_query = f'''
             XQUERY insert node {insert_node}
-            into doc("{self.db_name}/users.xml")/Users
+            into doc("{self.users_db}/users.xml")/Users
             '''
             session.execute(insert_query)
+            if self.change_log is None and self.user_search_index is not None and self.user_search_index.is_built:
+                self.user_search_index.add(self._element_to_dict(ET.fromstring(user_xml)))
+            self._record_change('create', 'users', user_id, self._element_to_dict(ET.fromstring(user_xml)))
             return f"User {user_id} created successfully."
 
         except Exception as e:
@@ -317,14 +949,14 @@ class BankingXMLQueries:
             session.execute(f"OPEN {self.db_name}")
 
             # Step 1: Check if the user to update exists
-            user_exists_query = f'XQUERY exists(doc("{self.db_name}/users.xml")//User[UserID="{user_id}"])'
+            user_exists_query = f'XQUERY exists(doc("{self.users_db}/users.xml")//User[UserID="{user_id}"])'
             if session.execute(user_exists_query).strip() != "true":
                 return f"User with ID {user_id} not found."
 
             # Step 2: Check if the new email already exists for another user
             if new_email: # Only check if email is being changed/provided
                 email_conflict_query = f'''
-                XQUERY exists(doc("{self.db_name}/users.xml")//User[Email="{new_email}" and UserID!="{user_id}"])
+                XQUERY exists(doc("{self.users_db}/users.xml")//User[Email="{new_email}" and UserID!="{user_id}"])
                 '''
                 if session.execute(email_conflict_query).strip() == "true":
                     return f"Email '{new_email}' already exists for another user. Please choose a different email."
@@ -332,7 +964,7 @@ class BankingXMLQueries:
             # Step 3: Check if the new username already exists for another user (if username can be updated)
             if new_username: 
                 username_conflict_query = f'''
-                XQUERY exists(doc("{self.db_name}/users.xml")//User[Username="{new_username}" and UserID!="{user_id}"])
+                XQUERY exists(doc("{self.users_db}/users.xml")//User[Username="{new_username}" and UserID!="{user_id}"])
                 '''
                 if session.execute(username_conflict_query).strip() == "true":
                     return f"Username '{new_username}' already exists for another user. Please choose a different username."
@@ -340,10 +972,13 @@ class BankingXMLQueries:
 
             # Step 4: Replace the user node
             replace_query = f'''
-            XQUERY replace node doc("{self.db_name}/users.xml")//User[UserID="{user_id}"]
+            XQUERY replace node doc("{self.users_db}/users.xml")//User[UserID="{user_id}"]
             with {updated_user_xml_node}
             '''
             session.execute(replace_query)
+            if self.change_log is None and self.user_search_index is not None and self.user_search_index.is_built:
+                self.user_search_index.add(self._element_to_dict(ET.fromstring(updated_user_xml_node)))
+            self._record_change('update', 'users', user_id, self._element_to_dict(ET.fromstring(updated_user_xml_node)))
             return "User updated successfully."
 
         except Exception as e:
@@ -376,7 +1011,7 @@ class BankingXMLQueries:
 
         # Validate Balance
         try:
-            Decimal(account_data['Balance'])
+            Decimal(str(account_data['Balance']))
         except Exception:
             return "Error: Invalid Balance format. Expected a numeric value."
 
@@ -402,11 +1037,11 @@ class BankingXMLQueries:
         if validation_error:
             return validation_error
         
-        account_id = account_data.get('AccountID', f"ACC-{uuid.uuid4().hex[:8].upper()}")
+        account_id = account_data['AccountID'] if 'AccountID' in account_data else self._new_id("ACC")
         user_id = account_data['UserID']
         account_type = account_data['AccountType']
         try:
-            balance = str(Decimal(account_data['Balance']))
+            balance = str(Decimal(str(account_data['Balance'])))
         except Exception:
             return "Error: Invalid Balance format. Expected a number."
         currency = account_data['Currency']
@@ -443,21 +1078,22 @@ class BankingXMLQueries:
             session.execute(f"OPEN {self.db_name}")
 
             # Step 1: Check if UserID exists
-            user_exists_query = f'XQUERY exists(doc("{self.db_name}/users.xml")//User[UserID="{user_id}"])'
+            user_exists_query = f'XQUERY exists(doc("{self.users_db}/users.xml")//User[UserID="{user_id}"])'
             if session.execute(user_exists_query).strip() != "true":
                 return f"Cannot create account: User {user_id} not found."
 
             # Step 2: Check if AccountID already exists
-            account_id_exists_query = f'XQUERY exists(doc("{self.db_name}/accounts.xml")//Account[AccountID="{account_id}"])'
-            if session.execute(account_id_exists_query).strip() == "true":
+            account_id_exists_query = f'XQUERY exists(doc("{self.accounts_db}/accounts.xml")//Account[AccountID="{account_id}"])'
+            if self._needs_id_check(account_data, "AccountID") and session.execute(account_id_exists_query).strip() == "true":
                 return f"Cannot create account: Account ID {account_id} already exists."
 
             # Step 3: Insert new account
             insert_query = f'''
             XQUERY insert node {single_account_xml}
-            into doc("{self.db_name}/accounts.xml")/Accounts
+            into doc("{self.accounts_db}/accounts.xml")/Accounts
             '''
             session.execute(insert_query)
+            self._record_change('create', 'accounts', account_id, self._element_to_dict(ET.fromstring(single_account_xml)))
             return f"Account {account_id} created successfully."
 
         except Exception as e:
@@ -482,17 +1118,18 @@ class BankingXMLQueries:
             session.execute(f"OPEN {self.db_name}")
 
             # Step 1: Check if the account exists
-            account_exists_query = f'XQUERY exists(doc("{self.db_name}/accounts.xml")//Account[AccountID="{account_id}"])'
+            account_exists_query = f'XQUERY exists(doc("{self.accounts_db}/accounts.xml")//Account[AccountID="{account_id}"])'
             if session.execute(account_exists_query).strip() != "true":
                 return f"Account with ID {account_id} does not exist."
 
             # Step 2: Update the balance
             update_balance_query = f'''
-            XQUERY replace value of node doc("{self.db_name}/accounts.xml")//Account[AccountID="{account_id}"]/Balance
+            XQUERY replace value of node doc("{self.accounts_db}/accounts.xml")//Account[AccountID="{account_id}"]/Balance
             with xs:decimal("{amount_str}")
             '''
             session.execute(update_balance_query)
             # BaseX 'replace value of node' typically returns empty on success.
+            self._record_change('update', 'accounts', account_id, {'Balance': amount_str})
             return f"Balance for account {account_id} updated successfully to {amount_str}."
 
         except Exception as e:
@@ -507,14 +1144,14 @@ class BankingXMLQueries:
     def close_account(self, account_id: str) -> str:
         check_query = f'''
         declare variable $accountID as xs:string := "{account_id}";
-        let $statusNode := doc("{self.db_name}/accounts.xml")/Accounts/Account[AccountID = $accountID]/Status
+        let $statusNode := doc("{self.accounts_db}/accounts.xml")/Accounts/Account[AccountID = $accountID]/Status
         return exists($statusNode)
         '''
 
         update_query = f'''
         declare variable $accountID as xs:string := "{account_id}";
         replace value of node 
-            doc("{self.db_name}/accounts.xml")/Accounts/Account[AccountID = $accountID]/Status 
+            doc("{self.accounts_db}/accounts.xml")/Accounts/Account[AccountID = $accountID]/Status 
         with "closed"
         '''
 
@@ -527,6 +1164,7 @@ class BankingXMLQueries:
             if exists_result.strip() == 'true':
                 # Step 2: Perform update
                 session.execute(f'XQUERY {update_query}')
+                self._record_change('update', 'accounts', account_id, {'Status': 'closed'})
                 return f"Account {account_id} has been successfully closed."
             else:
                 return f"Account with ID {account_id} does not exist."
@@ -553,7 +1191,7 @@ class BankingXMLQueries:
 
         # Validate Amount
         try:
-            Decimal(transaction_data['Amount'])
+            Decimal(str(transaction_data['Amount']))
         except Exception:
             return "Error: Invalid Amount format. Expected a numeric value."
 
@@ -570,25 +1208,30 @@ class BankingXMLQueries:
 
 
 
-    def create_transaction(self, transaction_data: Dict) -> str:
-    #    validate transaction data
+    def _prepare_transaction(self, transaction_data: Dict) -> Tuple[Optional[Dict], Optional[str]]:
+        """Validate transaction data and build its XML node (no database access).
+
+        Returns (prepared, None) with TransactionID, FromAccountID, ToAccountID, Date and xml,
+        or (None, error_message).
+        """
+        # validate transaction data
         validation_error = self.validate_transaction_data(transaction_data)
         if validation_error:
-            return validation_error
+            return None, validation_error
         # validate that from and to account are not the same
         if transaction_data['FromAccountID'] == transaction_data['ToAccountID']:
-            return "Error: FromAccountID and ToAccountID cannot be the same."
+            return None, "Error: FromAccountID and ToAccountID cannot be the same."
         
 
-        transaction_id = transaction_data.get('TransactionID', f"TX-{uuid.uuid4().hex[:8].upper()}")
+        transaction_id = transaction_data['TransactionID'] if 'TransactionID' in transaction_data else self._new_id("TX")
         from_acc = transaction_data['FromAccountID']
         to_acc = transaction_data['ToAccountID']
         try:
-            amount = str(Decimal(transaction_data['Amount']))
+            amount = str(Decimal(str(transaction_data['Amount'])))
             # round the decimal to 2 decimal places
             amount = str(Decimal(amount).quantize(Decimal('0.01')))  # Round to 2 decimal places
         except Exception:
-            return "Error: Invalid Amount format. Expected a number."
+            return None, "Error: Invalid Amount format. Expected a number."
       
         tx_type = transaction_data['Type']
         status = transaction_data.get('Status', 'completed')
@@ -599,7 +1242,7 @@ class BankingXMLQueries:
             parsed_datetime = datetime.fromisoformat(timestamp_str.replace("Z", "+00:00"))
             timestamp = parsed_datetime.strftime("%Y-%m-%dT%H:%M:%S")  # Format without microseconds
         except ValueError:
-            return "Error: Invalid Timestamp format. Expected ISO 8601 format."
+            return None, "Error: Invalid Timestamp format. Expected ISO 8601 format."
 
         transaction_xml = f'''
             <Transaction>
@@ -618,33 +1261,66 @@ class BankingXMLQueries:
         is_valid, validation_error_msg = self._validate_xml_against_xsd(
             transaction_xml_for_validation, self.transactions_xsd_path)
         if not is_valid:
-            return f"Validation failed: Transaction data does not conform to XSD. Details: {validation_error_msg}"
+            return None, f"Validation failed: Transaction data does not conform to XSD. Details: {validation_error_msg}"
+
+        return {
+            'TransactionID': transaction_id,
+            'FromAccountID': from_acc,
+            'ToAccountID': to_acc,
+            'Date': timestamp,
+            'Amount': amount,
+            'Status': status,
+            'xml': transaction_xml,
+        }, None
+
+
+    def create_transaction(self, transaction_data: Dict, idempotency_key: Optional[str] = None) -> str:
+        """Create a transaction; retries passing the same idempotency_key get the first result back
+        (needs an idempotency_store)"""
+        if idempotency_key is not None and self.idempotency_store is not None:
+            return run_create_transaction(self.idempotency_store, idempotency_key, transaction_data,
+                                          self._create_transaction)
+        return self._create_transaction(transaction_data)
+
+    def _create_transaction(self, transaction_data: Dict) -> str:
+        prepared, error = self._prepare_transaction(transaction_data)
+        if error:
+            return error
+        transaction_id = prepared['TransactionID']
+        from_acc = prepared['FromAccountID']
+        to_acc = prepared['ToAccountID']
+        timestamp = prepared['Date']
+        transaction_xml = prepared['xml']
 
         session = Session(self.db_host, self.db_port, self.db_user, self.db_pass)
         try:
             session.execute(f"OPEN {self.db_name}")
 
             # Query 1: Check if the transaction ID already exists
-            check_tx_id_query = f'XQUERY exists(doc("{self.db_name}/transactions.xml")//Transaction[TransactionID="{transaction_id}"])'
-            if session.execute(check_tx_id_query).strip() == "true":
+            check_tx_id_query = f'XQUERY exists({self._transaction_nodes()}[TransactionID="{transaction_id}"])'
+            if self._needs_id_check(transaction_data, "TransactionID") and session.execute(check_tx_id_query).strip() == "true":
                 return f"Cannot create transaction: Transaction ID {transaction_id} already exists"
 
             # Query 2: Check if the 'FromAccountID' exists
-            check_from_acc_query = f'XQUERY exists(doc("{self.db_name}/accounts.xml")//Account[AccountID="{from_acc}"])'
+            check_from_acc_query = f'XQUERY exists(doc("{self.accounts_db}/accounts.xml")//Account[AccountID="{from_acc}"])'
             if session.execute(check_from_acc_query).strip() != "true":
                 return f"Cannot create transaction: FromAccountID {from_acc} not found"
 
             # Query 3: Check if the 'ToAccountID' exists
-            check_to_acc_query = f'XQUERY exists(doc("{self.db_name}/accounts.xml")//Account[AccountID="{to_acc}"])'
+            check_to_acc_query = f'XQUERY exists(doc("{self.accounts_db}/accounts.xml")//Account[AccountID="{to_acc}"])'
             if session.execute(check_to_acc_query).strip() != "true":
                 return f"Cannot create transaction: ToAccountID {to_acc} not found"
 
-            # Query 4: Insert the new transaction
-            insert_query = f'''
-                XQUERY insert node {etree.tostring(etree.fromstring(transaction_xml)).decode()}
-                into doc("{self.db_name}/transactions.xml")/Transactions
-            '''
-            session.execute(insert_query)
+            # Query 4: Insert the new transaction (and move the balances, in the same update)
+            from lxml import etree
+            insert_node = etree.tostring(etree.fromstring(transaction_xml)).decode()
+            insert_query = self._insert_transaction_query(insert_node, timestamp)
+            deltas = self._balance_deltas([prepared]) if self.maintain_balances else {}
+            if deltas:
+                insert_query = f"({insert_query}), {self._balance_update_query(deltas)}"
+            session.execute(f'XQUERY {insert_query}')
+            self._record_change('create', 'transactions', transaction_id, self._element_to_dict(ET.fromstring(transaction_xml)))
+            self._record_balance_changes(deltas)
             return f"Transaction {transaction_id} created successfully."
 
         except Exception as e:
@@ -659,8 +1335,12 @@ class BankingXMLQueries:
 
 
     def update_transaction_status(self, transaction_id: str, new_status: str) -> str:
+        return self._update_transaction_status(transaction_id, new_status)[0]
+
+    def _update_transaction_status(self, transaction_id: str, new_status: str) -> Tuple[str, Dict[str, Decimal]]:
+        """update_transaction_status, plus the Balance deltas it applied (maintain_balances)"""
         if not new_status: # Basic validation for new_status
-            return "Error: New status cannot be empty."
+            return "Error: New status cannot be empty.", {}
         # Consider adding validation for allowed status values based on your XSD or business logic.
 
         session = None
@@ -668,22 +1348,40 @@ class BankingXMLQueries:
             session = Session(self.db_host, self.db_port, self.db_user, self.db_pass)
             session.execute(f"OPEN {self.db_name}")
 
-            # Step 1: Check if the transaction exists
-            transaction_exists_query = f'XQUERY exists(doc("{self.db_name}/transactions.xml")//Transaction[TransactionID="{transaction_id}"])'
-            if session.execute(transaction_exists_query).strip() != "true":
-                return f"Transaction with ID {transaction_id} does not exist."
-
-            # Step 2: Update the status
-            update_status_query = f'''
-            XQUERY replace value of node doc("{self.db_name}/transactions.xml")//Transaction[TransactionID="{transaction_id}"]/Status
-            with "{new_status}"
+            # One updating query reads the current status and writes the new one. Settling or
+            # un-settling a transaction moves the balances by a delta computed from that same
+            # read, so a concurrent status change cannot make both apply it.
+            accounts = f'doc("{self.accounts_db}/accounts.xml")/Accounts/Account'
+            move_balances = f''',
+                if ($move != 0 and $t/FromAccountID != $t/ToAccountID) then (
+                    for $a in {accounts}[AccountID = $t/FromAccountID]
+                    return replace value of node $a/Balance with xs:decimal($a/Balance) - $move,
+                    for $a in {accounts}[AccountID = $t/ToAccountID]
+                    return replace value of node $a/Balance with xs:decimal($a/Balance) + $move,
+                    update:output(string-join(("found", $t/FromAccountID, $t/ToAccountID, string($move)), "&#9;"))
+                ) else update:output("found")''' if self.maintain_balances else ', update:output("found")'
+            update_status = f'''
+            let $t := {self._transaction_nodes()}[TransactionID="{transaction_id}"][1]
+            let $move := ((if ("{new_status}" = "completed") then 1 else 0)
+                          - (if ($t/Status = "completed") then 1 else 0)) * xs:decimal(($t/Amount, 0)[1])
+            return if (empty($t)) then () else (
+                replace value of node $t/Status with "{new_status}"{move_balances}
+            )
             '''
-            session.execute(update_status_query)
-            return f"Transaction {transaction_id} status updated to {new_status}."
+            result = session.execute(f"XQUERY {update_status}").split("\t")
+            if result[0] != "found":
+                return f"Transaction with ID {transaction_id} does not exist.", {}
+            deltas = {}
+            if len(result) == 4:
+                from_acc, to_acc, move = result[1:]
+                deltas = {from_acc: -Decimal(move), to_acc: Decimal(move)}
+            self._record_change('update', 'transactions', transaction_id, {'Status': new_status})
+            self._record_balance_changes(deltas)
+            return f"Transaction {transaction_id} status updated to {new_status}.", deltas
 
         except Exception as e:
             print(f"Error updating transaction {transaction_id}: {e} (Type: {type(e).__name__})")
-            return f"An error occurred during transaction status update: {e}"
+            return f"An error occurred during transaction status update: {e}", {}
         finally:
             if session and hasattr(session, 'isconnected') and session.isconnected():
                 session.close()
@@ -699,16 +1397,16 @@ class BankingXMLQueries:
         if missing_fields:
             return f"Error: Missing required loan fields: {', '.join(missing_fields)}"
        
-        loan_id = loan_data.get('LoanID', f"LOAN-{uuid.uuid4().hex[:8].upper()}")
+        loan_id = loan_data['LoanID'] if 'LoanID' in loan_data else self._new_id("LOAN")
         user_id = loan_data['UserID']
 
         
 
         try:
-            amount = str(Decimal(loan_data['LoanAmount']))
+            amount = str(Decimal(str(loan_data['LoanAmount'])))
             # round the decimal to 2 decimal places
             amount = str(Decimal(amount).quantize(Decimal('0.01')))  # Round to 2 decimal places
-            interest_rate = str(Decimal(loan_data['InterestRate']).quantize(Decimal('0.01')))  # Round to 2 decimal places
+            interest_rate = str(Decimal(str(loan_data['InterestRate'])).quantize(Decimal('0.01')))  # Round to 2 decimal places
             # interest rate cant be zero or negative
             if float(interest_rate) <= 0:
                 return "Error: InterestRate must be a positive number."
@@ -753,21 +1451,22 @@ class BankingXMLQueries:
             session.execute(f"OPEN {self.db_name}")
 
             # Step 1: Check if UserID exists
-            user_exists_query = f'XQUERY exists(doc("{self.db_name}/users.xml")//User[UserID="{user_id}"])'
+            user_exists_query = f'XQUERY exists(doc("{self.users_db}/users.xml")//User[UserID="{user_id}"])'
             if session.execute(user_exists_query).strip() != "true":
                 return f"Cannot create loan: User {user_id} not found."
 
             # Step 2: Check if LoanID already exists
-            loan_id_exists_query = f'XQUERY exists(doc("{self.db_name}/loans.xml")//Loan[LoanID="{loan_id}"])'
-            if session.execute(loan_id_exists_query).strip() == "true":
+            loan_id_exists_query = f'XQUERY exists(doc("{self.loans_db}/loans.xml")//Loan[LoanID="{loan_id}"])'
+            if self._needs_id_check(loan_data, "LoanID") and session.execute(loan_id_exists_query).strip() == "true":
                 return f"Cannot create loan: Loan ID {loan_id} already exists."
 
             # Step 3: Insert new loan
             insert_query = f'''
             XQUERY insert node {single_loan_xml}
-            into doc("{self.db_name}/loans.xml")/Loans
+            into doc("{self.loans_db}/loans.xml")/Loans
             '''
             session.execute(insert_query)
+            self._record_change('create', 'loans', loan_id, self._element_to_dict(ET.fromstring(single_loan_xml)))
             return f"Loan {loan_id} created successfully."
 
         except Exception as e:
@@ -790,16 +1489,17 @@ class BankingXMLQueries:
             session.execute(f"OPEN {self.db_name}")
 
             # Step 1: Check if the loan exists
-            loan_exists_query = f'XQUERY exists(doc("{self.db_name}/loans.xml")//Loan[LoanID="{loan_id}"])'
+            loan_exists_query = f'XQUERY exists(doc("{self.loans_db}/loans.xml")//Loan[LoanID="{loan_id}"])'
             if session.execute(loan_exists_query).strip() != "true":
                 return f"Loan with ID {loan_id} does not exist."
 
             # Step 2: Update the status to APPROVED
             approve_loan_query = f'''
-            XQUERY replace value of node doc("{self.db_name}/loans.xml")//Loan[LoanID="{loan_id}"]/Status
+            XQUERY replace value of node doc("{self.loans_db}/loans.xml")//Loan[LoanID="{loan_id}"]/Status
             with "{new_status}"
             '''
             session.execute(approve_loan_query)
+            self._record_change('update', 'loans', loan_id, {'Status': new_status})
             return f"Loan {loan_id} has been successfully approved."
 
         except Exception as e:
@@ -851,7 +1551,7 @@ class BankingXMLQueries:
         if validation_error:
             return validation_error
 
-        card_id = card_data.get('CardID', f"CARD-{uuid.uuid4().hex[:8].upper()}")
+        card_id = card_data['CardID'] if 'CardID' in card_data else self._new_id("CARD")
         account_id = card_data['AccountID']
         card_type = card_data['CardType']
         card_number = card_data['CardNumber']
@@ -891,26 +1591,27 @@ class BankingXMLQueries:
             session.execute(f"OPEN {self.db_name}")
 
             # Step 1: Check if AccountID exists
-            account_exists_query = f'XQUERY exists(doc("{self.db_name}/accounts.xml")//Account[AccountID="{account_id}"])'
+            account_exists_query = f'XQUERY exists(doc("{self.accounts_db}/accounts.xml")//Account[AccountID="{account_id}"])'
             if session.execute(account_exists_query).strip() != "true":
                 return f"Cannot create card: Account {account_id} not found."
 
             # Step 2: Check if CardNumber already exists
-            card_number_exists_query = f'XQUERY exists(doc("{self.db_name}/cards.xml")//Card[CardNumber="{card_number}"])'
+            card_number_exists_query = f'XQUERY exists(doc("{self.cards_db}/cards.xml")//Card[CardNumber="{card_number}"])'
             if session.execute(card_number_exists_query).strip() == "true":
                 return f"Cannot create card: Card number {card_number} already exists."
 
             # Step 3: Check if CardID already exists
-            card_id_exists_query = f'XQUERY exists(doc("{self.db_name}/cards.xml")//Card[CardID="{card_id}"])'
-            if session.execute(card_id_exists_query).strip() == "true":
+            card_id_exists_query = f'XQUERY exists(doc("{self.cards_db}/cards.xml")//Card[CardID="{card_id}"])'
+            if self._needs_id_check(card_data, "CardID") and session.execute(card_id_exists_query).strip() == "true":
                 return f"Cannot create card: Card ID {card_id} already exists."
 
             # Step 4: Insert new card
             insert_query = f'''
             XQUERY insert node {single_card_xml}
-            into doc("{self.db_name}/cards.xml")/Cards
+            into doc("{self.cards_db}/cards.xml")/Cards
             '''
             session.execute(insert_query)
+            self._record_change('create', 'cards', card_id, self._element_to_dict(ET.fromstring(single_card_xml)))
             return f"Card {card_id} created successfully."
 
         except Exception as e:
@@ -927,13 +1628,13 @@ class BankingXMLQueries:
         
         check_existence_query = f'''
         declare variable $cardID as xs:string := "{card_id}";
-        if (exists(doc("{self.db_name}/cards.xml")//Card[CardID=$cardID])) then "exists"
+        if (exists(doc("{self.cards_db}/cards.xml")//Card[CardID=$cardID])) then "exists"
         else "not found"
         '''
         
         update_card_query = f'''
         declare variable $cardID as xs:string := "{card_id}";
-        replace value of node doc("{self.db_name}/cards.xml")//Card[CardID=$cardID]/Status with "blocked"
+        replace value of node doc("{self.cards_db}/cards.xml")//Card[CardID=$cardID]/Status with "blocked"
         '''
 
         session = Session(self.db_host, self.db_port, self.db_user, self.db_pass)
@@ -942,6 +1643,7 @@ class BankingXMLQueries:
             result = session.execute(f'XQUERY {check_existence_query}').strip()
             if result == "exists":
                 session.execute(f'XQUERY {update_card_query}')
+                self._record_change('update', 'cards', card_id, {'Status': 'blocked'})
                 return True
             elif result == "not found":
                 print(f"Card cancellation failed: Card {card_id} not found.")
@@ -974,12 +1676,12 @@ class BankingXMLQueries:
         position = employee_data['Position']
         branch_id = employee_data['BranchID']
         try:
-            salary = str(Decimal(employee_data['Salary']))
+            salary = str(Decimal(str(employee_data['Salary'])))
             # round the decimal to 2 decimal places
             salary = str(Decimal(salary).quantize(Decimal('0.01')))  # Round to 2 decimal places
         except Exception:
             return "Error: Invalid Salary format. Expected a number."
-        employee_id = employee_data.get('EmployeeID', f"EMP-{uuid.uuid4().hex[:8].upper()}")
+        employee_id = employee_data['EmployeeID'] if 'EmployeeID' in employee_data else self._new_id("EMP")
         try:
             hire_date_obj = datetime.strptime(employee_data.get('HireDate', datetime.now().strftime('%Y-%m-%d')).split('T')[0], '%Y-%m-%d')
             hire_date = hire_date_obj.strftime('%Y-%m-%d')
@@ -1011,17 +1713,17 @@ class BankingXMLQueries:
             session.execute(f"OPEN {self.db_name}")
 
             # Step 1: Check if UserID exists
-            user_exists_query = f'XQUERY exists(doc("{self.db_name}/users.xml")//User[UserID="{user_id}"])'
+            user_exists_query = f'XQUERY exists(doc("{self.users_db}/users.xml")//User[UserID="{user_id}"])'
             if session.execute(user_exists_query).strip() != "true":
                 return f"Cannot create employee: User {user_id} not found."
 
             # Step 2: Check if EmployeeID already exists
-            employee_id_exists_query = f'XQUERY exists(doc("{self.db_name}/employees.xml")//Employee[EmployeeID="{employee_id}"])'
-            if session.execute(employee_id_exists_query).strip() == "true":
+            employee_id_exists_query = f'XQUERY exists(doc("{self.employees_db}/employees.xml")//Employee[EmployeeID="{employee_id}"])'
+            if self._needs_id_check(employee_data, "EmployeeID") and session.execute(employee_id_exists_query).strip() == "true":
                 return f"Cannot create employee: Employee ID {employee_id} already exists."
 
             # Step 3: Check if BranchID exists (assuming branches.xml and self.branches_xsd_path exist)
-            branch_exists_query = f'XQUERY exists(doc("{self.db_name}/employees.xml")//Employee[BranchID="{branch_id}"])'
+            branch_exists_query = f'XQUERY exists(doc("{self.employees_db}/employees.xml")//Employee[BranchID="{branch_id}"])'
             if session.execute(branch_exists_query).strip() != "true":
                 # Ensure you have a self.branches_xsd_path and the branches.xml file for this.
                 # If branches are not managed in a separate XML, this check should be adapted or removed.
@@ -1030,9 +1732,10 @@ class BankingXMLQueries:
             # Step 4: Insert new employee
             insert_query = f'''
             XQUERY insert node {single_employee_xml}
-            into doc("{self.db_name}/employees.xml")/Employees
+            into doc("{self.employees_db}/employees.xml")/Employees
             '''
             session.execute(insert_query)
+            self._record_change('create', 'employees', employee_id, self._element_to_dict(ET.fromstring(single_employee_xml)))
             return f"Employee {employee_id} created successfully."
 
         except Exception as e:
@@ -1068,7 +1771,7 @@ class BankingXMLQueries:
             session.execute(f"OPEN {self.db_name}")
 
             # Step 1: Check if the employee exists
-            employee_exists_query = f'XQUERY exists(doc("{self.db_name}/employees.xml")//Employee[EmployeeID="{employee_id}"])'
+            employee_exists_query = f'XQUERY exists(doc("{self.employees_db}/employees.xml")//Employee[EmployeeID="{employee_id}"])'
             if session.execute(employee_exists_query).strip() != "true":
                 return f"Could not update: Employee {employee_id} not found."
 
@@ -1079,17 +1782,18 @@ class BankingXMLQueries:
             # However, BaseX is generally flexible with sequences of updating expressions.
             update_query = f'''
             XQUERY (
-                replace value of node doc("{self.db_name}/employees.xml")//Employee[EmployeeID="{employee_id}"]/Position with "{new_position}",
-                replace value of node doc("{self.db_name}/employees.xml")//Employee[EmployeeID="{employee_id}"]/Salary with xs:decimal("{salary_str}")
+                replace value of node doc("{self.employees_db}/employees.xml")//Employee[EmployeeID="{employee_id}"]/Position with "{new_position}",
+                replace value of node doc("{self.employees_db}/employees.xml")//Employee[EmployeeID="{employee_id}"]/Salary with xs:decimal("{salary_str}")
             )
             '''
             # If the above XQUERY with a sequence of replace causes issues, execute them separately:
-            # update_pos_query = f'XQUERY replace value of node doc("{self.db_name}/employees.xml")//Employee[EmployeeID="{employee_id}"]/Position with "{new_position}"'
-            # update_sal_query = f'XQUERY replace value of node doc("{self.db_name}/employees.xml")//Employee[EmployeeID="{employee_id}"]/Salary with xs:decimal("{salary_str}")'
+            # update_pos_query = f'XQUERY replace value of node doc("{self.employees_db}/employees.xml")//Employee[EmployeeID="{employee_id}"]/Position with "{new_position}"'
+            # update_sal_query = f'XQUERY replace value of node doc("{self.employees_db}/employees.xml")//Employee[EmployeeID="{employee_id}"]/Salary with xs:decimal("{salary_str}")'
             # session.execute(update_pos_query)
             # session.execute(update_sal_query)
 
             session.execute(update_query) # Try with combined sequence first
+            self._record_change('update', 'employees', employee_id, {'Position': new_position, 'Salary': salary_str})
             return f"Employee {employee_id} position and salary updated successfully."
 
         except Exception as e:
@@ -1109,7 +1813,7 @@ class BankingXMLQueries:
     def get_user_by_id(self, user_id: str) -> Optional[Dict]:
         """Get user details by UserID using BaseX"""
         query = f'''
-        doc("{self.db_name}/users.xml")/Users/User[UserID = "{user_id}"]
+        doc("{self.users_db}/users.xml")/Users/User[UserID = "{user_id}"]
         '''
         result = self._execute_query(query)
         return self._parse_single_xml_item(result)
@@ -1117,7 +1821,7 @@ class BankingXMLQueries:
     def get_users_by_role(self, role: str) -> List[Dict]:
         """Get all users with a specific role using BaseX"""
         query = f'''
-        doc("{self.db_name}/users.xml")/Users/User[Role = "{role}"]
+        doc("{self.users_db}/users.xml")/Users/User[Role = "{role}"]
         '''
         result = self._execute_query(query)
         # Assuming result is <User>...</User><User>...</User>
@@ -1128,7 +1832,7 @@ class BankingXMLQueries:
         # Note: Storing/comparing password hashes directly is insecure. Use proper hashing libraries.
         query = f'''
         exists(
-            doc("{self.db_name}/users.xml")/Users/User[Username = "{username}" and PasswordHash = "{password_hash}"]
+            doc("{self.users_db}/users.xml")/Users/User[Username = "{username}" and PasswordHash = "{password_hash}"]
         )
         '''
         result = self._execute_query(query)
@@ -1137,7 +1841,7 @@ class BankingXMLQueries:
     def get_accounts_by_user(self, user_id: str) -> List[Dict]:
         """Get all accounts for a specific user using BaseX"""
         query = f'''
-        doc("{self.db_name}/accounts.xml")/Accounts/Account[UserID = "{user_id}"]
+        doc("{self.accounts_db}/accounts.xml")/Accounts/Account[UserID = "{user_id}"]
         '''
         result = self._execute_query(query)
         return self._parse_xml_string(result, "Accounts", "Account")
@@ -1145,7 +1849,7 @@ class BankingXMLQueries:
     def get_account_balance(self, account_id: str) -> Optional[Decimal]:
         """Get current balance of an account using BaseX"""
         query = f'''
-        let $bal := doc("{self.db_name}/accounts.xml")/Accounts/Account[AccountID = "{account_id}"]/Balance/text()
+        let $bal := doc("{self.accounts_db}/accounts.xml")/Accounts/Account[AccountID = "{account_id}"]/Balance/text()
         return if (exists($bal)) then $bal else "" (: Return empty string if not found :)
         '''
         result = self._execute_query(query).strip()
@@ -1163,58 +1867,74 @@ class BankingXMLQueries:
     def get_accounts_by_type(self, account_type: str) -> List[Dict]:
         """Get all accounts of a specific type using BaseX"""
         query = f'''
-        doc("{self.db_name}/accounts.xml")/Accounts/Account[AccountType = "{account_type}"]
+        doc("{self.accounts_db}/accounts.xml")/Accounts/Account[AccountType = "{account_type}"]
         '''
         result = self._execute_query(query)
         return self._parse_xml_string(result, "Accounts", "Account")
 
     def get_transactions_by_account(self, account_id: str,
                                      start_date: Optional[str] = None,
-                                     end_date: Optional[str] = None) -> List[Dict]:
-        """Get transactions for an account with optional date range using BaseX XQuery"""
+                                     end_date: Optional[str] = None, include_archived: bool = False) -> List[Dict]:
+        """Get transactions for an account with optional date range using BaseX XQuery.
+
+        include_archived also reads the archived months overlapping the range.
+        """
         # Ensure dates are in ISO format (YYYY-MM-DDTHH:MM:SS or YYYY-MM-DD) for xs:dateTime comparison
-        query = f'''
-        declare variable $accID as xs:string := "{account_id}";
-        for $t in doc("{self.db_name}/transactions.xml")/Transactions/Transaction
-        where ($t/FromAccountID = $accID or $t/ToAccountID = $accID)
-        '''
-        # Add date filters - requires Timestamp field to be xs:dateTime compatible
+        date_filters = ''
+        # Add date filters - compares the transaction Date field as xs:dateTime / xs:date
         if start_date:
-             # Attempt to parse start_date to ensure it's a valid dateTime or date
              try:
-                 datetime.fromisoformat(start_date.replace('Z', '+00:00')) # Validate ISO format
-                 query += f' and $t/Timestamp >= xs:dateTime("{start_date}")'
+                 if len(start_date) == 10: # Plain date: compare on the date part only
+                     datetime.strptime(start_date, '%Y-%m-%d')
+                     date_filters += f' and xs:date(substring($t/Date, 1, 10)) >= xs:date("{start_date}")'
+                 else:
+                     datetime.fromisoformat(start_date.replace('Z', '+00:00')) # Validate ISO format
+                     date_filters += f' and xs:dateTime($t/Date) >= xs:dateTime("{start_date}")'
              except ValueError:
-                  try: # Try as date
-                      datetime.strptime(start_date, '%Y-%m-%d')
-                      query += f' and xs:date(substring-before($t/Timestamp, "T")) >= xs:date("{start_date}")'
-                  except ValueError:
-                      print(f"Warning: Invalid start_date format '{start_date}'. Should be ISO 8601.")
+                 print(f"Warning: Invalid start_date format '{start_date}'. Should be ISO 8601.")
+                 start_date = None
 
         if end_date:
-             # Add 1 day to end_date if only date is provided to include the whole day
              try:
-                 dt_end = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-                 query += f' and $t/Timestamp <= xs:dateTime("{end_date}")'
+                 if len(end_date) == 10: # Plain date: include the whole day
+                     dt_end = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)
+                     end_date_str = dt_end.strftime('%Y-%m-%d')
+                     date_filters += f' and xs:date(substring($t/Date, 1, 10)) < xs:date("{end_date_str}")'
+                 else:
+                     datetime.fromisoformat(end_date.replace('Z', '+00:00'))
+                     date_filters += f' and xs:dateTime($t/Date) <= xs:dateTime("{end_date}")'
              except ValueError:
-                  try: # Try as date, make it end of day
-                      dt_end = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)
-                      end_date_str = dt_end.strftime('%Y-%m-%d')
-                      query += f' and xs:date(substring-before($t/Timestamp, "T")) < xs:date("{end_date_str}")'
-                  except ValueError:
-                      print(f"Warning: Invalid end_date format '{end_date}'. Should be ISO 8601.")
+                 print(f"Warning: Invalid end_date format '{end_date}'. Should be ISO 8601.")
+                 end_date = None
 
+        if self.range_index is not None:
+            ids = self._built_range_index().account_range(account_id, start_date, end_date)
+            transactions = self._transactions_by_ids(ids, start_date, end_date)
+        else:
+            # Only the partitions overlapping the requested range are read
+            query = f'''
+            declare variable $accID as xs:string := "{account_id}";
+            for $t in {self._transaction_nodes(start_date, end_date)}
+            where ($t/FromAccountID = $accID or $t/ToAccountID = $accID){date_filters}
+            '''
 
-        query += ' order by $t/Timestamp descending return $t' # Order by date descending
+            query += ' order by $t/Date descending return $t' # Order by date descending
 
-        result = self._execute_query(query)
-        return self._parse_xml_string(result, "Transactions", "Transaction")
+            result = self._execute_query(query)
+            transactions = self._parse_xml_string(result, "Transactions", "Transaction")
+        if include_archived:
+            live_ids = {t.get('TransactionID') for t in transactions}
+            archived = [self._element_to_dict(t) for t in
+                        self.transaction_archive.get_transactions_by_account(account_id, start_date, end_date)]
+            transactions += [t for t in archived if t.get('TransactionID') not in live_ids]
+            transactions.sort(key=lambda t: t.get('Date') or '', reverse=True)
+        return transactions
 
 
     def get_transaction_by_id(self, transaction_id: str) -> Optional[Dict]:
         """Get a specific transaction by ID using BaseX XQuery"""
         query = f'''
-        doc("{self.db_name}/transactions.xml")/Transactions/Transaction[TransactionID = "{transaction_id}"]
+        {self._transaction_nodes()}[TransactionID = "{transaction_id}"]
         '''
         result = self._execute_query(query)
         return self._parse_single_xml_item(result)
@@ -1223,7 +1943,7 @@ class BankingXMLQueries:
     def get_loans_by_user(self, user_id: str) -> List[Dict]:
         """Get all loans for a specific user using BaseX"""
         query = f'''
-        doc("{self.db_name}/loans.xml")/Loans/Loan[UserID = "{user_id}"]
+        doc("{self.loans_db}/loans.xml")/Loans/Loan[UserID = "{user_id}"]
         '''
         result = self._execute_query(query)
         return self._parse_xml_string(result, "Loans", "Loan")
@@ -1231,7 +1951,7 @@ class BankingXMLQueries:
     def get_approved_loans(self) -> List[Dict]:
         """Get all approved loans (assuming status 'APPROVED') using BaseX"""
         query = f'''
-        doc("{self.db_name}/loans.xml")/Loans/Loan[Status = "approved"]
+        doc("{self.loans_db}/loans.xml")/Loans/Loan[Status = "approved"]
         '''
         result = self._execute_query(query)
         return self._parse_xml_string(result, "Loans", "Loan")
@@ -1239,7 +1959,7 @@ class BankingXMLQueries:
     def get_requested_loans(self) -> List[Dict]:
         """Get all requested loans (assuming status 'REQUESTED') using BaseX"""
         query = f'''
-        doc("{self.db_name}/loans.xml")/Loans/Loan[Status = "requested"]
+        doc("{self.loans_db}/loans.xml")/Loans/Loan[Status = "requested"]
         '''
         result = self._execute_query(query)
         return self._parse_xml_string(result, "Loans", "Loan")
@@ -1247,7 +1967,7 @@ class BankingXMLQueries:
     def get_paid_loans(self) -> List[Dict]:
         """Get all paid loans (assuming status 'PAID') using BaseX"""
         query = f'''
-        doc("{self.db_name}/loans.xml")/Loans/Loan[Status = "paid"]
+        doc("{self.loans_db}/loans.xml")/Loans/Loan[Status = "paid"]
         '''
         result = self._execute_query(query)
         return self._parse_xml_string(result, "Loans", "Loan")
@@ -1258,7 +1978,7 @@ class BankingXMLQueries:
     def get_cards_by_account(self, account_id: str) -> List[Dict]:
         """Get all cards associated with an account using BaseX"""
         query = f'''
-        doc("{self.db_name}/cards.xml")/Cards/Card[AccountID = "{account_id}"]
+        doc("{self.cards_db}/cards.xml")/Cards/Card[AccountID = "{account_id}"]
         '''
         result = self._execute_query(query)
         return self._parse_xml_string(result, "Cards", "Card")
@@ -1266,7 +1986,7 @@ class BankingXMLQueries:
     def get_active_cards(self) -> List[Dict]:
         """Get all active cards (assuming status 'ACTIVE') using BaseX"""
         query = f'''
-        doc("{self.db_name}/cards.xml")/Cards/Card[lower-case(Status) = "active"]
+        doc("{self.cards_db}/cards.xml")/Cards/Card[lower-case(Status) = "active"]
         '''
         result = self._execute_query(query)
         return self._parse_xml_string(result, "Cards", "Card")
@@ -1275,7 +1995,7 @@ class BankingXMLQueries:
         """Get all expired cards using BaseX"""
         today = datetime.now().strftime('%Y-%m-%d')
         query = f'''
-        doc("{self.db_name}/cards.xml")/Cards/Card[xs:date(ExpiryDate) < xs:date("{today}")]
+        doc("{self.cards_db}/cards.xml")/Cards/Card[xs:date(ExpiryDate) < xs:date("{today}")]
         '''
         result = self._execute_query(query)
         return self._parse_xml_string(result, "Cards", "Card")
@@ -1283,7 +2003,7 @@ class BankingXMLQueries:
     def get_blocked_cards(self) -> List[Dict]:
         """Get all blocked cards (assuming status 'BLOCKED') using BaseX"""
         query = f'''
-        doc("{self.db_name}/cards.xml")/Cards/Card[lower-case(Status) = "blocked"]
+        doc("{self.cards_db}/cards.xml")/Cards/Card[lower-case(Status) = "blocked"]
         '''
         result = self._execute_query(query)
         return self._parse_xml_string(result, "Cards", "Card")
@@ -1292,7 +2012,7 @@ class BankingXMLQueries:
     def get_employee_by_id(self, employee_id: str) -> Optional[Dict]:
         """Get employee details by EmployeeID using BaseX"""
         query = f'''
-        doc("{self.db_name}/employees.xml")/Employees/Employee[EmployeeID = "{employee_id}"]
+        doc("{self.employees_db}/employees.xml")/Employees/Employee[EmployeeID = "{employee_id}"]
         '''
         result = self._execute_query(query)
         return self._parse_single_xml_item(result)
@@ -1300,7 +2020,7 @@ class BankingXMLQueries:
     def get_all_employees(self) -> List[Dict]:
         """Get all employees using BaseX"""
         query = f'''
-        doc("{self.db_name}/employees.xml")/Employees/Employee
+        doc("{self.employees_db}/employees.xml")/Employees/Employee
         '''
         result = self._execute_query(query)
         return self._parse_xml_string(result, "Employees", "Employee")
@@ -1308,7 +2028,7 @@ class BankingXMLQueries:
     def get_employees_by_branch(self, branch_id: str) -> List[Dict]:
         """Get all employees in a specific branch using BaseX"""
         query = f'''
-        doc("{self.db_name}/employees.xml")/Employees/Employee[BranchID = "{branch_id}"]
+        doc("{self.employees_db}/employees.xml")/Employees/Employee[BranchID = "{branch_id}"]
         '''
         result = self._execute_query(query)
         return self._parse_xml_string(result, "Employees", "Employee")
@@ -1328,34 +2048,121 @@ class BankingXMLQueries:
         # Note: Sorting numbers might need explicit casting in XQuery if they are stored as strings
         # Example: order by xs:integer($u/SomeNumericField)
         query = f'''
-        for $u in doc("{self.db_name}/users.xml")/Users/User
+        for $u in doc("{self.users_db}/users.xml")/Users/User
         order by $u/{sort_field} {order}
         return $u
         '''
         result = self._execute_query(query)
         return self._parse_xml_string(result, "Users", "User")
 
-    def search_users(self, search_term: str, fields: List[str] = ['FullName', 'Email', 'UserID', 'Username', 'Phone']) -> List[Dict]:
-        """Search users across multiple fields with case-insensitive matching using XQuery"""
+    def search_users(self, search_term: str, fields: List[str] = ['FullName', 'Email', 'UserID', 'Username', 'Phone'],
+                     limit: Optional[int] = None) -> List[Dict]:
+        """Search users across multiple fields with case-insensitive matching.
+
+        Uses the in-process n-gram index when one was given (ranked, best match first),
+        otherwise falls back to a contains() scan in XQuery.
+        """
         # Basic validation for fields
         allowed_search_fields = ["UserID", "FullName", "Email", "Phone", "Username", "Role"] # Add Address fields if needed
         valid_fields = [f for f in fields if f in allowed_search_fields]
         if not valid_fields:
             raise ValueError("No valid search fields provided.")
 
+        if self.user_search_index is not None:
+            return self._built_user_search_index().search(search_term, valid_fields, limit)
+
         # Construct the 'contains' part of the where clause dynamically
         # Use lower-case for case-insensitive search
-        contains_clauses = [f'contains(lower-case($u/{field}/text()), lower-case("{search_term}"))' for field in valid_fields]
+        term = self._xquery_literal(str(search_term))
+        contains_clauses = [f'contains(lower-case($u/{field}/text()), lower-case({term}))' for field in valid_fields]
         where_clause = " or ".join(contains_clauses)
 
         query = f'''
-        for $u in doc("{self.db_name}/users.xml")/Users/User
-        where {where_clause}
-        return $u
+        let $matches :=
+            for $u in doc("{self.users_db}/users.xml")/Users/User
+            where {where_clause}
+            return $u
+        return {f"subsequence($matches, 1, {int(limit)})" if limit is not None else "$matches"}
         '''
         result = self._execute_query(query)
         return self._parse_xml_string(result, "Users", "User")
 
+    def autocomplete_users(self, prefix: str, limit: int = 10,
+                           fields: List[str] = ['FullName', 'Email', 'UserID', 'Username', 'Phone']) -> List[Dict]:
+        """Users with a word (or whole field) starting with prefix, for type-ahead lookups"""
+        valid_fields = [f for f in fields if f in UserSearchIndex.FIELDS]
+        if not valid_fields:
+            raise ValueError("No valid search fields provided.")
+
+        if self.user_search_index is not None:
+            return self._built_user_search_index().autocomplete(prefix, valid_fields, limit)
+
+        literal = self._xquery_literal(str(prefix))
+        starts_clauses = [
+            f'some $w in tokenize(lower-case($u/{field}), "[^0-9a-z]+") satisfies starts-with($w, lower-case({literal}))'
+            for field in valid_fields
+        ]
+        query = f'''
+        let $matches :=
+            for $u in doc("{self.users_db}/users.xml")/Users/User
+            where {" or ".join(starts_clauses)}
+            return $u
+        return subsequence($matches, 1, {int(limit)})
+        '''
+        result = self._execute_query(query)
+        return self._parse_xml_string(result, "Users", "User")
+
+    def build_user_search_index(self) -> int:
+        """(Re)build the user search index from users.xml. Returns the number of indexed users."""
+        if self.user_search_index is None:
+            self.user_search_index = UserSearchIndex()
+        # Changes recorded from here on are replayed after the build (re-indexing is idempotent)
+        seq = self.change_log.last_sequence() if self.change_log is not None else 0
+        result = self._execute_query(f'doc("{self.users_db}/users.xml")/Users/User')
+        self.user_search_index.build(self._parse_xml_string(result, "Users", "User"))
+        self.user_search_index.log_seq = seq
+        return len(self.user_search_index)
+
+    def _built_user_search_index(self) -> UserSearchIndex:
+        if not self.user_search_index.is_built:
+            self.build_user_search_index()
+        if self.change_log is not None:
+            self.user_search_index.catch_up(self.change_log)
+        return self.user_search_index
+
+    def build_range_index(self) -> int:
+        """(Re)build the transaction Date/Amount range index. Returns the number of indexed transactions."""
+        if self.range_index is None:
+            self.range_index = TransactionRangeIndex()
+        # Changes recorded from here on are replayed after the build (replays of rows the
+        # build already read are dropped by the lookups)
+        seq = self.change_log.last_sequence() if self.change_log is not None else 0
+        self.range_index.build(self.iter_rows(self._transaction_nodes(), TransactionRangeIndex.FIELDS, chunk_size=100000))
+        self.range_index.log_seq = seq
+        return len(self.range_index)
+
+    def _built_range_index(self) -> TransactionRangeIndex:
+        if not self.range_index.is_built:
+            self.build_range_index()
+        if self.change_log is not None:
+            self.range_index.catch_up(self.change_log)
+        return self.range_index
+
+    def _transactions_by_ids(self, ids: List[str], start_date: Optional[str] = None,
+                             end_date: Optional[str] = None, chunk_size: int = 1000) -> List[Dict]:
+        """Transactions with the given IDs, in the order of ids.
+
+        TransactionID equality is answered by the BaseX text index; start_date/end_date only
+        narrow the partitions opened.
+        """
+        found = {}
+        for i in range(0, len(ids), chunk_size):
+            quoted = ", ".join(f'"{tx_id}"' for tx_id in ids[i:i + chunk_size])
+            result = self._execute_query(f'{self._transaction_nodes(start_date, end_date)}[TransactionID = ({quoted})]')
+            for t in self._parse_xml_string(result, "Transactions", "Transaction"):
+                found[t.get('TransactionID')] = t
+        return [found[tx_id] for tx_id in ids if tx_id in found]
+
     # ==============================================
     # Advanced Account Queries (Converted)
     # ==============================================
@@ -1363,7 +2170,7 @@ class BankingXMLQueries:
         """Get accounts with balance greater than or equal to specified amount using XQuery"""
         min_balance_str = str(min_balance)
         query = f'''
-        doc("{self.db_name}/accounts.xml")/Accounts/Account[xs:decimal(Balance) >= xs:decimal("{min_balance_str}")]
+        doc("{self.accounts_db}/accounts.xml")/Accounts/Account[xs:decimal(Balance) >= xs:decimal("{min_balance_str}")]
         '''
         result = self._execute_query(query)
         return self._parse_xml_string(result, "Accounts", "Account")
@@ -1374,7 +2181,7 @@ class BankingXMLQueries:
         filter_clause = f'[AccountType = "{account_type}"]' if account_type else ""
 
         query = f'''
-        for $a in doc("{self.db_name}/accounts.xml")/Accounts/Account{filter_clause}
+        for $a in doc("{self.accounts_db}/accounts.xml")/Accounts/Account{filter_clause}
         order by xs:decimal($a/Balance) {order}
         return $a
         '''
@@ -1387,14 +2194,14 @@ class BankingXMLQueries:
     def get_largest_transactions(self, top_n: int = 10) -> List[Dict]:
         if top_n == -1:
             query = f'''
-                for $t in doc("{self.db_name}/transactions.xml")/Transactions/Transaction
+                for $t in {self._transaction_nodes()}
                 order by xs:decimal($t/Amount) descending
                 return $t
             '''
         else:
             query = f'''
                 let $transactions := 
-                    for $t in doc("{self.db_name}/transactions.xml")/Transactions/Transaction
+                    for $t in {self._transaction_nodes()}
                     order by xs:decimal($t/Amount) descending
                     return $t
                 return $transactions[position() <= {top_n}]
@@ -1408,7 +2215,7 @@ class BankingXMLQueries:
         # This query aggregates directly in XQuery
         query = f'''
         declare variable $accID as xs:string := "{account_id}";
-        let $transactions := doc("{self.db_name}/transactions.xml")/Transactions/Transaction
+        let $transactions := {self._transaction_nodes()}
                            [FromAccountID = $accID or ToAccountID = $accID]
         let $amounts := $transactions/Amount ! xs:decimal(.) (: Convert amounts to decimal :)
         let $count := count($transactions)
@@ -1443,16 +2250,21 @@ class BankingXMLQueries:
 
     def detect_high_value_transactions( self,threshold: Decimal, days: int = 7) -> List[Dict]:
         """Detect high value transactions in recent period using XQuery"""
+        if self.analytics_engine is not None:
+            return self.analytics_engine.snapshot().high_value_transactions(threshold, days)
         threshold_str = str(threshold)
         end_date = datetime.now() # Use current time
         start_date = end_date - timedelta(days=float(days))  # preserves decimals
         start_date_str = start_date.isoformat()
+        if self.range_index is not None:
+            ids = self._built_range_index().high_value(threshold, start_date_str)
+            return self._transactions_by_ids(ids, start_date_str)
 
         query = f'''
         declare variable $thresh as xs:decimal := xs:decimal("{threshold_str}");
         declare variable $startDate as xs:dateTime := xs:dateTime("{start_date_str}");
 
-        for $t in doc("{self.db_name}/transactions.xml")/Transactions/Transaction
+        for $t in {self._transaction_nodes(start_date_str)}
         where xs:decimal($t/Amount) >= $thresh
         and xs:dateTime($t/Date) >= $startDate
         order by xs:decimal($t/Amount) descending, $t/Date descending
@@ -1484,10 +2296,14 @@ class BankingXMLQueries:
                 start_date=thirty_days_ago
             )
             # Calculate total balance
+            if self.money_type == 'minor':
+                continue # Summed as integers below
             try:
-                total_balance += Decimal(account.get('Balance', 0))
+                total_balance += Decimal(str(account.get('Balance', 0)))
             except:
                  pass # Ignore if balance is missing or invalid
+        if self.money_type == 'minor':
+            total_balance = Money.sum(a['Balance'] for a in accounts if isinstance(a.get('Balance'), Money))
 
         user['accounts'] = accounts
         user['total_balance'] = total_balance # Add calculated total balance
@@ -1514,7 +2330,7 @@ class BankingXMLQueries:
             # Get loans associated with this employee's UserID
             loans = self.get_loans_by_user(user_id)
             approved_loans = [l for l in loans if l.get('Status') == 'APPROVED']
-            total_loan_amount = sum(Decimal(l.get('Amount', 0)) for l in loans)
+            total_loan_amount = sum(Decimal(str(l.get('LoanAmount', 0))) for l in loans)
 
             results.append({
                 'employee_id': emp.get('EmployeeID'),
@@ -1538,15 +2354,173 @@ class BankingXMLQueries:
     # Business Intelligence Queries (Converted where feasible)
     # ==============================================
 
+    def get_bank_overview(self) -> Dict:
+        """Headline numbers of the whole bank in one round trip.
+
+        Counts are grouped on the server, so only a few hundred bytes come back:
+            {'users_by_role': {'customer': 10, ...}, 'accounts_by_type': {...},
+             'accounts_by_status': {...}, 'loans_by_status': {...}, 'cards_by_status': {...},
+             'balances_by_currency': {'USD': Decimal('1500.5'), ...}, 'transactions': 120}
+        Archived transactions are not included in the transaction count.
+        """
+        def grouped(section: str, nodes: str, key: str, value: str = "count($x)") -> str:
+            return f'''
+            for $x in {nodes}
+            group by $k := string($x/{key})
+            order by $k
+            return "{section}&#9;" || $k || "&#9;" || {value}'''
+
+        users = f'doc("{self.users_db}/users.xml")/Users/User'
+        accounts = f'doc("{self.accounts_db}/accounts.xml")/Accounts/Account'
+        query = f'''
+        string-join((
+            {grouped("users_by_role", users, "Role")},
+            {grouped("accounts_by_type", accounts, "AccountType")},
+            {grouped("accounts_by_status", accounts, "Status")},
+            {grouped("balances_by_currency", accounts, "Currency", "sum($x/Balance ! xs:decimal(.))")},
+            {grouped("loans_by_status", f'doc("{self.loans_db}/loans.xml")/Loans/Loan', "Status")},
+            {grouped("cards_by_status", f'doc("{self.cards_db}/cards.xml")/Cards/Card', "Status")},
+            "transactions&#9;&#9;" || count({self._transaction_nodes()})
+        ), "&#10;")
+        '''
+        overview = {section: {} for section in ('users_by_role', 'accounts_by_type', 'accounts_by_status',
+                                                'balances_by_currency', 'loans_by_status', 'cards_by_status')}
+        overview['transactions'] = 0
+        for line in self._execute_query(query).split("\n"):
+            if not line:
+                continue
+            section, key, value = line.split("\t")
+            if section == 'transactions':
+                overview['transactions'] = int(value)
+            elif section == 'balances_by_currency':
+                overview[section][key] = Decimal(value)
+            else:
+                overview[section][key] = int(value)
+        return overview
+
+
+    @staticmethod
+    def _xquery_literal(value) -> str:
+        if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+            return f'xs:decimal("{Decimal(str(value))}")'
+        return '"' + str(value).replace('&', '&amp;').replace('"', '""') + '"'
+
+    def aggregate(self, entity: str, measures: Dict[str, Tuple[str, Optional[str]]],
+                  filters: Optional[List[Tuple[str, str, object]]] = None,
+                  group_by: Optional[List[str]] = None) -> List[Dict]:
+        """Aggregate an entity on the server and return only the aggregated rows.
+
+        measures maps an output name to (function, field); function is one of count, sum,
+        avg, min, max and count takes field None. filters are (field, operator, value)
+        triples combined with "and"; operator is one of =, !=, <, <=, >, >=, in (value is a
+        list). Fields are element paths such as 'Amount' or 'Address/City'. Example:
+
+            bank.aggregate('transactions', {'n': ('count', None), 'total': ('sum', 'Amount')},
+                           filters=[('Status', '=', 'completed'), ('Date', '>=', '2024-01-01')],
+                           group_by=['Type'])
+            -> [{'Type': 'deposit', 'n': 12, 'total': Decimal('5400.5')}, ...]
+
+        Numeric fields (NUMERIC_FIELDS) are compared and aggregated as decimals, other fields
+        as strings (ISO dates compare correctly). Without group_by one row is returned even
+        when nothing matches. Transaction filters on Date also prune monthly partitions.
+        """
+        if entity not in ENTITY_DOCUMENTS:
+            raise ValueError(f"Unknown entity '{entity}'. Choose one of {', '.join(ENTITY_DOCUMENTS)}.")
+        filters = filters or []
+        group_by = group_by or []
+        for field in group_by + [f for f, _, _ in filters] + [f for _, f in measures.values() if f]:
+            if not _FIELD_PATH.match(field):
+                raise ValueError(f"Invalid field path '{field}'.")
+
+        def value_of(field: str, context: str) -> str:
+            leaf = field.rsplit('/', 1)[-1]
+            return f"{context}{field} ! xs:decimal(.)" if leaf in NUMERIC_FIELDS else f"{context}{field} ! string(.)"
+
+        conditions = []
+        start_date = end_date = None
+        for field, op, value in filters:
+            if op not in FILTER_OPERATORS:
+                raise ValueError(f"Unsupported operator '{op}'. Choose one of {', '.join(FILTER_OPERATORS)}.")
+            if op == 'in':
+                literals = ", ".join(self._xquery_literal(v) for v in value)
+                conditions.append(f"({value_of(field, '')}) = ({literals})")
+                continue
+            conditions.append(f"({value_of(field, '')}) {op} {self._xquery_literal(value)}")
+            if entity == 'transactions' and field == 'Date':
+                if op in ('>', '>=', '='):
+                    start_date = str(value)
+                if op in ('<', '<=', '='):
+                    end_date = str(value)
+
+        if entity == 'transactions':
+            nodes = self._transaction_nodes(start_date, end_date)
+        else:
+            doc, root, item = ENTITY_DOCUMENTS[entity]
+            nodes = f'doc("{self.databases[entity]}/{doc}")/{root}/{item}'
+        if conditions:
+            nodes += "[" + " and ".join(conditions) + "]"
+
+        outputs = []
+        for name, (function, field) in measures.items():
+            if function not in AGGREGATE_FUNCTIONS:
+                raise ValueError(f"Unsupported aggregate '{function}'. Choose one of {', '.join(AGGREGATE_FUNCTIONS)}.")
+            if function == 'count':
+                expr = "count($x)" if field is None else f"count($x/{field})"
+            elif field is None:
+                raise ValueError(f"Aggregate '{function}' for '{name}' needs a field.")
+            else:
+                expr = f"{function}({value_of(field, '$x/')})"
+            outputs.append(f"string({expr})")
+
+        group_keys = [f"$g{i}" for i in range(len(group_by))]
+        if group_by:
+            clauses = ", ".join(f'{key} := translate(string($x/{field}), "&#9;&#10;&#13;", "   ")'
+                                for key, field in zip(group_keys, group_by))
+            query = f'''
+            string-join(
+                for $x in {nodes}
+                group by {clauses}
+                order by {", ".join(group_keys)}
+                return string-join(({", ".join(group_keys + outputs)}), "&#9;"),
+                "&#10;")
+            '''
+        else:
+            query = f'''
+            let $x := {nodes}
+            return string-join(({", ".join(outputs)}), "&#9;")
+            '''
+
+        rows = []
+        for line in self._execute_query(query).split("\n"):
+            if not line and group_by:
+                continue
+            values = line.split("\t")
+            row = dict(zip(group_by, values))
+            for (name, (function, field)), value in zip(measures.items(), values[len(group_by):]):
+                if function == 'count':
+                    row[name] = int(value)
+                elif value == '':
+                    row[name] = None
+                elif field.rsplit('/', 1)[-1] in NUMERIC_FIELDS:
+                    row[name] = Decimal(value)
+                else:
+                    row[name] = value
+            rows.append(row)
+        return rows
+
     def get_customer_segments(self, balance_thresholds: Optional[List[Decimal]] = None) -> Dict:
         """Segment customers by total account balance (multiple queries)"""
+        if self.analytics_engine is not None:
+            return self.analytics_engine.snapshot().customer_segments(balance_thresholds)
         # Default to 3 segments if no thresholds are provided
         if balance_thresholds is None:
             balance_thresholds = [Decimal(1000), Decimal(5000), Decimal(10000)]
+        if self.money_type == 'minor':
+            return self._customer_segments_minor(balance_thresholds)
 
         # 1. Get all customer UserIDs
         query_users = f'''
-        for $u in doc("{self.db_name}/users.xml")/Users/User[Role='customer']
+        for $u in doc("{self.users_db}/users.xml")/Users/User[Role='customer']
         return $u/UserID/text()
         '''
         user_ids_str = self._execute_query(query_users)
@@ -1562,7 +2536,7 @@ class BankingXMLQueries:
                 continue
             # Get all accounts for the user
             accounts = self.get_accounts_by_user(user_id)
-            balance = sum(Decimal(acc.get('Balance', 0)) for acc in accounts)
+            balance = sum(Decimal(str(acc.get('Balance', 0))) for acc in accounts)
 
             # Assign to segment
             assigned = False
@@ -1576,9 +2550,46 @@ class BankingXMLQueries:
 
         return segments
 
+    def _customer_segments_minor(self, balance_thresholds: List[Decimal]) -> Dict:
+        """get_customer_segments over int64 minor units: one streamed query and numpy sums.
+
+        Balances are rounded to their currency's minor unit (JPY has none) and totalled per
+        customer at the finest scale needed, thresholds included, so no comparison is inexact.
+        """
+        import numpy as np
+        thresholds = sorted(balance_thresholds)
+        exact = [Decimal(str(t)) for t in thresholds]
+        users = f'doc("{self.users_db}/users.xml")/Users/User[Role="customer"]'
+        user_ids = [row[0] for chunk in self.iter_rows(users, ['UserID'], chunk_size=100000)
+                    for row in chunk if row[0]]
+        index = {user_id: i for i, user_id in enumerate(user_ids)}
+
+        by_scale: Dict[int, Tuple[List[int], List[str]]] = {}
+        accounts = f'doc("{self.accounts_db}/accounts.xml")/Accounts/Account[UserID = {users}/UserID]'
+        for chunk in self.iter_rows(accounts, ['UserID', 'Balance', 'Currency'], chunk_size=100000):
+            for user_id, balance, currency in chunk:
+                if user_id in index and balance:
+                    owners, texts = by_scale.setdefault(money_class(currency).scale, ([], []))
+                    owners.append(index[user_id])
+                    texts.append(balance)
+
+        scale = max([s for s in by_scale] + [max(0, -t.as_tuple().exponent) for t in exact])
+        totals = np.zeros(len(user_ids), dtype=np.int64)
+        for balance_scale, (owners, texts) in by_scale.items():
+            minor = parse_money_column(texts, balance_scale)  # invalid balances raise, as Decimal() does
+            np.add.at(totals, np.array(owners, dtype=np.int64), minor * 10 ** (scale - balance_scale))
+        limits = np.array([int(t.scaleb(scale)) for t in exact], dtype=np.int64)
+        buckets = np.bincount(np.searchsorted(limits, totals, side='right'), minlength=len(limits) + 1)
+
+        segments = {f"< {threshold}": int(count) for threshold, count in zip(thresholds, buckets)}
+        segments[f">= {thresholds[-1]}"] = int(buckets[-1])
+        return segments
+
 
     def get_transaction_volume_report(self, period: str = 'month') -> List[Dict]:
         """Get transaction volume report by time period using XQuery grouping"""
+        if self.analytics_engine is not None:
+            return self.analytics_engine.snapshot().transaction_volume_report(period)
         # Choose the grouping format based on the period
         period_format = {
             'day': 'xs:date(substring($t/Date, 1, 10))', # YYYY-MM-DD
@@ -1592,7 +2603,7 @@ class BankingXMLQueries:
             raise ValueError("Unsupported period. Choose 'day', 'month', or 'year'.")
 
         query = f'''
-        for $t in doc("{self.db_name}/transactions.xml")/Transactions/Transaction
+        for $t in {self._transaction_nodes()}
         let $periodKey := {period_format}
         group by $periodKey
         order by $periodKey ascending
@@ -1619,10 +2630,12 @@ class BankingXMLQueries:
 
     def get_top_customers(self, top_n: int = 10) -> List[Dict]:
         """Get top customers by total balance using XQuery"""
+        if self.analytics_engine is not None:
+            return self.analytics_engine.snapshot().top_customers(top_n)
         query = f'''
-        for $u in doc("{self.db_name}/users.xml")/Users/User[Role='customer']
+        for $u in doc("{self.users_db}/users.xml")/Users/User[Role='customer']
         let $userID := $u/UserID/text()
-        let $accounts := doc("{self.db_name}/accounts.xml")/Accounts/Account[UserID = $userID]
+        let $accounts := doc("{self.accounts_db}/accounts.xml")/Accounts/Account[UserID = $userID]
         let $totalBalance := sum($accounts/Balance ! xs:decimal(.))
         order by $totalBalance descending
         return <Customer>
@@ -1664,11 +2677,11 @@ class BankingXMLQueries:
         declare variable $today as xs:date := xs:date("{today_str}");
         declare variable $futureDate as xs:date := xs:date("{future_date_str}");
 
-        for $card in doc("{self.db_name}/cards.xml")/Cards/Card
+        for $card in doc("{self.cards_db}/cards.xml")/Cards/Card
         let $expiryDate := xs:date($card/ExpiryDate)
         where $expiryDate >= $today and $expiryDate <= $futureDate
-        let $account := doc("{self.db_name}/accounts.xml")/Accounts/Account[AccountID = $card/AccountID]
-        let $user := doc("{self.db_name}/users.xml")/Users/User[UserID = $account/UserID]
+        let $account := doc("{self.accounts_db}/accounts.xml")/Accounts/Account[AccountID = $card/AccountID]
+        let $user := doc("{self.users_db}/users.xml")/Users/User[UserID = $account/UserID]
         order by $expiryDate ascending
         return <CardInfo>
                  {{ $card/* }} (: Copy all elements from card :)
@@ -1683,7 +2696,7 @@ class BankingXMLQueries:
     def get_all_transactions(self) -> List[Dict]:
         """Get all transactions using XQuery"""
         query = f'''
-        doc("{self.db_name}/transactions.xml")/Transactions/Transaction
+        {self._transaction_nodes()}
         '''
         result = self._execute_query(query)
         return self._parse_xml_string(result, "Transactions", "Transaction")
@@ -1695,7 +2708,7 @@ class BankingXMLQueries:
     def _get_account_by_id(self, account_id: str) -> Optional[Dict]:
         """Internal method to get account by ID using BaseX"""
         query = f'''
-        doc("{self.db_name}/accounts.xml")/Accounts/Account[AccountID = "{account_id}"]
+        doc("{self.accounts_db}/accounts.xml")/Accounts/Account[AccountID = "{account_id}"]
         '''
         result = self._execute_query(query)
         return self._parse_single_xml_item(result)
@@ -1707,6 +2720,7 @@ class BankingXMLQueries:
         if element is None:
             return result
 
+        money = money_class(element.findtext('Currency')) if self.money_type == 'minor' else None
         for child in element:
             tag = child.tag
             text = child.text.strip() if child.text else None
@@ -1717,7 +2731,9 @@ class BankingXMLQueries:
             elif text is not None:
                 # Try to convert to appropriate type based on tag naming convention
                 try:
-                    if tag in ['Balance', 'Amount', 'InterestRate', 'Salary']:
+                    if money is not None and tag in MONEY_FIELDS:
+                        result[tag] = money.parse(text)  # int minor units at the currency's scale
+                    elif tag in ['Balance', 'Amount', 'InterestRate', 'Salary']:
                         result[tag] = Decimal(text)
                     elif tag in ['Duration', 'count']: # Example numeric fields
                          result[tag] = int(text)
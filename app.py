@@ -1,10 +1,18 @@
 # banking_ui.py
 import streamlit as st
 from Banking_xml_queries import BankingXMLQueries
+from Banking_search_index import UserSearchIndex
+from Banking_changelog import ChangeLog
+from Banking_replicas import ReplicaRouter, parse_endpoints
+from Banking_session_pool import SessionPool
+from Banking_db_layout import layout_databases
 from decimal import Decimal
-import pandas as pd
-import random
-from datetime import datetime
+from datetime import datetime, timedelta
+import os
+
+# Database layout, as for Banking_admin.py --layout: set BANKING_DB_LAYOUT=per-entity
+# once the documents were moved with split-databases
+DB_DATABASES = layout_databases(os.environ.get("BANKING_DB_LAYOUT", "single"))
 
 # Initialize banking system
 # Check for database credentials in session state
@@ -53,7 +61,8 @@ if 'db_creds' not in st.session_state:
                     db_user=db_user,
                     db_pass=db_pass,
                     db_host=DEFAULT_HOST,
-                    db_port=DEFAULT_PORT
+                    db_port=DEFAULT_PORT,
+                    databases=DB_DATABASES
                 )
                 test_bank.get_users_by_role("customer")  # Test query to validate credentials
 
@@ -73,12 +82,88 @@ if 'db_creds' not in st.session_state:
 
     st.stop()
 
+# Past the login form: load what the dashboard needs (the login page renders without it)
+import pandas as pd
+
+# The user search index lives across reruns; it is built on the first search
+@st.cache_resource
+def get_user_search_index():
+    return UserSearchIndex()
+
+# Every write made from the app is recorded for downstream consumers
+@st.cache_resource
+def get_change_log():
+    return ChangeLog()
+
+# Alerts are raised incrementally from the change log; the monitoring tab reads them from
+# the store for the period it covers (the first start backfills the last 30 days).
+# The engine threshold is the lowest one the monitoring tab offers.
+ALERT_ENGINE_HIGH_VALUE = Decimal(1000)
+
+@st.cache_resource
+def get_alert_engine(db_user, db_pass, db_host, db_port):
+    from Banking_alerts import AlertEngine, AlertStore
+    engine = AlertEngine(get_change_log(), AlertStore(), high_value=ALERT_ENGINE_HIGH_VALUE)
+    loader = BankingXMLQueries(db_user=db_user, db_pass=db_pass, db_host=db_host, db_port=db_port,
+                               databases=DB_DATABASES)
+    engine.start(bank=loader, backfill_days=30)
+    return engine
+
+# Analytics reports are computed from an in-memory snapshot refreshed every 5 minutes
+@st.cache_resource
+def get_analytics_engine(db_user, db_pass, db_host, db_port):
+    from Banking_analytics import AnalyticsEngine
+    loader = BankingXMLQueries(db_user=db_user, db_pass=db_pass, db_host=db_host, db_port=db_port,
+                               databases=DB_DATABASES)
+    return AnalyticsEngine(loader, refresh_interval=300)
+
+# Open BaseX sessions are reused across reruns and by concurrent panel queries
+@st.cache_resource
+def get_session_pool():
+    return SessionPool(max_idle=8)
+
+# Reads are spread over read replicas listed in BANKING_READ_REPLICAS (host:port,...), if any
+@st.cache_resource
+def get_replica_router(db_user, db_pass, db_host, db_port):
+    replicas = parse_endpoints(os.environ.get("BANKING_READ_REPLICAS", ""))
+    if not replicas:
+        return None
+    router = ReplicaRouter((db_host, db_port), replicas, policy='least_loaded', max_lag=30)
+    router.start_heartbeat(BankingXMLQueries(db_user=db_user, db_pass=db_pass, db_host=db_host, db_port=db_port,
+                                             databases=DB_DATABASES))
+    return router
+
 # Initialize banking system with stored credentials (including hidden defaults)
 bank = BankingXMLQueries(
     db_user=st.session_state.db_creds['user'],
     db_pass=st.session_state.db_creds['pass'],
     db_host=st.session_state.db_creds['host'],
-    db_port=st.session_state.db_creds['port']
+    db_port=st.session_state.db_creds['port'],
+    databases=DB_DATABASES,
+    user_search_index=get_user_search_index(),
+    change_log=get_change_log(),
+    replica_router=get_replica_router(
+        st.session_state.db_creds['user'],
+        st.session_state.db_creds['pass'],
+        st.session_state.db_creds['host'],
+        st.session_state.db_creds['port']
+    ),
+    read_your_writes=True,
+    session_pool=get_session_pool()
+)
+analytics_bank = BankingXMLQueries(
+    db_user=st.session_state.db_creds['user'],
+    db_pass=st.session_state.db_creds['pass'],
+    db_host=st.session_state.db_creds['host'],
+    db_port=st.session_state.db_creds['port'],
+    databases=DB_DATABASES,
+    session_pool=get_session_pool(),
+    analytics_engine=get_analytics_engine(
+        st.session_state.db_creds['user'],
+        st.session_state.db_creds['pass'],
+        st.session_state.db_creds['host'],
+        st.session_state.db_creds['port']
+    )
 )
 
 # Configure page
@@ -123,33 +208,34 @@ def display_result(message, success=True):
 if section == "Dashboard":
     st.title("Banking System Dashboard")
     col1, col2, col3, col4 = st.columns(4)
+    # KPIs and the activity list load concurrently
+    panels = bank.run_batch({
+        'overview': (bank.get_bank_overview,),
+        'transactions': (bank.get_largest_transactions, -1),
+    })
+    overview = panels['overview']
     
     with col1:
         st.subheader("Customers")
-        customers = bank.get_users_by_role("customer")
-        st.metric("Total Customers", len(customers))
+        st.metric("Total Customers", overview['users_by_role'].get('customer', 0))
     
     with col2:
         st.subheader("Accounts")
-        accounts = bank.get_accounts_by_type("savings") + bank.get_accounts_by_type("checking")
-        st.metric("Total Accounts", len(accounts))
+        st.metric("Total Accounts", sum(overview['accounts_by_type'].values()))
 
 
     
     with col3:
         st.subheader("Transactions")
-        transactions = bank.get_largest_transactions(-1)
-        st.metric("Total Transactions", len(transactions))
+        st.metric("Total Transactions", overview['transactions'])
 
     with col4:
         st.subheader("Loans")
-        loans = bank.get_requested_loans() + bank.get_approved_loans() + bank.get_paid_loans()
-        st.metric("Total Loans", len(loans))
+        st.metric("Total Loans", sum(overview['loans_by_status'].values()))
 
     st.divider()
     st.subheader("Recent Activities")
-    transactions = bank.get_largest_transactions(-1)
-    st.dataframe(pd.DataFrame(transactions), use_container_width=True)
+    st.dataframe(pd.DataFrame(panels['transactions']), use_container_width=True)
 
 elif section == "Customer Management":
     st.title("Customer Management")
@@ -199,7 +285,7 @@ elif section == "Customer Management":
         st.subheader("Customer's Accounts & Loans")
         search_term = st.text_input("Search by name, email, or phone")
         if search_term:
-            results = bank.search_users(search_term)
+            results = bank.search_users(search_term, limit=50)
             df = pd.DataFrame(results)
             if not df.empty:
                 st.dataframe(df[["UserID", "FullName", "Email", "Phone"]], use_container_width=True)
@@ -402,18 +488,17 @@ elif section == "Transaction Processing":
             
             st.divider()
             st.subheader("Transaction Statistics")
-            if "Amount" in df.columns:
-                total_transactions = len(df)
-                total_amount = df["Amount"].sum()
-                avg_transaction = df["Amount"].mean()
-                
+            stats = bank.aggregate('transactions', {
+                'count': ('count', None), 'total': ('sum', 'Amount'), 'average': ('avg', 'Amount')
+            })[0]
+            if stats['count']:
                 col1, col2, col3 = st.columns(3)
                 with col1:
-                    st.metric("Total Transactions", total_transactions)
+                    st.metric("Total Transactions", stats['count'])
                 with col2:
-                    st.metric("Total Amount", f"${total_amount:,.2f}")
+                    st.metric("Total Amount", f"${stats['total']:,.2f}")
                 with col3:
-                    st.metric("Average Transaction", f"${avg_transaction:,.2f}")
+                    st.metric("Average Transaction", f"${stats['average']:,.2f}")
             else:
                 st.info("No numeric data available for statistics.")
         else:
@@ -434,14 +519,37 @@ elif section == "Transaction Processing":
             time_period_in_days = time_period
 
         if threshold and time_period_in_days:
-            from decimal import Decimal
-            alerts = bank.detect_high_value_transactions(Decimal(threshold), days=int(time_period_in_days))
+            alert_store = get_alert_engine(
+                st.session_state.db_creds['user'],
+                st.session_state.db_creds['pass'],
+                st.session_state.db_creds['host'],
+                st.session_state.db_creds['port']
+            ).store
+            since = (datetime.now() - timedelta(days=int(time_period_in_days))).isoformat(timespec='seconds')
+            covered_since = alert_store.covered_since()
+            if covered_since is not None and covered_since <= since and Decimal(str(threshold)) >= ALERT_ENGINE_HIGH_VALUE:
+                alerts = alert_store.query(rule='high_value', since=since, min_amount=Decimal(str(threshold)))
+                columns_to_drop = ['Rule', 'Detail']
+            else:
+                # The store does not reach back that far yet: query the database instead
+                alerts = bank.detect_high_value_transactions(Decimal(str(threshold)), int(time_period_in_days))
+                columns_to_drop = []
             if alerts:
                 st.warning(f"High Value Transactions (> {threshold}) in the last {time_period} {time_unit}")
-                st.dataframe(pd.DataFrame(alerts), use_container_width=True)
+                st.dataframe(pd.DataFrame(alerts).drop(columns=columns_to_drop), use_container_width=True)
             else:
                 st.info(f"No high value transactions detected in the last {time_period} {time_unit}.")
 
+            activity = alert_store.query(rule='velocity', since=since) + alert_store.query(rule='window_amount', since=since)
+            if covered_since is None or covered_since > since:
+                st.caption(f"Account activity alerts cover transactions since {covered_since or 'the engine started'}; "
+                           "run `Banking_admin.py backfill-alerts` for earlier ones.")
+            if activity:
+                st.warning("Unusual account activity (many transfers or large totals within an hour)")
+                df = pd.DataFrame(activity)
+                df['Detail'] = df['Detail'].astype(str)
+                st.dataframe(df, use_container_width=True)
+
 
 elif section == "Loan Administration":
     st.title("Loan Management")
@@ -744,32 +852,34 @@ elif section == "Analytics & Reports":
     with tab1:
         # st.subheader("Financial Health")
         col1, col2, col3, col4 = st.columns(4)
+        # All headline numbers come from one server-side query
+        overview = bank.get_bank_overview()
 
         with col1:
             st.subheader("Customers")
-            customers = bank.get_users_by_role("customer")
-            st.metric("Total Customers", len(customers))
+            st.metric("Total Customers", overview['users_by_role'].get('customer', 0))
         
         with col2:
             st.subheader("Accounts")
-            accounts = bank.get_accounts_by_type("savings") + bank.get_accounts_by_type("checking")
-            st.metric("Total Accounts", len(accounts))
+            st.metric("Total Accounts", sum(overview['accounts_by_type'].values()))
 
         with col3:
             st.subheader("Transactions")
-            transactions = bank.get_largest_transactions(-1)
-            st.metric("Total Transactions", len(transactions))
+            st.metric("Total Transactions", overview['transactions'])
 
         with col4:
             st.subheader("Loans")
-            loans = bank.get_requested_loans() + bank.get_approved_loans() + bank.get_paid_loans()
-            st.metric("Total Loans", len(loans))
+            st.metric("Total Loans", sum(overview['loans_by_status'].values()))
+
+        balances = overview['balances_by_currency']
+        if balances:
+            st.caption("Total balances: " + " · ".join(f"{amount:,} {currency}" for currency, amount in balances.items()))
 
         st.divider()
         st.subheader("Top Customers by Total Balance in all of his accounts")
         top_n = st.text_input("Enter the number of top customers to display", value="5")
         if top_n.isdigit() and int(top_n) > 0:
-            top_customers = bank.get_top_customers(top_n=int(top_n))
+            top_customers = analytics_bank.get_top_customers(top_n=int(top_n))
             if top_customers:
                 df = pd.DataFrame(top_customers)
                 st.dataframe(df[["UserID", "FullName", "TotalBalance"]], use_container_width=True)
@@ -782,12 +892,12 @@ elif section == "Analytics & Reports":
     
     with tab2:
         st.subheader("Customer Segmentation")
-        segments = bank.get_customer_segments()
+        segments = analytics_bank.get_customer_segments()
         st.bar_chart(pd.DataFrame.from_dict(segments, orient='index'))
     
     with tab3:
         st.subheader("Transaction Trends")
-        vol_report = bank.get_transaction_volume_report('month')
+        vol_report = analytics_bank.get_transaction_volume_report('month')
         df = pd.DataFrame(vol_report)
         st.line_chart(df.set_index('period'))
 
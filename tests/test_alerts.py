@@ -0,0 +1,49 @@
+import re
+from datetime import timedelta
+
+from Banking_alerts import AlertEngine, AlertStore
+from Banking_changelog import ChangeLog
+
+
+def test_coverage_watermark_keeps_the_earliest_date(tmp_path):
+    store = AlertStore(str(tmp_path / "alerts.db"))
+    assert store.covered_since() is None
+    store.mark_covered("2024-02-01T00:00:00")
+    store.mark_covered("2024-03-01T00:00:00")
+    assert store.covered_since() == "2024-02-01T00:00:00"
+    store.close()
+    assert AlertStore(str(tmp_path / "alerts.db")).covered_since() == "2024-02-01T00:00:00"
+
+
+class FakeBank:
+    """Transactions held as rows; answers iter_rows for the Date bounds in the node expression"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def _transaction_nodes(self, start_date=None, end_date=None):
+        return "T"
+
+    def iter_rows(self, nodes, fields, start=0, chunk_size=10000):
+        self.queries.append(nodes)
+        lower = re.search(r"Date >= '([^']*)'", nodes).group(1)
+        upper = re.search(r"Date < '([^']*)'", nodes)
+        yield [r for r in self.rows if r[4] >= lower and (upper is None or r[4] < upper.group(1))]
+
+
+def test_backfill_reads_month_by_month_and_skips_logged_records(tmp_path):
+    log = ChangeLog(str(tmp_path / "changes.log"), fsync=False)
+    rows = [[f"TX{i}", "ACC1", "ACC2", "10.00", date] for i, date in enumerate(
+        ["2024-02-01T10:20:00", "2024-01-31T23:50:00", "2024-02-01T10:10:00", "2024-01-31T23:40:00"])]
+    for row in rows:
+        log.append('create', 'transactions', row[0], dict(zip(['TransactionID', 'FromAccountID', 'ToAccountID',
+                                                               'Amount', 'Date'], row)))
+    engine = AlertEngine(log, AlertStore(str(tmp_path / "alerts.db")), max_count=2, window=timedelta(minutes=15))
+
+    engine.backfill(FakeBank(rows), "2024-01-15T00:00:00")
+
+    # TX1 after TX3 and TX0 after TX2: sorted within each month
+    assert sorted(a['TransactionID'] for a in engine.store.query(rule='velocity')) == ['TX0', 'TX1']
+    assert engine.consumer.position == log.last_sequence()
+    assert engine.run_once() == 0
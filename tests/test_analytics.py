@@ -0,0 +1,26 @@
+from decimal import Decimal
+
+from Banking_analytics import AnalyticsSnapshot
+from Banking_export import columns_from_rows
+
+
+def _snapshot():
+    categories = {'users': {}, 'accounts': {}, 'transactions': {}}
+    users = columns_from_rows('users', [['U1', 'Ann', '', '', '', '', '', 'customer', 'ann']], categories['users'])
+    accounts = columns_from_rows('accounts', [
+        ['ACC1', 'U1', 'savings', '100.00', 'USD', 'active', '2024-01-01'],
+        ['ACC2', 'U1', 'checking', '', 'USD', 'active', '2024-01-01'],  # Balance missing
+    ], categories['accounts'])
+    transactions = columns_from_rows('transactions', [
+        ['TX1', 'ACC1', 'ACC2', '10.00', '2024-01-05T10:00:00', 'transfer', 'completed'],
+        ['TX2', 'ACC1', 'ACC2', '', '2024-01-06T10:00:00', 'transfer', 'completed'],  # Amount missing
+    ], categories['transactions'])
+    return AnalyticsSnapshot(users, accounts, transactions, categories)
+
+
+def test_missing_balances_are_not_summed():
+    assert _snapshot().top_customers() == [{'UserID': 'U1', 'FullName': 'Ann', 'TotalBalance': Decimal(100)}]
+
+
+def test_missing_amounts_are_counted_but_not_summed():
+    assert _snapshot().transaction_volume_report('month') == [{'period': '2024-01', 'count': 2, 'amount': Decimal(10)}]
@@ -0,0 +1,23 @@
+import numpy as np
+
+from Banking_anomaly import score_transactions
+from Banking_export import columns_from_rows
+
+
+def _columns(amounts):
+    rows = [[f'TX{i}', 'ACC1', 'ACC2', amount, f'2024-01-{i + 1:02d}T10:00:00', 'transfer', 'completed']
+            for i, amount in enumerate(amounts)]
+    return columns_from_rows('transactions', rows, {})
+
+
+def test_jump_after_identical_amounts_scores():
+    scores = score_transactions(_columns(['100.00'] * 6 + ['10000.00']), min_history=5)
+    z = dict(zip(scores['TransactionID'], scores['z_score']))
+    assert z['TX5'] == 0.0  # same amount again
+    assert z['TX6'] > 4.0
+    assert scores['score'][scores['TransactionID'] == 'TX6'][0] >= 0.6
+
+
+def test_no_score_before_min_history():
+    scores = score_transactions(_columns(['100.00', '10000.00']), min_history=5)
+    assert np.all(scores['z_score'] == 0.0)
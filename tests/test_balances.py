@@ -0,0 +1,71 @@
+import xml.etree.ElementTree as ET
+from decimal import Decimal
+
+import pytest
+
+import Banking_xml_queries
+from Banking_archive import TransactionArchive
+from Banking_xml_queries import BankingXMLQueries
+
+
+class FakeSession:
+    """Answers every XQUERY with a fixed result and records what was sent"""
+
+    def __init__(self, result):
+        self.result = result
+        self.queries = []
+
+    def execute(self, command):
+        self.queries.append(command)
+        return self.result if command.startswith("XQUERY") else ""
+
+    def close(self):
+        pass
+
+
+def _transaction(tx_id, date, amount, status="completed", from_acc="ACC1", to_acc="ACC2"):
+    return ET.fromstring(f"<Transaction><TransactionID>{tx_id}</TransactionID><FromAccountID>{from_acc}</FromAccountID>"
+                         f"<ToAccountID>{to_acc}</ToAccountID><Amount>{amount}</Amount><Date>{date}</Date>"
+                         f"<Status>{status}</Status></Transaction>")
+
+
+def test_status_change_reads_and_moves_balances_in_one_query(monkeypatch):
+    session = FakeSession("found\tACC1\tACC2\t-25.00")
+    monkeypatch.setattr(Banking_xml_queries, "Session", lambda *args: session)
+    bank = BankingXMLQueries(maintain_balances=True, partition_transactions=False)
+
+    result, deltas = bank._update_transaction_status("TX1", "reversed")
+
+    assert result == "Transaction TX1 status updated to reversed."
+    assert deltas == {'ACC1': Decimal("25.00"), 'ACC2': Decimal("-25.00")}
+    updates = [q for q in session.queries if q.startswith("XQUERY")]
+    assert len(updates) == 1
+    assert '$t/Status = "completed"' in updates[0] and "replace value of node $a/Balance" in updates[0]
+
+
+def test_status_change_of_unknown_transaction(monkeypatch):
+    monkeypatch.setattr(Banking_xml_queries, "Session", lambda *args: FakeSession(""))
+    bank = BankingXMLQueries(maintain_balances=True, partition_transactions=False)
+    assert bank.update_transaction_status("TX404", "completed") == "Transaction with ID TX404 does not exist."
+
+
+def test_past_balances_need_maintained_balances():
+    bank = BankingXMLQueries()
+    with pytest.raises(ValueError):
+        bank.get_balance_at("ACC1", "2024-01-31")
+    with pytest.raises(ValueError):
+        bank.create_balance_snapshot("2024-01-31")
+
+
+def test_archived_flows(tmp_path):
+    archive = TransactionArchive(str(tmp_path))
+    archive.append("2024-01", [_transaction("TX1", "2024-01-10T10:00:00", "10.00"),
+                               _transaction("TX2", "2024-01-20T10:00:00", "5.00", status="failed"),
+                               _transaction("TX3", "2024-01-25T10:00:00", "3.00", from_acc="ACC2", to_acc="ACC3")])
+    archive.append("2024-02", [_transaction("TX4", "2024-02-05T10:00:00", "1.00")])
+    bank = BankingXMLQueries(transaction_archive=archive)
+
+    after, up_to = "2024-01-15T00:00:00", "2024-12-31T23:59:59"
+    assert bank._archived_flows(after, up_to) == {'ACC1': Decimal("-1.00"), 'ACC2': Decimal("-2.00"),
+                                                  'ACC3': Decimal("3.00")}
+    assert bank._archived_flows("2024-01-01T00:00:00", up_to, "ACC2") == {'ACC2': Decimal("8.00")}
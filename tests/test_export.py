@@ -0,0 +1,55 @@
+import re
+
+from Banking_export import ColumnarExporter, load_columns
+from Banking_xml_queries import BankingXMLQueries
+
+
+class FakeBank:
+    """One transactions document held as rows; answers the exporter's resume query"""
+
+    def __init__(self, ids):
+        self.rows = [self._row(i) for i in ids]
+
+    @staticmethod
+    def _row(tx_id):
+        return [tx_id, 'ACC1001', 'ACC1002', '1.00', '2024-01-01T00:00:00', 'transfer', 'completed']
+
+    def _entity_sources(self, entity):
+        return [("transactions.xml", "NODES")]
+
+    def iter_rows(self, nodes, fields, start=0, chunk_size=10000):
+        for i in range(start, len(self.rows), chunk_size):
+            yield [list(r) for r in self.rows[i:i + chunk_size]]
+
+    def _execute_query(self, query, write=False):
+        offset, last_id = re.search(r'\$items\[(\d+)\]/TransactionID\) = "([^"]*)"', query).groups()
+        ids = [r[0] for r in self.rows]
+        return str(ids.index(last_id) + 1) if last_id in ids else ""
+
+    _xquery_literal = staticmethod(BankingXMLQueries._xquery_literal)
+
+
+def _exported_ids(out_dir):
+    return list(load_columns(str(out_dir), 'transactions', ['TransactionID'], mmap=False)['TransactionID'])
+
+
+def test_rows_appended_after_archived_rows_are_exported(tmp_path):
+    bank = FakeBank(['TX1', 'TX2', 'TX3'])
+    exporter = ColumnarExporter(bank, str(tmp_path))
+    assert exporter.export(['transactions']) == {'transactions': 3}
+
+    del bank.rows[:2]  # archived
+    bank.rows += [FakeBank._row('TX4'), FakeBank._row('TX5')]
+    assert exporter.export(['transactions']) == {'transactions': 2}
+    assert _exported_ids(tmp_path) == ['TX1', 'TX2', 'TX3', 'TX4', 'TX5']
+
+
+def test_missing_last_row_falls_back_to_full_export(tmp_path):
+    bank = FakeBank(['TX1', 'TX2', 'TX3'])
+    exporter = ColumnarExporter(bank, str(tmp_path))
+    exporter.export(['transactions'])
+
+    bank.rows = [FakeBank._row('TX4')]
+    assert exporter.export(['transactions']) == {'transactions': 1}
+    assert _exported_ids(tmp_path) == ['TX4']
+    assert exporter.load_manifest()['entities']['transactions']['rows'] == 1
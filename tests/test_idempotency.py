@@ -0,0 +1,72 @@
+import pytest
+
+from Banking_idempotency import IdempotencyStore, key_transaction_id, run_create_transaction
+
+REQUEST = {'FromAccountID': 'ACC1001', 'ToAccountID': 'ACC1002', 'Amount': '10.00', 'Type': 'transfer'}
+
+
+class FakeLedger:
+    """create_transaction with the existing-ID check; commits, then fails as told"""
+
+    def __init__(self):
+        self.ids = []
+        self.fail_after_commit = None
+
+    def create(self, data):
+        tx_id = data['TransactionID']
+        if tx_id in self.ids:
+            return f"Cannot create transaction: Transaction ID {tx_id} already exists"
+        self.ids.append(tx_id)
+        failure, self.fail_after_commit = self.fail_after_commit, None
+        if isinstance(failure, BaseException):
+            raise failure
+        if failure:
+            return failure
+        return f"Transaction {tx_id} created successfully."
+
+
+def test_key_transaction_id_is_stable_and_distinct():
+    assert key_transaction_id("req-1") == key_transaction_id("req-1")
+    assert key_transaction_id("req-1") != key_transaction_id("req-2")
+    assert key_transaction_id("req-1").startswith("TX-K")
+
+
+def test_replay_returns_first_result():
+    store, ledger = IdempotencyStore(), FakeLedger()
+    first = run_create_transaction(store, "req-1", REQUEST, ledger.create)
+    assert run_create_transaction(store, "req-1", REQUEST, ledger.create) == first
+    assert ledger.ids == [key_transaction_id("req-1")]
+    assert store.stats()['replays'] == 1
+
+
+@pytest.mark.parametrize("failure", [TimeoutError(), "An error occurred during transaction creation: reset"])
+def test_retry_after_unknown_outcome_does_not_post_twice(failure):
+    store, ledger = IdempotencyStore(), FakeLedger()
+    ledger.fail_after_commit = failure
+    if isinstance(failure, BaseException):
+        with pytest.raises(TimeoutError):
+            run_create_transaction(store, "req-1", REQUEST, ledger.create)
+    else:
+        assert run_create_transaction(store, "req-1", REQUEST, ledger.create) == failure
+    assert len(store) == 1  # kept, marked unknown
+
+    tx_id = key_transaction_id("req-1")
+    assert run_create_transaction(store, "req-1", REQUEST, ledger.create) == f"Transaction {tx_id} created successfully."
+    assert ledger.ids == [tx_id]
+    # The re-run's result is now the one replayed
+    assert store.get("req-1") == f"Transaction {tx_id} created successfully."
+
+
+def test_key_reused_for_different_request_is_refused():
+    store, ledger = IdempotencyStore(), FakeLedger()
+    ledger.fail_after_commit = "An error occurred during transaction creation: reset"
+    run_create_transaction(store, "req-1", REQUEST, ledger.create)
+    result = run_create_transaction(store, "req-1", {**REQUEST, 'Amount': '99.00'}, ledger.create)
+    assert result.startswith("Cannot process request: idempotency key req-1")
+    assert len(ledger.ids) == 1
+
+
+def test_caller_transaction_id_is_kept():
+    store, ledger = IdempotencyStore(), FakeLedger()
+    run_create_transaction(store, "req-1", {**REQUEST, 'TransactionID': 'TX-OWN'}, ledger.create)
+    assert ledger.ids == ['TX-OWN']
@@ -0,0 +1,19 @@
+from Banking_integrity import IntegrityChecker
+
+
+def _rows(key_field, *items):
+    return [("doc.xml", "", {key_field: key, **fields}) for key, fields in items]
+
+
+def test_loan_payments_are_checked_against_loans():
+    checker = IntegrityChecker(xsd_dir="")
+    for entity, key_field, keys in (('accounts', 'AccountID', ['ACC1']), ('loans', 'LoanID', ['LOAN1'])):
+        checker.counts[entity] = {}
+        checker._check_keys(entity, _rows(key_field, *((k, {}) for k in keys)), 0)
+    checker.counts['transactions'] = {}
+    checker._check_keys('transactions', _rows('TransactionID',
+                                              ('TX1', {'FromAccountID': 'ACC1', 'ToAccountID': 'LOAN1'}),
+                                              ('TX2', {'FromAccountID': 'ACC1', 'ToAccountID': 'LOAN9'}),
+                                              ('TX3', {'FromAccountID': 'ACC1', 'ToAccountID': 'EXT-SHOP'})), 0)
+    assert [(i['id'], i['value'], i['message']) for i in checker.issues if i['entity'] == 'transactions'] == [
+        ('TX2', 'LOAN9', "ToAccountID LOAN9 not found in loans")]
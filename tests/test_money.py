@@ -0,0 +1,49 @@
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from Banking_money import MISSING, parse_money, parse_money_column
+
+
+@pytest.mark.parametrize("text, currency, expected", [
+    ("50", None, "50.00"),
+    ("123", "KWD", "123.000"),
+    ("7", "JPY", "7"),
+    ("12.5", None, "12.50"),
+    ("0.1", "KWD", "0.100"),
+    ("-3", None, "-3.00"),
+    ("-12.5", None, "-12.50"),
+    ("-1234.56", None, "-1234.56"),
+    ("1234.56", None, "1234.56"),
+])
+def test_parse_money(text, currency, expected):
+    value = parse_money(text, currency)
+    assert value.to_decimal() == Decimal(expected)
+    assert str(value.to_decimal()) == expected
+
+
+@pytest.mark.parametrize("text", ["12.3.4", "abc", "", "1.2.34"])
+def test_parse_money_rejects_invalid_text(text):
+    with pytest.raises(ValueError):
+        parse_money(text, "KWD" if text == "12.3.4" else None)
+
+
+def test_parse_money_column_mixed_forms():
+    values = parse_money_column(["50", "12.5", "-3", "1234.56", ""])
+    assert values.tolist() == [5000, 1250, -300, 123456, MISSING]
+    assert values.dtype == np.int64
+
+
+def test_minor_mode_change_records_hold_the_amount(tmp_path):
+    import xml.etree.ElementTree as ET
+    from Banking_changelog import ChangeLog
+    from Banking_xml_queries import BankingXMLQueries
+
+    log = ChangeLog(str(tmp_path / "changes.log"), fsync=False)
+    bank = BankingXMLQueries(money_type='minor', change_log=log)
+    transaction = bank._element_to_dict(ET.fromstring(
+        "<Transaction><TransactionID>TX1</TransactionID><Amount>1500.50</Amount></Transaction>"))
+    assert int(transaction['Amount']) == 150050  # int minor units in memory
+    bank._record_change('create', 'transactions', 'TX1', transaction)
+    assert log.read()[0]['data'] == {'TransactionID': 'TX1', 'Amount': '1500.50'}
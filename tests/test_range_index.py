@@ -0,0 +1,69 @@
+from decimal import Decimal
+
+import pytest
+
+from Banking_changelog import ChangeLog
+from Banking_range_index import TransactionRangeIndex
+
+
+def _transaction(tx_id, amount, date="2024-06-01T10:00:00"):
+    return {'TransactionID': tx_id, 'FromAccountID': 'ACC1', 'ToAccountID': 'ACC2', 'Amount': amount, 'Date': date}
+
+
+def test_catch_up_applies_writes_of_other_processes(tmp_path):
+    log = ChangeLog(str(tmp_path / "changes.log"), fsync=False)
+    index = TransactionRangeIndex()
+    index.build([[['TX1', 'ACC1', 'ACC2', '9000.00', '2024-06-01T09:00:00']]])
+    index.log_seq = log.last_sequence()
+
+    other_process = ChangeLog(str(tmp_path / "changes.log"), fsync=False)
+    other_process.append('create', 'transactions', 'TX2', _transaction('TX2', '8000.00'))
+    other_process.append('create', 'transactions', 'TX1', _transaction('TX1', '9000.00', '2024-06-01T09:00:00'))
+    other_process.append('update', 'accounts', 'ACC1', {'BalanceDelta': '-8000.00'})
+    assert index.catch_up(log) == 3
+    assert index.high_value(Decimal(5000), '2024-01-01') == ['TX1', 'TX2']  # TX1 was in the build too
+
+    other_process.append('archive', 'transactions', 'TX1')
+    index.catch_up(log)
+    assert index.high_value(Decimal(5000), '2024-01-01') == ['TX2']
+    assert index.account_range('ACC2', '2024-06-01', '2024-06-30') == ['TX2']
+
+
+def test_unwritable_change_log_raises_and_flags_the_index_for_rebuild(tmp_path, monkeypatch):
+    from Banking_xml_queries import BankingXMLQueries
+
+    log = ChangeLog(str(tmp_path / "changes.log"), fsync=False)
+    index = TransactionRangeIndex()
+    index.build([])
+    bank = BankingXMLQueries(change_log=log, range_index=index)
+
+    def full_disk(*args):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(log, "append", full_disk)
+    with pytest.raises(OSError, match="TX1 was saved"):
+        bank._record_change('create', 'transactions', 'TX1', _transaction('TX1', '10.00'))
+    assert not index.is_built
+
+
+def test_catch_up_skips_the_log_until_it_grows(tmp_path, monkeypatch):
+    log = ChangeLog(str(tmp_path / "changes.log"), fsync=False)
+    log.append('create', 'transactions', 'TX1', _transaction('TX1', '9000.00'))
+    index = TransactionRangeIndex()
+    index.build([])
+    assert index.catch_up(log) == 1
+
+    def no_read(*args):
+        raise AssertionError("log re-read although it did not grow")
+
+    monkeypatch.setattr(log, "read_from", no_read)
+    assert index.catch_up(log) == 0
+    monkeypatch.undo()
+
+    offsets = []
+    read_from = log.read_from
+    monkeypatch.setattr(log, "read_from", lambda offset, *args: offsets.append(offset) or read_from(offset, *args))
+    log.append('create', 'transactions', 'TX2', _transaction('TX2', '8000.00'))
+    assert index.catch_up(log) == 1
+    assert offsets[0] is not None  # resumed at the remembered offset, without the sparse index
+    assert index.high_value(Decimal(5000), '2024-01-01') == ['TX1', 'TX2']
@@ -0,0 +1,62 @@
+import xml.etree.ElementTree as ET
+
+import Banking_reconcile
+from Banking_archive import TransactionArchive
+from Banking_reconcile import account_bucket, reconcile
+
+
+class _Pool(Banking_reconcile._InProcess):
+    def __init__(self, max_workers):
+        pass
+
+
+def _transaction(tx_id, date, amount, from_acc="ACC1", to_acc="ACC2"):
+    return ET.fromstring(f"<Transaction><TransactionID>{tx_id}</TransactionID><FromAccountID>{from_acc}</FromAccountID>"
+                         f"<ToAccountID>{to_acc}</ToAccountID><Amount>{amount}</Amount><Date>{date}</Date>"
+                         f"<Status>completed</Status></Transaction>")
+
+
+class FakeBank:
+    def __init__(self, archive):
+        self.transaction_archive = archive
+
+
+def test_archive_months_are_split_across_workers_and_booked_once(tmp_path, monkeypatch):
+    archive = TransactionArchive(str(tmp_path))
+    archive.append("2024-01", [_transaction("TX1", "2024-01-10T10:00:00", "10.00")])
+    archive.append("2024-02", [_transaction("TX2", "2024-02-10T10:00:00", "5.00")])
+    archive.append("2024-03", [_transaction("TX3", "2024-03-10T10:00:00", "1.00")])
+    live = [("TX3", "ACC1", "ACC2", "1.00", "2024-03-10T10:00:00"),  # left behind by an interrupted archive run
+            ("TX4", "ACC2", "ACC1", "2.00", "2024-04-10T10:00:00")]
+    balances = {'ACC1': ('-14.00', 'USD', 'active'), 'ACC2': ('14.00', 'USD', 'active')}
+    months_seen = []
+
+    def fake_bucket(connection, archived_months, bucket, buckets, chunk_size):
+        # The real worker runs the same bookkeeping over rows streamed from the server
+        result = {'bucket': bucket, 'inflow': {}, 'outflow': {}, 'overlap': [], 'transactions': 0, 'seconds': 0,
+                  'balances': {a: b for a, b in balances.items() if account_bucket(a, buckets) == bucket}}
+        for tx_id, from_acc, to_acc, amount, date in live:
+            if bucket not in (account_bucket(from_acc, buckets), account_bucket(to_acc, buckets)):
+                continue
+            cents = Banking_reconcile.to_minor_units(amount)
+            if date[:7] in archived_months:
+                result['overlap'].append((tx_id, from_acc, to_acc, cents, date[:7], bucket))
+            else:
+                Banking_reconcile._book(result['inflow'], result['outflow'], from_acc, to_acc, cents, bucket, buckets)
+        return result
+
+    real_archive = Banking_reconcile.reconcile_archive
+
+    def recording_archive(archive_dir, months, overlap_ids):
+        months_seen.append(list(months))
+        return real_archive(archive_dir, months, overlap_ids)
+
+    monkeypatch.setattr(Banking_reconcile, "ProcessPoolExecutor", _Pool)
+    monkeypatch.setattr(Banking_reconcile, "_connection", lambda bank: {})
+    monkeypatch.setattr(Banking_reconcile, "reconcile_bucket", fake_bucket)
+    monkeypatch.setattr(Banking_reconcile, "reconcile_archive", recording_archive)
+
+    report = reconcile(FakeBank(archive), workers=2)
+    assert sorted(months_seen) == [["2024-01", "2024-03"], ["2024-02"]]
+    assert report['accounts'] == 2
+    assert report['discrepancies'] == []  # ACC2: +10 +5 +1 (once) -2 = 14
@@ -0,0 +1,52 @@
+import pytest
+
+from Banking_replicas import ReplicaRouter
+from Banking_xml_queries import BankingXMLQueries
+
+
+class FakePool:
+    """Session pool whose sessions answer per host: a result or an exception to raise"""
+
+    def __init__(self, answers):
+        self.answers = answers
+        self.hosts = []
+
+    def session(self, host, port, user, password, db_name):
+        pool = self
+
+        class _Session:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, command):
+                pool.hosts.append(host)
+                answer = pool.answers[host]
+                if isinstance(answer, BaseException):
+                    raise answer
+                return answer
+
+        return _Session()
+
+
+def _bank(replica_answer):
+    router = ReplicaRouter(("primary", 1984), [("replica", 1984)])
+    pool = FakePool({"primary": "from primary", "replica": replica_answer})
+    return BankingXMLQueries(replica_router=router, session_pool=pool), router, pool
+
+
+def test_unreachable_replica_fails_over_to_primary():
+    bank, router, pool = _bank(ConnectionRefusedError())
+    assert bank._execute_query("1") == "from primary"
+    assert pool.hosts == ["replica", "primary"]
+    assert router.replicas[0].down_until > 0
+
+
+def test_query_error_on_replica_is_not_a_failover():
+    bank, router, pool = _bank(IOError("Stopped at ., 1/1: [XPST0003] Syntax error"))
+    with pytest.raises(ConnectionError):
+        bank._execute_query("1 +")
+    assert pool.hosts == ["replica"]
+    assert router.replicas[0].down_until == 0.0
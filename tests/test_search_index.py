@@ -0,0 +1,47 @@
+from Banking_changelog import ChangeLog
+from Banking_search_index import UserSearchIndex
+
+USERS = [
+    {'UserID': 'U1', 'FullName': 'Joe Black', 'Email': 'joe@example.com', 'Username': 'joeb', 'Role': 'customer'},
+    {'UserID': 'U2', 'FullName': 'Ann Smith', 'Email': 'ann@example.com', 'Username': 'anns', 'Role': 'customer'},
+]
+
+
+def _ids(users):
+    return [u['UserID'] for u in users]
+
+
+def test_short_terms_match_inside_tokens():
+    index = UserSearchIndex()
+    index.build(USERS)
+    assert _ids(index.search("oe", ["FullName"])) == ['U1']
+    assert _ids(index.search("s", ["FullName"])) == ['U2']
+    assert _ids(index.search("n", ["FullName"])) == []  # one character matches token starts only
+    assert _ids(index.autocomplete("oe", ["FullName"])) == []
+    assert _ids(index.autocomplete("jo", ["FullName"])) == ['U1']
+
+
+def test_catch_up_applies_users_written_by_other_processes(tmp_path):
+    log = ChangeLog(str(tmp_path / "changes.log"), fsync=False)
+    index = UserSearchIndex()
+    index.build(USERS)
+    index.log_seq = log.last_sequence()
+
+    other_process = ChangeLog(str(tmp_path / "changes.log"), fsync=False)
+    other_process.append('create', 'users', 'U3', {'UserID': 'U3', 'FullName': 'Zoe Moe'})
+    other_process.append('update', 'users', 'U1', {**USERS[0], 'FullName': 'Joseph Black'})
+    assert index.catch_up(log) == 2
+    assert _ids(index.search("zoe")) == ['U3']
+    assert _ids(index.search("joseph")) == ['U1']
+    assert index.catch_up(log) == 0
+
+
+def test_fallback_queries_escape_the_term(monkeypatch):
+    from Banking_xml_queries import BankingXMLQueries
+
+    bank = BankingXMLQueries()
+    queries = []
+    monkeypatch.setattr(bank, "_execute_query", lambda query, write=False: queries.append(query) or "")
+    bank.search_users('x") or true() or ("', ['FullName'])
+    bank.autocomplete_users('x") or true() or ("', fields=['FullName'])
+    assert all('lower-case("x"") or true() or (""")' in q for q in queries) and len(queries) == 2
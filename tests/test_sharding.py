@@ -0,0 +1,80 @@
+from decimal import Decimal
+
+import pytest
+
+from Banking_archive import TransactionArchive
+from Banking_sharding import ShardedBankingXMLQueries
+from Banking_xml_queries import BankingXMLQueries
+
+
+class FakeShard:
+    def __init__(self, port, refuse=False):
+        self.db_host, self.db_port, self.db_name = "localhost", port, "banking"
+        self.users_db = "banking"
+        self.change_log = None
+        self.user_search_index = None
+        self.refuse = refuse
+        self.users = set()
+        self.changes = []
+
+    def create_user(self, user_data):
+        if self.refuse:
+            return f"Cannot create user: Username {user_data['Username']} already exists"
+        self.users.add(user_data['UserID'])
+        return f"User {user_data['UserID']} created successfully."
+
+    def _execute_query(self, query, write=False):
+        assert write and query.startswith("delete nodes")
+        self.users.discard(query.split('UserID = "')[1].split('"')[0])
+        return ""
+
+    def _record_change(self, op, entity, key, data=None):
+        self.changes.append((op, entity, key))
+
+
+def test_failed_user_create_is_undone_on_the_other_shards():
+    shards = [FakeShard(1984), FakeShard(1985, refuse=True), FakeShard(1986)]
+    sharded = ShardedBankingXMLQueries(shards)
+    result = sharded.create_user({'UserID': 'U1', 'Username': 'ann'})
+    assert result == "Cannot create user: Username ann already exists"
+    assert [s.users for s in shards] == [set(), set(), set()]
+    assert shards[0].changes == [('delete', 'users', 'U1')]
+
+
+def test_user_create_on_every_shard():
+    shards = [FakeShard(1984), FakeShard(1985)]
+    assert ShardedBankingXMLQueries(shards).create_user({'UserID': 'U1', 'Username': 'ann'}) == \
+        "User U1 created successfully."
+    assert [s.users for s in shards] == [{'U1'}, {'U1'}]
+
+
+def test_archive_and_migration_run_on_every_shard():
+    shards = [FakeShard(1984), FakeShard(1985)]
+    shards[0].archive_transactions = lambda cutoff, dry_run=False: {'2024-01': 2, '2024-02': 1}
+    shards[1].archive_transactions = lambda cutoff, dry_run=False: {'2024-01': 3}
+    shards[0].migrate_transactions_to_partitions = lambda dry_run=False: {'2024-03': 1}
+    shards[1].migrate_transactions_to_partitions = lambda dry_run=False: {'2024-03': 4}
+    sharded = ShardedBankingXMLQueries(shards)
+    assert sharded.archive_transactions("2024-03-01") == {'2024-01': 5, '2024-02': 1}
+    assert sharded.migrate_transactions_to_partitions() == {'2024-03': 5}
+
+
+def test_past_balance_sums_the_flows_of_every_shard(tmp_path):
+    banks = [BankingXMLQueries(db_port=port, maintain_balances=True,
+                               transaction_archive=TransactionArchive(str(tmp_path / "archive")))
+             for port in (1984, 1985)]
+    sharded = ShardedBankingXMLQueries(banks)
+    home = sharded.shard_for_account("ACC1")
+
+    def answer(bank, query):
+        if "db:list" in query:
+            return ""  # no snapshots: start from the current Balance
+        if query.startswith("for $b"):
+            return "100.00" if bank is home else ""
+        return "-30.00" if bank is home else "20.00"  # net since `at`; the credit was sent from the other shard
+
+    for bank in banks:
+        bank._execute_query = lambda query, write=False, bank=bank: answer(bank, query)
+    assert sharded.get_balance_at("ACC1", "2024-01-31") == Decimal("110.00")
+    with pytest.raises(ValueError):
+        sharded.create_balance_snapshot("2024-01-31")
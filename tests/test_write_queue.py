@@ -0,0 +1,69 @@
+import re
+import threading
+
+import Banking_write_queue
+from Banking_write_queue import GroupCommitWriter
+from Banking_xml_queries import BankingXMLQueries
+
+
+class FakeSession:
+    """Stands in for BaseXClient.Session: every account exists, no transaction does"""
+
+    def __init__(self, *args):
+        self.queries = []
+        self.lock = threading.Lock()
+
+    def execute(self, command):
+        with self.lock:
+            self.queries.append(command)
+        if "string-join" in command:
+            return " ".join(f"A:{a}" for a in re.findall(r'"(ACC\d+)"', command))
+        return ""
+
+    def close(self):
+        pass
+
+
+def test_concurrent_submits_are_inserted_as_one_sequence(monkeypatch):
+    session = FakeSession()
+    monkeypatch.setattr(Banking_write_queue, "Session", lambda *args: session)
+    bank = BankingXMLQueries(partition_transactions=False)
+    writer = GroupCommitWriter(bank, max_batch_size=10, max_delay=0.5)
+    try:
+        futures = [writer.submit({'TransactionID': f'TX-TEST{i}', 'FromAccountID': 'ACC1001',
+                                  'ToAccountID': 'ACC1002', 'Amount': '1.00', 'Type': 'transfer'})
+                   for i in range(2)]
+        results = [f.result(timeout=5) for f in futures]
+    finally:
+        writer.close()
+
+    assert results == ["Transaction TX-TEST0 created successfully.", "Transaction TX-TEST1 created successfully."]
+    assert writer.stats()['batches'] == 1
+    inserts = [q for q in session.queries if "insert nodes" in q]
+    assert len(inserts) == 1
+    # Both elements in one comma-separated sequence, never side by side
+    assert re.search(r"</Transaction>\s*,\s*<Transaction>", inserts[0])
+    assert not re.search(r"</Transaction>\s*<Transaction>", inserts[0])
+
+
+def test_first_batch_of_a_new_month_creates_the_partition_from_the_sequence(monkeypatch):
+    session = FakeSession()
+    monkeypatch.setattr(Banking_write_queue, "Session", lambda *args: session)
+    bank = BankingXMLQueries(partition_transactions=True)
+    writer = GroupCommitWriter(bank, max_batch_size=10, max_delay=0.5)
+    try:
+        futures = [writer.submit({'TransactionID': f'TX-NEW{i}', 'FromAccountID': 'ACC1001', 'ToAccountID': 'ACC1002',
+                                  'Amount': '1.00', 'Type': 'transfer', 'Timestamp': '2031-07-01T10:00:00'})
+                   for i in range(2)]
+        results = [f.result(timeout=5) for f in futures]
+    finally:
+        writer.close()
+
+    assert results == ["Transaction TX-NEW0 created successfully.", "Transaction TX-NEW1 created successfully."]
+    inserts = [q for q in session.queries if "db:add" in q]
+    assert len(inserts) == 1
+    assert "transactions/2031-07.xml" in inserts[0]
+    # The sequence is evaluated inside an enclosed expression, not written out as text
+    created = re.search(r"<Transactions>(.*)</Transactions>", inserts[0], re.S).group(1).strip()
+    assert created.startswith("{") and created.endswith("}")
+    assert re.search(r"</Transaction>\s*,\s*<Transaction>", created)